@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Compares the seekable event archive with a naive JSON dump of the same
+# synthetic recording (size, write time, full load time, seek to the last block).
+#
+# Run inside KLayout (the event module imports pya), e.g.:
+#
+#   klayout -b -r benchmarks/event_archive_benchmark.py
+#
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'python'))
+
+from klayout_gui_automation.event import Event, KeyEvent, MouseEvent, QtEventType, TypeEvent
+from klayout_gui_automation.event_archive import ArchiveCodec, EventArchive, write_event_archive
+from klayout_gui_automation.event_codec import event_from_json, event_to_json
+from klayout_gui_automation.widget_path import WidgetPath, WidgetPathEntry
+
+
+EVENT_COUNT = 200_000
+
+
+def synthetic_recording(count: int) -> list[Event]:
+    rnd = random.Random(42)
+    main_window = WidgetPathEntry('main_window', 'QMainWindow', 1, {'oid': 'main_window'})
+    canvas = WidgetPath.from_entries([main_window, WidgetPathEntry('canvas', 'QWidget', 1, {'oid': 'canvas'})])
+    line_edits = [WidgetPath.from_entries([main_window, WidgetPathEntry('', 'QLineEdit', i, None)])
+                  for i in range(1, 4)]
+    events = []
+    t = 0
+    x, y = 500, 400
+    while len(events) < count:
+        t += rnd.randint(5, 20) * 1_000_000
+        if rnd.random() < 0.95:
+            x += rnd.randint(-3, 3)
+            y += rnd.randint(-3, 3)
+            events.append(Event(kind=Event.Kind.MOUSE_EVENT, target=canvas, timestamp=t,
+                                event=MouseEvent(type=QtEventType.MouseMove, x=x, y=y,
+                                                 global_x=x + 100, global_y=y + 80,
+                                                 button=0, buttons=1, modifiers=0)))
+        elif rnd.random() < 0.5:
+            events.append(Event(kind=Event.Kind.KEY_EVENT, target=rnd.choice(line_edits), timestamp=t,
+                                event=KeyEvent(type=QtEventType.KeyPress, key=65, text='a', modifiers=0)))
+        else:
+            events.append(Event(kind=Event.Kind.TYPE_EVENT, target=rnd.choice(line_edits), timestamp=t,
+                                event=TypeEvent(text='hello')))
+    return events
+
+
+def timed(func):
+    t0 = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    events = synthetic_recording(EVENT_COUNT)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'recording.json')
+        
+        def write_json():
+            with open(json_path, 'w') as f:
+                json.dump([event_to_json(e) for e in events], f)
+        
+        def load_json():
+            with open(json_path) as f:
+                return [event_from_json(d) for d in json.load(f)]
+        
+        _, json_write = timed(write_json)
+        loaded, json_load = timed(load_json)
+        assert len(loaded) == len(events)
+        
+        print(f"{'format':<12} {'size [kB]':>10} {'write [s]':>10} {'load [s]':>10} {'seek last [ms]':>15}")
+        print(f"{'json':<12} {os.path.getsize(json_path) / 1024:>10.0f} {json_write:>10.2f} {json_load:>10.2f} "
+              f"{json_load * 1000:>15.1f}")
+        
+        for codec in ArchiveCodec:
+            archive_path = os.path.join(tmp, f"recording.{codec.name.lower()}.kgaa")
+            _, write_time = timed(lambda: write_event_archive(archive_path, events, codec=codec))
+            
+            def load_archive():
+                with EventArchive(archive_path) as a:
+                    return list(a)
+            
+            def seek_last():
+                with EventArchive(archive_path) as a:
+                    return list(a.events(len(a) - 1))
+            
+            loaded, load_time = timed(load_archive)
+            assert [str(e) for e in loaded[:100]] == [str(e) for e in events[:100]]
+            assert len(loaded) == len(events)
+            _, seek_time = timed(seek_last)
+            print(f"{codec.name.lower():<12} {os.path.getsize(archive_path) / 1024:>10.0f} "
+                  f"{write_time:>10.2f} {load_time:>10.2f} {seek_time * 1000:>15.1f}")
+
+
+main()
@@ -0,0 +1,112 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Measures the per-event overhead of EventRecorder.eventFilter for event types
+# which are not recorded (paint, timer, hover, layout requests, ...),
+# comparing the baseline filter (the isinstance/match cascade, loaded from git
+# at BASELINE_REV) with the current dispatch table lookup.
+#
+# BASELINE_REV is required, any git revision of the isinstance/match filter
+# (e.g. the parent of the commit introducing the dispatch table, a tag or a branch).
+#
+# Run inside KLayout (Qt bindings are required) from the git checkout, e.g.:
+#
+#   BASELINE_REV=<commit> QT_QPA_PLATFORM=offscreen klayout -nc -rx -r benchmarks/event_filter_overhead.py
+#
+# Paste the printed table into the commit message of the change being measured.
+#
+
+import os
+import subprocess
+import sys
+import time
+import types
+
+import pya
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(REPO_DIR, 'python'))
+
+from klayout_gui_automation.event import Event
+from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.event_recorder import EventRecorder
+
+
+ITERATIONS = 100_000
+
+# the event filter before the dispatch table was introduced
+BASELINE_REV = os.environ.get('BASELINE_REV')
+
+
+class NullEventHandler(EventHandler):
+    def flush(self):
+        pass
+    
+    def handle_event(self, event: Event):
+        pass
+
+
+def load_baseline_recorder_class(rev: str) -> type:
+    """
+    EventRecorder as of rev, executed against the current package
+    (the helpers it imports are still available)
+    """
+    source = subprocess.run(
+        ['git', 'show', f"{rev}:python/klayout_gui_automation/event_recorder.py"],
+        cwd=REPO_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    module = types.ModuleType('baseline_event_recorder')
+    module.__file__ = f"<{rev}:event_recorder.py>"
+    exec(compile(source, module.__file__, 'exec'), module.__dict__)
+    return module.EventRecorder
+
+
+def measure(filter_func, widget: pya.QWidget, event: pya.QEvent) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(ITERATIONS):
+        filter_func(widget, event)
+    return (time.perf_counter_ns() - t0) / ITERATIONS
+
+
+def main():
+    if not BASELINE_REV:
+        print("event_filter_overhead.py: set BASELINE_REV to the git revision to compare against", file=sys.stderr)
+        return
+    
+    widget = pya.QWidget()
+    recorder = EventRecorder(NullEventHandler())
+    baseline_recorder = load_baseline_recorder_class(BASELINE_REV)(NullEventHandler())
+    
+    events = [
+        ('Paint', pya.QPaintEvent(pya.QRect(0, 0, 10, 10))),
+        ('HoverMove', pya.QHoverEvent(pya.QEvent.HoverMove, pya.QPointF(1, 1), pya.QPointF(0, 0))),
+        ('LayoutRequest', pya.QEvent(pya.QEvent.LayoutRequest)),
+        ('UpdateRequest', pya.QEvent(pya.QEvent.UpdateRequest)),
+        ('Timer', pya.QTimerEvent(1)),
+    ]
+    
+    print(f"baseline: {BASELINE_REV}, {ITERATIONS} iterations per event type")
+    print(f"{'event type':<16} {'before [ns]':>12} {'after [ns]':>12} {'speedup':>8}")
+    for name, event in events:
+        before = measure(baseline_recorder.eventFilter, widget, event)
+        after = measure(recorder.eventFilter, widget, event)
+        print(f"{name:<16} {before:>12.0f} {after:>12.0f} {before / after:>7.1f}x")
+
+
+main()
@@ -0,0 +1,155 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+#
+# Index of KLayout's menu actions (pya.MainWindow.menu()) by their menu path,
+# e.g. 'file_menu.open' or '@toolbar.zoom_fit', the stable name of an action
+# across sessions. Menus and toolbars are plain QMenus/QToolBars to the
+# recorder, so menu navigation is recorded as the triggered action instead.
+#
+
+from __future__ import annotations
+import traceback
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+
+ActionTriggeredCallback = Callable[[str], None]
+
+
+class ActionIndex:
+    """
+    Maps menu paths to actions. When started, on_triggered is called with the
+    menu path of every triggered action. An action inserted at several places
+    (e.g. menu and toolbar) is reported with the first path found.
+    
+    The index is built once and refreshed by refresh_later(),
+    e.g. when actions are added to or removed from menus and toolbars.
+    """
+    
+    def __init__(self, on_triggered: Optional[ActionTriggeredCallback] = None):
+        self.on_triggered = on_triggered
+        self.paths: Dict[str, pya.Action] = {}
+        self.menu_paths: Set[str] = set()  # submenus, they are not triggered themselves
+        self._connections: List[Tuple[pya.Action, Callable[[], None]]] = []
+        self._active = False
+        self._built = False
+        
+        self._refresh_timer = pya.QTimer()
+        self._refresh_timer.singleShot = True
+        self._refresh_timer.interval = 0  # coalesces the changes of one menu update
+        self._refresh_timer.timeout.connect(self.refresh)
+    
+    @staticmethod
+    def menu() -> pya.AbstractMenu:
+        return pya.MainWindow.instance().menu()
+    
+    @property
+    def active(self) -> bool:
+        return self._active
+    
+    def start(self):
+        if self._active:
+            return
+        self._active = True
+        self.refresh()
+    
+    def stop(self):
+        if not self._active:
+            return
+        self._active = False
+        self._refresh_timer.stop()
+        self._disconnect()
+    
+    def _disconnect(self):
+        for action, handler in self._connections:
+            action.on_triggered -= handler
+        self._connections = []
+    
+    def build(self):
+        menu = self.menu()
+        paths: Dict[str, pya.Action] = {}
+        menu_paths: Set[str] = set()
+        pending = list(menu.items(''))
+        while pending:
+            path = pending.pop(0)  # breadth first, menus come before toolbars
+            if menu.is_separator(path):
+                continue
+            paths[path] = menu.action(path)
+            if menu.is_menu(path):
+                menu_paths.add(path)
+                pending.extend(menu.items(path))
+        self.paths = paths
+        self.menu_paths = menu_paths
+        self._built = True
+        
+        if Debugging.DEBUG:
+            debug(f"ActionIndex.build: indexed {len(paths)} menu items")
+    
+    def refresh(self):
+        try:
+            self._disconnect()
+            self.build()
+            if self._active:
+                self._connect()
+        except Exception as e:
+            print("ActionIndex.refresh caught an exception", e)
+            traceback.print_exc()
+    
+    def refresh_later(self):
+        if self._active:
+            self._refresh_timer.start()
+        else:
+            self._built = False  # rebuilt by the next lookup
+    
+    def _connect(self):
+        seen: Set[int] = set()
+        for path, action in self.paths.items():
+            if path in self.menu_paths or id(action) in seen:
+                continue
+            seen.add(id(action))
+            
+            def handler(path=path):
+                if self.on_triggered is not None:
+                    self.on_triggered(path)
+            
+            action.on_triggered += handler
+            self._connections.append((action, handler))
+    
+    def action(self, path: str) -> Optional[pya.Action]:
+        if not self._built:
+            self.build()
+        action = self.paths.get(path)
+        if action is None:
+            # e.g. added by a macro after the index was built
+            menu = self.menu()
+            if menu.is_valid(path):
+                action = menu.action(path)
+        return action
+    
+    def is_enabled(self, path: str) -> bool:
+        action = self.action(path)
+        return action is not None and action.is_enabled() and action.is_visible()
+    
+    def trigger(self, path: str):
+        action = self.action(path)
+        if action is None:
+            raise KeyError(f"no menu item '{path}'")
+        action.trigger()
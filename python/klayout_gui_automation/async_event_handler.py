@@ -0,0 +1,220 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+import threading
+import time
+import traceback
+from typing import *
+
+from klayout_plugin_utils.debugging import debug, Debugging
+from klayout_plugin_utils.str_enum_compat import StrEnum
+
+from klayout_gui_automation.event import Event
+from klayout_gui_automation.event_handler import EventHandler
+
+
+class QueueFullPolicy(StrEnum):
+    BLOCK = 'block'              # stall the GUI thread until the worker caught up, nothing is lost
+    DROP_NEWEST = 'drop_newest'  # discard the incoming event
+    DROP_OLDEST = 'drop_oldest'  # discard the oldest queued event
+
+
+@dataclass
+class FlushPolicy:
+    """
+    When the worker releases events held back by the combiners (see EventHandler.release)
+    """
+    idle_timeout: Optional[float] = 0.25  # seconds without new events (the user paused)
+    max_latency: Optional[float] = 1.0    # seconds an event may be held back at most
+
+
+class _Barrier:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _Stop:
+    pass
+
+
+class AsyncEventHandler(EventHandler):
+    """
+    Decouples the event filter (GUI thread) from the handler chain.
+    
+    handle_event() only enqueues the (Qt-free) event into a bounded queue,
+    a worker thread owns the delegate chain (combiners, downstream handlers).
+    flush() is a barrier: it returns once all events queued before
+    have been handled and the delegate chain has been flushed.
+    
+    Independent of flush(), the worker releases events held back by the
+    combiners according to the FlushPolicy (idle time, latency deadline),
+    so live consumers see the last gesture without waiting for the next one.
+    This is timed in the worker, the GUI thread is not involved.
+    """
+    
+    def __init__(self, 
+                 delegate: EventHandler, 
+                 max_queue_size: int = 100_000,
+                 queue_full_policy: QueueFullPolicy = QueueFullPolicy.BLOCK,
+                 flush_policy: Optional[FlushPolicy] = None):
+        self.delegate = delegate
+        self.max_queue_size = max_queue_size
+        self.queue_full_policy = queue_full_policy
+        self.flush_policy = flush_policy or FlushPolicy()
+        
+        self.dropped_events = 0
+        
+        self._items: Deque[Event | _Barrier | _Stop] = deque()
+        self._queued_events = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        
+        # worker thread only
+        self._held_since: Optional[float] = None  # first event handled since the last release
+        self._last_event_at = 0.0
+    
+    @property
+    def queued_events(self) -> int:
+        return self._queued_events
+    
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='AsyncEventHandler', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._items.append(_Stop())
+            self._condition.notify_all()
+        thread.join()
+        with self._condition:
+            self._thread = None
+    
+    def handle_event(self, event: Event):
+        if self._thread is None:
+            self.start()
+        
+        with self._condition:
+            if self._queued_events >= self.max_queue_size:
+                match self.queue_full_policy:
+                    case QueueFullPolicy.BLOCK:
+                        while self._queued_events >= self.max_queue_size:
+                            self._condition.wait()
+                    case QueueFullPolicy.DROP_NEWEST:
+                        self.dropped_events += 1
+                        return
+                    case QueueFullPolicy.DROP_OLDEST:
+                        self._drop_oldest_event()
+            
+            self._items.append(event)
+            self._queued_events += 1
+            self._condition.notify_all()
+    
+    def flush(self):
+        if self._thread is None or threading.current_thread() is self._thread:
+            self.delegate.flush()
+            return
+        
+        barrier = _Barrier()
+        with self._condition:
+            self._items.append(barrier)
+            self._condition.notify_all()
+        barrier.done.wait()
+        
+        if Debugging.DEBUG and self.dropped_events:
+            debug(f"AsyncEventHandler.flush: {self.dropped_events} events were dropped (queue full)")
+    
+    def _drop_oldest_event(self):
+        # NOTE: called with the lock held, barriers/stop requests are never dropped
+        for i, item in enumerate(self._items):
+            if isinstance(item, Event):
+                del self._items[i]
+                self._queued_events -= 1
+                self.dropped_events += 1
+                return
+    
+    def _release_timeout(self, now: float) -> Optional[float]:
+        if self._held_since is None:
+            return None
+        policy = self.flush_policy
+        deadlines = []
+        if policy.idle_timeout is not None:
+            deadlines.append(self._last_event_at + policy.idle_timeout)
+        if policy.max_latency is not None:
+            deadlines.append(self._held_since + policy.max_latency)
+        return min(deadlines) - now if deadlines else None
+    
+    def _release(self):
+        self._held_since = None
+        self._call(self.delegate.release)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._items:
+                    timeout = self._release_timeout(time.monotonic())
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                batch = list(self._items)
+                self._items.clear()
+                self._queued_events = 0
+                self._condition.notify_all()  # unblock producers waiting on a full queue
+            
+            if not batch:  # idle timeout or latency deadline
+                self._release()
+                continue
+            
+            for i, item in enumerate(batch):
+                if isinstance(item, _Stop):
+                    # never leave a flush() waiting
+                    for b in batch[i+1:]:
+                        if isinstance(b, _Barrier):
+                            b.done.set()
+                    return
+                elif isinstance(item, _Barrier):
+                    self._call(self.delegate.flush)
+                    self._held_since = None
+                    item.done.set()
+                else:
+                    self._call(self.delegate.handle_event, item)
+                    now = time.monotonic()
+                    if self._held_since is None:
+                        self._held_since = now
+                    self._last_event_at = now
+            
+            # events keep coming, but nothing may be held back longer than max_latency
+            timeout = self._release_timeout(time.monotonic())
+            if timeout is not None and timeout <= 0:
+                self._release()
+    
+    @staticmethod
+    def _call(func: Callable, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print("AsyncEventHandler: handler caught an exception", e)
+            traceback.print_exc()
@@ -0,0 +1,179 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Client of the AutomationServer, runs outside of KLayout (stdlib only), e.g. in pytest:
+#
+#   @pytest.fixture(scope='session')
+#   def klayout(tmp_path_factory):
+#       socket_path = str(tmp_path_factory.mktemp('klayout') / 'automation.sock')
+#       proc = launch_server(socket_path)
+#       with AutomationClient.wait_for_server(socket_path) as client:
+#           yield client
+#       proc.terminate()
+#
+#   def test_drc(klayout):
+#       klayout.reset()
+#       klayout.replay('recordings/run_drc.kgaa')
+#       assert klayout.probe("//QLineEdit[@oid='result_count']") == '0'
+#
+
+from __future__ import annotations
+import itertools
+import json
+import os
+import socket
+import subprocess
+import time
+from typing import *
+
+AUTOMATION_SOCKET_ENV = 'KLAYOUT_GUI_AUTOMATION_SOCKET'  # see automation_server
+
+
+T = TypeVar('T')
+
+
+def _wait_for_listener(connect: Callable[[], T], what: str, startup_timeout: float) -> T:
+    """
+    Retries connect() until the socket exists and accepts connections
+    """
+    deadline = time.monotonic() + startup_timeout
+    delay = 0.01
+    while True:
+        try:
+            return connect()
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No {what} after {startup_timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+
+class AutomationError(Exception):
+    def __init__(self, message: str, type_name: str):
+        super().__init__(f"{type_name}: {message}")
+        self.message = message
+        self.type_name = type_name  # exception type raised in KLayout, e.g. ReplayError
+
+
+class AutomationClient:
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._file = self._sock.makefile('rb')
+        self._ids = itertools.count(1)
+    
+    @classmethod
+    def wait_for_server(cls, 
+                        socket_path: str, 
+                        startup_timeout: float = 60.0, 
+                        timeout: Optional[float] = None) -> AutomationClient:
+        """
+        Connects as soon as the server (e.g. a KLayout process just launched) listens
+        """
+        return _wait_for_listener(lambda: cls(socket_path, timeout=timeout), 
+                                  f"automation server listening on {socket_path}",
+                                  startup_timeout)
+    
+    def close(self):
+        self._file.close()
+        self._sock.close()
+    
+    def __enter__(self) -> AutomationClient:
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+    
+    def call(self, command: str, **args) -> Any:
+        request_id = next(self._ids)
+        request = {'id': request_id, 'command': command, 'args': args}
+        self._sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError(f"Automation server at {self.socket_path} closed the connection")
+        response = json.loads(line)
+        if response.get('id') != request_id:
+            raise ConnectionError(f"Unexpected response id {response.get('id')}, expected {request_id}")
+        if not response['ok']:
+            raise AutomationError(response.get('error', ''), response.get('type', 'Exception'))
+        return response.get('result')
+    
+    def ping(self) -> Dict[str, Any]:
+        return self.call('ping')
+    
+    def replay(self, recording: str, **options) -> Dict[str, Any]:
+        """
+        options: speed, speed_factor, text_injection, stop_on_error
+        """
+        return self.call('replay', recording=os.path.abspath(recording), **options)
+    
+    def replay_events(self, events: List[Dict[str, Any]], **options) -> Dict[str, Any]:
+        """
+        events: as serialized by event_codec.event_to_json
+        """
+        return self.call('replay_events', events=events, **options)
+    
+    def select(self, selector: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.call('select', selector=selector, limit=limit)
+    
+    def probe(self, selector: str) -> Any:
+        return self.call('probe', selector=selector)
+    
+    def reset(self, close_views: bool = True) -> Dict[str, Any]:
+        return self.call('reset', close_views=close_views)
+
+
+def launch_server(socket_path: str, 
+                  klayout: str = 'klayout', 
+                  extra_args: Sequence[str] = (),
+                  offscreen: bool = True) -> subprocess.Popen:
+    """
+    Starts KLayout with the plugin's automation server listening on socket_path
+    (autorun macros must be enabled, i.e. no -rx)
+    """
+    env = dict(os.environ)
+    env[AUTOMATION_SOCKET_ENV] = socket_path
+    if offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    return subprocess.Popen([klayout, '-nc', *extra_args], env=env, stdin=subprocess.DEVNULL)
+
+
+def read_event_stream(socket_path: str, startup_timeout: float = 60.0) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the batches streamed live by a StreamingEventHandler (KLAYOUT_GUI_AUTOMATION_STREAM),
+    each {'seq': int, 'dropped': int, 'events': [...]}, until the recording process stops.
+    
+    Connects as soon as the recording process (e.g. just launched) listens
+    """
+    def connect() -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    
+    with _wait_for_listener(connect, f"event stream on {socket_path}", startup_timeout) as sock:
+        with sock.makefile('rb') as f:
+            for line in f:
+                yield json.loads(line)
@@ -0,0 +1,339 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Control server, lets tests (see automation_client) drive a long-lived KLayout process.
+#
+# Protocol: line delimited JSON over a Unix domain socket, one request per line
+#
+#   -> {"id": 1, "command": "select", "args": {"selector": "//QLineEdit[@oid='name']"}}
+#   <- {"id": 1, "ok": true, "result": [...]}
+#   <- {"id": 1, "ok": false, "error": "...", "type": "ReplayError"}
+#
+# The server lives on the GUI thread (QSocketNotifier), commands are executed
+# one after the other, requests arriving during a command (replay runs nested 
+# event loops) are queued. Connections are non-blocking, responses are buffered
+# and written when the socket is writable, so a slow client can't freeze the GUI.
+# A client which lets more than max_output_size bytes pile up is disconnected.
+#
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+import json
+import os
+import socket
+import stat
+import traceback
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import Event
+from klayout_gui_automation.event_codec import event_from_json
+from klayout_gui_automation.event_recorder import EventRecorder
+from klayout_gui_automation.event_replayer import EventReplayer
+from klayout_gui_automation.qwidget_helpers import is_qdialog
+from klayout_gui_automation.recording import read_recording
+from klayout_gui_automation.replay_timing import ReplayClock, ReplaySpeed, ReplayTiming
+from klayout_gui_automation.text_injection import TextInjectionMode
+from klayout_gui_automation.widget_path import WidgetPath
+from klayout_gui_automation.widget_selector import compile_selector
+
+
+AUTOMATION_SOCKET_ENV = 'KLAYOUT_GUI_AUTOMATION_SOCKET'
+
+CommandHandler = Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class _Connection:
+    sock: socket.socket
+    notifier: pya.QSocketNotifier        # readable
+    write_notifier: pya.QSocketNotifier  # writable, enabled while output is pending
+    buffer: bytearray = field(default_factory=bytearray)
+    output: bytearray = field(default_factory=bytearray)
+
+
+class AutomationServer:
+    def __init__(self, 
+                 socket_path: str,
+                 replayer: EventReplayer,
+                 recorder: Optional[EventRecorder] = None,
+                 max_output_size: int = 64 << 20):
+        self.socket_path = socket_path
+        self.replayer = replayer
+        self.recorder = recorder
+        self.max_output_size = max_output_size
+        self.commands: Dict[str, CommandHandler] = self.default_commands()
+        
+        self._socket: Optional[socket.socket] = None
+        self._notifier: Optional[pya.QSocketNotifier] = None
+        self._connections: Dict[int, _Connection] = {}
+        self._pending: Deque[Tuple[int, bytes]] = deque()
+        self._busy = False
+    
+    def default_commands(self) -> Dict[str, CommandHandler]:
+        return {
+            'ping': self.ping,
+            'replay': self.replay,
+            'replay_events': self.replay_events,
+            'select': self.select,
+            'probe': self.probe,
+            'reset': self.reset,
+        }
+    
+    def register_command(self, name: str, handler: CommandHandler):
+        self.commands[name] = handler
+    
+    @property
+    def running(self) -> bool:
+        return self._socket is not None
+    
+    def start(self):
+        if self.running:
+            return
+        
+        self._remove_stale_socket()
+        
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        sock.listen(8)
+        sock.setblocking(False)
+        self._socket = sock
+        
+        self._notifier = pya.QSocketNotifier(sock.fileno(), pya.QSocketNotifier.Read)
+        self._notifier.activated.connect(lambda *args: self._on_accept())
+        
+        if Debugging.DEBUG:
+            debug(f"AutomationServer.start: listening on {self.socket_path}")
+    
+    def _remove_stale_socket(self):
+        try:
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                return  # not ours to remove, bind() reports it
+        except FileNotFoundError:
+            return
+        
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except ConnectionRefusedError:
+            os.unlink(self.socket_path)  # nobody listens, stale socket of a previous process
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another process (e.g. KLayout instance) is listening on {self.socket_path}")
+    
+    def stop(self):
+        if not self.running:
+            return
+        for cid in list(self._connections):
+            self._close(cid)
+        self._notifier.enabled = False
+        self._notifier = None
+        self._socket.close()
+        self._socket = None
+        self._pending.clear()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+    
+    def _on_accept(self):
+        try:
+            conn, _ = self._socket.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        cid = conn.fileno()
+        notifier = pya.QSocketNotifier(cid, pya.QSocketNotifier.Read)
+        notifier.activated.connect(lambda *args, cid=cid: self._on_readable(cid))
+        write_notifier = pya.QSocketNotifier(cid, pya.QSocketNotifier.Write)
+        write_notifier.enabled = False
+        write_notifier.activated.connect(lambda *args, cid=cid: self._on_writable(cid))
+        self._connections[cid] = _Connection(sock=conn, notifier=notifier, write_notifier=write_notifier)
+    
+    def _on_readable(self, cid: int):
+        c = self._connections.get(cid)
+        if c is None:
+            return
+        try:
+            data = c.sock.recv(1 << 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(cid)
+            return
+        
+        c.buffer += data
+        while True:
+            nl = c.buffer.find(b'\n')
+            if nl < 0:
+                break
+            line = bytes(c.buffer[:nl])
+            del c.buffer[:nl + 1]
+            if line.strip():
+                self._pending.append((cid, line))
+        self._process_pending()
+    
+    def _close(self, cid: int):
+        c = self._connections.pop(cid, None)
+        if c is None:
+            return
+        c.notifier.enabled = False
+        c.write_notifier.enabled = False
+        c.sock.close()
+    
+    def _on_writable(self, cid: int):
+        c = self._connections.get(cid)
+        if c is not None:
+            self._write(cid, c)
+    
+    def _write(self, cid: int, c: _Connection):
+        try:
+            while c.output:
+                sent = c.sock.send(c.output)
+                del c.output[:sent]
+        except BlockingIOError:
+            pass  # the write notifier continues when the client reads
+        except OSError as e:
+            if Debugging.DEBUG:
+                debug(f"AutomationServer._write: closing connection {cid}: {e!r}")
+            self._close(cid)
+            return
+        c.write_notifier.enabled = bool(c.output)
+    
+    def _send(self, cid: int, data: bytes):
+        c = self._connections.get(cid)
+        if c is None:
+            return
+        if len(c.output) + len(data) > self.max_output_size:
+            if Debugging.DEBUG:
+                debug(f"AutomationServer._send: closing connection {cid}, client does not read its responses")
+            self._close(cid)
+            return
+        c.output += data
+        self._write(cid, c)
+    
+    def _process_pending(self):
+        if self._busy:
+            return  # the command currently running processes the queue when done
+        self._busy = True
+        try:
+            while self._pending:
+                cid, line = self._pending.popleft()
+                response = self.handle_request(line)
+                self._send(cid, json.dumps(response).encode('utf-8') + b'\n')
+        finally:
+            self._busy = False
+    
+    def handle_request(self, line: bytes) -> Dict[str, Any]:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            command = request['command']
+            handler = self.commands.get(command)
+            if handler is None:
+                raise KeyError(f"Unknown command {command!r}, expected one of {sorted(self.commands)}")
+            result = handler(request.get('args') or {})
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            if Debugging.DEBUG:
+                debug(f"AutomationServer.handle_request: {''.join(traceback.format_exception(e))}")
+            return {'id': request_id, 'ok': False, 'error': str(e), 'type': type(e).__name__}
+    
+    #----------------------------------------------------------------------------------
+    
+    def ping(self, args: Dict[str, Any]) -> Any:
+        return {'pid': os.getpid()}
+    
+    def _replay(self, events: Iterable[Event], args: Dict[str, Any]) -> Dict[str, Any]:
+        clock = self.replayer.clock
+        if 'speed' in args:
+            self.replayer.clock = ReplayClock(ReplayTiming(speed=ReplaySpeed(args['speed']),
+                                                           speed_factor=args.get('speed_factor', 1.0)))
+        try:
+            text_injection = TextInjectionMode(args['text_injection']) if 'text_injection' in args else None
+            statistics = self.replayer.replay(events, 
+                                              stop_on_error=args.get('stop_on_error', True),
+                                              text_injection=text_injection)
+        finally:
+            self.replayer.clock = clock
+        return {
+            'steps': statistics.steps,
+            'unresolved': statistics.unresolved,
+            'mean_resolve_us': statistics.mean_resolve_us,
+            'wait_ms': statistics.total_wait_ms,
+            'summary': str(statistics),
+        }
+    
+    def replay(self, args: Dict[str, Any]) -> Any:
+        return self._replay(read_recording(args['recording']), args)
+    
+    def replay_events(self, args: Dict[str, Any]) -> Any:
+        return self._replay([event_from_json(e) for e in args['events']], args)
+    
+    def _select(self, selector: str, limit: Optional[int] = None) -> List[pya.QWidget]:
+        resolver = self.replayer.resolver
+        sibling_index = resolver.sibling_index if resolver.active else None  # index is only up to date while active
+        return compile_selector(selector).select(None, sibling_index, limit=limit)
+    
+    def select(self, args: Dict[str, Any]) -> Any:
+        return [
+            {
+                'class': type(w).__name__,
+                'name': w.objectName,
+                'visible': w.visible,
+                'xpath': WidgetPath.for_widget(w).xpath(),
+            }
+            for w in self._select(args['selector'], args.get('limit'))
+        ]
+    
+    def probe(self, args: Dict[str, Any]) -> Any:
+        if self.recorder is None:
+            raise RuntimeError("No recorder, probes are not available")
+        widgets = self._select(args['selector'], limit=1)
+        if not widgets:
+            raise LookupError(f"No widget matches {args['selector']!r}")
+        return self.recorder.probe_std(widgets[0])
+    
+    def reset(self, args: Dict[str, Any]) -> Any:
+        """
+        Brings the application back to a neutral state between tests:
+        closes open dialogs and (unless close_views is false) all layout views
+        """
+        closed_dialogs = 0
+        for w in pya.QApplication.topLevelWidgets():
+            if is_qdialog(w) and w.visible:
+                w.reject()
+                closed_dialogs += 1
+        
+        closed_views = 0
+        mw = pya.MainWindow.instance()
+        if mw is not None and args.get('close_views', True):
+            closed_views = mw.views()
+            mw.close_all()
+        
+        pya.QApplication.processEvents()
+        return {'closed_dialogs': closed_dialogs, 'closed_views': closed_views}
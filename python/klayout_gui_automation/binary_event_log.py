@@ -0,0 +1,243 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from enum import IntEnum
+import io
+import json
+import os
+from pathlib import Path
+import struct
+import time
+from typing import *
+import zlib
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import Event, KeyEvent, MouseEvent, QtEventType, ResizeEvent
+from klayout_gui_automation.event_codec import (
+    payload_from_json, payload_to_json, widget_path_from_json, widget_path_to_json
+)
+from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.widget_path import WidgetPath
+
+#
+# Streaming, append-only binary recording log
+#
+# File layout:
+#     header:  MAGIC, <H format version>
+#     records: <I body length> <I crc32 of body> body
+#
+# Each body starts with a <B record type>. Target paths are deduplicated:
+# a PATH record defines a path id before its first use by any event record.
+# A record which is incomplete, empty or fails its checksum marks the end of the
+# usable log (e.g. the tail written while KLayout crashed, possibly zero-filled) 
+# and is dropped.
+#
+# The plugin writes one log per recording session into the directory given by
+# KLAYOUT_GUI_AUTOMATION_RECORDING_DIR, compacted into an event archive on stop.
+#
+
+RECORDING_DIR_ENV = 'KLAYOUT_GUI_AUTOMATION_RECORDING_DIR'
+
+MAGIC = b'KGAL'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+_RECORD_HEADER = struct.Struct('<II')
+_EVENT_HEADER = struct.Struct('<BIq')  # record type, path id, timestamp
+_MOUSE = struct.Struct('<BiiiiIIB')     # type, x, y, global_x, global_y, button, buttons, modifiers
+_KEY = struct.Struct('<BIB')            # type, key, modifiers (followed by the UTF-8 text)
+_RESIZE = struct.Struct('<Biiii')       # type, old_width, old_height, new_width, new_height
+_PATH = struct.Struct('<BI')            # record type, path id (followed by the JSON path)
+
+
+class RecordType(IntEnum):
+    PATH = 1
+    MOUSE_EVENT = 2
+    KEY_EVENT = 3
+    RESIZE_EVENT = 4
+    JSON_EVENT = 5  # any other event kind, payload as JSON
+
+
+class BinaryEventLogWriter(EventHandler):
+    def __init__(self, 
+                 path: os.PathLike | str, 
+                 fsync_interval: float = 1.0,
+                 buffer_size: int = 64 * 1024):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        
+        self._file: Optional[io.BufferedWriter] = open(self.path, 'wb', buffering=buffer_size)
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+        self._path_ids: Dict[WidgetPath, int] = {}
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        self.event_count = 0
+    
+    def _write_record(self, body: bytes):
+        self._file.write(_RECORD_HEADER.pack(len(body), zlib.crc32(body)))
+        self._file.write(body)
+    
+    def _path_id(self, path: WidgetPath) -> int:
+        pid = self._path_ids.get(path)
+        if pid is None:
+            pid = len(self._path_ids)
+            self._path_ids[path] = pid
+            data = json.dumps(widget_path_to_json(path), separators=(',', ':')).encode('utf-8')
+            self._write_record(_PATH.pack(RecordType.PATH, pid) + data)
+        return pid
+    
+    def handle_event(self, event: Event):
+        if self._file is None:
+            raise RuntimeError(f"BinaryEventLogWriter: log {self.path} is already closed")
+        
+        pid = self._path_id(event.target)
+        e = event.event
+        match event.kind:
+            case Event.Kind.MOUSE_EVENT:
+                body = _EVENT_HEADER.pack(RecordType.MOUSE_EVENT, pid, event.timestamp) +\
+                       _MOUSE.pack(e.type, e.x, e.y, e.global_x, e.global_y, e.button, e.buttons, e.modifiers)
+            case Event.Kind.KEY_EVENT if e.repeat_count == 1 and not e.auto_repeat:  # autorepeats as JSON
+                body = _EVENT_HEADER.pack(RecordType.KEY_EVENT, pid, event.timestamp) +\
+                       _KEY.pack(e.type, e.key, e.modifiers) + e.text.encode('utf-8')
+            case Event.Kind.RESIZE_EVENT:
+                body = _EVENT_HEADER.pack(RecordType.RESIZE_EVENT, pid, event.timestamp) +\
+                       _RESIZE.pack(e.type, e.old_width, e.old_height, e.new_width, e.new_height)
+            case _:
+                data = {'kind': event.kind.value, 'event': payload_to_json(e)}
+                body = _EVENT_HEADER.pack(RecordType.JSON_EVENT, pid, event.timestamp) +\
+                       json.dumps(data, separators=(',', ':')).encode('utf-8')
+        self._write_record(body)
+        self.event_count += 1
+        self._unsynced = True
+        
+        now = time.monotonic()
+        if now - self._last_fsync >= self.fsync_interval:
+            self._sync(now)
+    
+    def _sync(self, now: Optional[float] = None):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_fsync = now if now is not None else time.monotonic()
+        self._unsynced = False
+    
+    def flush(self):
+        if self._file is not None:
+            self._sync()
+    
+    def release(self):
+        # the recorder went idle (or the latency deadline passed, see AsyncEventHandler),
+        # handle_event() won't sync the last events until the next one arrives
+        if self._file is not None and self._unsynced:
+            self._sync()
+    
+    def close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+
+class BinaryEventLogReader:
+    """
+    Lazily yields the events of a binary log.
+    
+    After iteration, valid_length is the size of the intact prefix of the file
+    and truncated tells whether a damaged tail was dropped.
+    """
+    
+    def __init__(self, path: os.PathLike | str):
+        self.path = Path(path)
+        self.valid_length = 0
+        self.truncated = False
+    
+    def __iter__(self) -> Iterator[Event]:
+        paths: Dict[int, WidgetPath] = {}
+        with open(self.path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                self.truncated = len(header) > 0
+                return
+            magic, version = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a GUI automation event log")
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{self.path}: unsupported event log version {version}")
+            self.valid_length = _HEADER.size
+            
+            while True:
+                record_header = f.read(_RECORD_HEADER.size)
+                if not record_header:
+                    return
+                if len(record_header) < _RECORD_HEADER.size:
+                    break
+                length, crc = _RECORD_HEADER.unpack(record_header)
+                if length == 0:  # zero-filled tail, crc32(b'') == 0 would pass
+                    break
+                body = f.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    break
+                if len(body) < (_PATH.size if body[0] == RecordType.PATH else _EVENT_HEADER.size):
+                    break
+                self.valid_length += _RECORD_HEADER.size + length
+                
+                if body[0] == RecordType.PATH:
+                    _, pid = _PATH.unpack_from(body)
+                    paths[pid] = widget_path_from_json(json.loads(body[_PATH.size:].decode('utf-8')))
+                    continue
+                
+                yield self._decode_event(body, paths)
+        
+        self.truncated = True
+        if Debugging.DEBUG:
+            debug(f"BinaryEventLogReader: dropped truncated tail of {self.path} "
+                  f"after {self.valid_length} bytes")
+    
+    @staticmethod
+    def _decode_event(body: bytes, paths: Dict[int, WidgetPath]) -> Event:
+        record_type, pid, timestamp = _EVENT_HEADER.unpack_from(body)
+        offset = _EVENT_HEADER.size
+        target = paths[pid]
+        match record_type:
+            case RecordType.MOUSE_EVENT:
+                t, x, y, gx, gy, button, buttons, modifiers = _MOUSE.unpack_from(body, offset)
+                return Event(kind=Event.Kind.MOUSE_EVENT, target=target, timestamp=timestamp,
+                             event=MouseEvent(type=QtEventType(t), x=x, y=y, global_x=gx, global_y=gy,
+                                              button=button, buttons=buttons, modifiers=modifiers))
+            case RecordType.KEY_EVENT:
+                t, key, modifiers = _KEY.unpack_from(body, offset)
+                text = body[offset + _KEY.size:].decode('utf-8')
+                return Event(kind=Event.Kind.KEY_EVENT, target=target, timestamp=timestamp,
+                             event=KeyEvent(type=QtEventType(t), key=key, text=text, modifiers=modifiers))
+            case RecordType.RESIZE_EVENT:
+                t, ow, oh, nw, nh = _RESIZE.unpack_from(body, offset)
+                return Event(kind=Event.Kind.RESIZE_EVENT, target=target, timestamp=timestamp,
+                             event=ResizeEvent(type=QtEventType(t), old_width=ow, old_height=oh,
+                                               new_width=nw, new_height=nh))
+            case RecordType.JSON_EVENT:
+                data = json.loads(body[offset:].decode('utf-8'))
+                kind = Event.Kind(data['kind'])
+                return Event(kind=kind, target=target, timestamp=timestamp,
+                             event=payload_from_json(kind, data['event']))
+            case _:
+                raise ValueError(f"unknown event log record type {record_type}")
+
+
+def read_binary_event_log(path: os.PathLike | str) -> Iterator[Event]:
+    yield from BinaryEventLogReader(path)
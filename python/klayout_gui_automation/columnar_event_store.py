@@ -0,0 +1,255 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from array import array
+import threading
+from typing import *
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import Event, KeyEvent, MouseEvent, QtEventType, ResizeEvent
+from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.widget_path import WidgetPath
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, queries fall back to plain Python
+    np = None
+
+
+_KINDS: List[Event.Kind] = list(Event.Kind)
+_KIND_INDEX: Dict[Event.Kind, int] = {k: i for i, k in enumerate(_KINDS)}
+
+
+def event_to_row(event: Event) -> Tuple[int, int, int, int, int, int, int, int, int, int, Any]:
+    """
+    Splits an event into its column values:
+    (kind, type, x, y, global_x, global_y, button, buttons, modifiers, key, extra)
+    """
+    e = event.event
+    x = y = gx = gy = button = buttons = modifiers = key = 0
+    event_type = QtEventType.None_
+    extra = None
+    match event.kind:
+        case Event.Kind.MOUSE_EVENT:
+            event_type = e.type
+            x, y, gx, gy = e.x, e.y, e.global_x, e.global_y
+            button, buttons, modifiers = e.button, e.buttons, e.modifiers
+        case Event.Kind.KEY_EVENT:
+            event_type = e.type
+            key, modifiers = e.key, e.modifiers
+            # autorepeats are rare, their payload is kept as a whole
+            extra = e.text or None if e.repeat_count == 1 and not e.auto_repeat else e
+        case Event.Kind.RESIZE_EVENT:
+            event_type = e.type
+            x, y, gx, gy = e.new_width, e.new_height, e.old_width, e.old_height
+        case _:
+            extra = e
+    return (_KIND_INDEX[event.kind], int(event_type), x, y, gx, gy, button, buttons, modifiers, key, extra)
+
+
+def event_from_row(kind: int, event_type: int, target: WidgetPath, timestamp: int,
+                   x: int, y: int, global_x: int, global_y: int,
+                   button: int, buttons: int, modifiers: int, key: int,
+                   extra: Any) -> Event:
+    k = _KINDS[kind]
+    match k:
+        case Event.Kind.MOUSE_EVENT:
+            payload = MouseEvent(type=QtEventType(event_type), x=x, y=y, global_x=global_x, global_y=global_y,
+                                 button=button, buttons=buttons, modifiers=modifiers)
+        case Event.Kind.KEY_EVENT if isinstance(extra, KeyEvent):
+            payload = extra
+        case Event.Kind.KEY_EVENT:
+            payload = KeyEvent(type=QtEventType(event_type), key=key, text=extra or '', modifiers=modifiers)
+        case Event.Kind.RESIZE_EVENT:
+            payload = ResizeEvent(type=QtEventType(event_type), old_width=global_x, old_height=global_y,
+                                  new_width=x, new_height=y)
+        case _:
+            payload = extra
+    return Event(kind=k, target=target, event=payload, timestamp=timestamp)
+
+
+class ColumnarEventStore(EventHandler):
+    """
+    Stores recorded events column-wise in typed arrays instead of Event objects,
+    so memory grows with the number of events, not with the number of objects.
+    
+    Column layout per row:
+        kind                    index into Event.Kind
+        type                    QtEventType (0 if the payload has no type)
+        target                  index into the interned target table (paths)
+        timestamp               capture time in ns
+        x, y                    mouse: local position, resize: new size
+        global_x, global_y      mouse: global position, resize: old size
+        button, buttons, modifiers, key
+    
+    Payloads without a columnar representation (key text, probe data, ...)
+    are kept in a sparse side table.
+    """
+    
+    COLUMNS: Dict[str, str] = {
+        'kind': 'B',
+        'type': 'H',
+        'target': 'I',
+        'timestamp': 'q',
+        'x': 'i',
+        'y': 'i',
+        'global_x': 'i',
+        'global_y': 'i',
+        'button': 'I',
+        'buttons': 'I',
+        'modifiers': 'B',
+        'key': 'I',
+    }
+    
+    def __init__(self):
+        self._columns: Dict[str, array] = {name: array(code) for name, code in self.COLUMNS.items()}
+        self._extras: Dict[int, Any] = {}
+        self.paths: List[WidgetPath] = []
+        self._path_index: Dict[WidgetPath, int] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._columns['kind'])
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(c.itemsize * len(c) for c in self._columns.values())
+    
+    def flush(self):
+        pass
+    
+    def clear(self):
+        with self._lock:
+            for c in self._columns.values():
+                del c[:]
+            self._extras.clear()
+            self.paths.clear()
+            self._path_index.clear()
+    
+    def target_index(self, path: WidgetPath) -> Optional[int]:
+        return self._path_index.get(path)
+    
+    def _intern_path(self, path: WidgetPath) -> int:
+        idx = self._path_index.get(path)
+        if idx is None:
+            idx = len(self.paths)
+            self.paths.append(path)
+            self._path_index[path] = idx
+        return idx
+    
+    def handle_event(self, event: Event):
+        kind, event_type, x, y, gx, gy, button, buttons, modifiers, key, extra = event_to_row(event)
+        c = self._columns
+        with self._lock:
+            row = len(c['kind'])
+            c['kind'].append(kind)
+            c['type'].append(event_type)
+            c['target'].append(self._intern_path(event.target))
+            c['timestamp'].append(event.timestamp)
+            c['x'].append(x)
+            c['y'].append(y)
+            c['global_x'].append(gx)
+            c['global_y'].append(gy)
+            c['button'].append(button)
+            c['buttons'].append(buttons)
+            c['modifiers'].append(modifiers)
+            c['key'].append(key)
+            if extra is not None:
+                self._extras[row] = extra
+    
+    def column(self, name: str) -> Sequence[int]:
+        """
+        Copy of one column, a numpy array if numpy is available
+        """
+        with self._lock:
+            col = self._columns[name]
+            if np is None:
+                return array(col.typecode, col)
+            # NOTE: copy, a buffer view would block further appends
+            return np.frombuffer(col, dtype=col.typecode).copy() if len(col) else np.zeros(0, dtype=col.typecode)
+    
+    def event(self, row: int) -> Event:
+        """
+        Materializes a single event
+        """
+        with self._lock:
+            c = self._columns
+            return event_from_row(kind=c['kind'][row], event_type=c['type'][row],
+                                  target=self.paths[c['target'][row]], timestamp=c['timestamp'][row],
+                                  x=c['x'][row], y=c['y'][row], 
+                                  global_x=c['global_x'][row], global_y=c['global_y'][row],
+                                  button=c['button'][row], buttons=c['buttons'][row],
+                                  modifiers=c['modifiers'][row], key=c['key'][row],
+                                  extra=self._extras.get(row))
+    
+    def events(self, rows: Optional[Iterable[int]] = None) -> Iterator[Event]:
+        if rows is None:
+            rows = range(len(self))
+        for row in rows:
+            yield self.event(int(row))
+    
+    #---------------------------------------------------------------------------------
+    #--------------------------------  Queries   -------------------------------------
+    #---------------------------------------------------------------------------------
+    
+    def select(self,
+               kind: Optional[Event.Kind] = None,
+               event_type: Optional[QtEventType] = None,
+               target: Optional[WidgetPath] = None,
+               t_min: Optional[int] = None,
+               t_max: Optional[int] = None) -> Sequence[int]:
+        """
+        Row indices matching all given criteria (vectorized if numpy is available),
+        the time window is [t_min, t_max)
+        """
+        criteria: List[Tuple[str, Callable]] = []
+        if kind is not None:
+            criteria.append(('kind', lambda v, k=_KIND_INDEX[kind]: v == k))
+        if event_type is not None:
+            criteria.append(('type', lambda v, t=int(event_type): v == t))
+        if target is not None:
+            idx = self.target_index(target)
+            if idx is None:
+                return np.zeros(0, dtype=np.int64) if np is not None else []
+            criteria.append(('target', lambda v, i=idx: v == i))
+        if t_min is not None:
+            criteria.append(('timestamp', lambda v, t=t_min: v >= t))
+        if t_max is not None:
+            criteria.append(('timestamp', lambda v, t=t_max: v < t))
+        
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            for name, predicate in criteria:
+                col = self.column(name)
+                mask &= predicate(col[:len(mask)])
+            return np.flatnonzero(mask)
+        
+        columns = {name: self.column(name) for name, _ in criteria}
+        n = min((len(c) for c in columns.values()), default=len(self))
+        return [row for row in range(n)
+                if all(predicate(columns[name][row]) for name, predicate in criteria)]
+    
+    def presses_on(self, target: WidgetPath) -> Sequence[int]:
+        return self.select(kind=Event.Kind.MOUSE_EVENT, 
+                           event_type=QtEventType.MouseButtonPress, 
+                           target=target)
+    
+    def in_time_window(self, t_min: int, t_max: int) -> Sequence[int]:
+        return self.select(t_min=t_min, t_max=t_max)
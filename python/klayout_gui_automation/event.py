@@ -18,6 +18,7 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
+from enum import IntEnum
 from typing import *
 
 import pya
@@ -26,69 +27,260 @@ from klayout_plugin_utils.str_enum_compat import StrEnum
 
 from klayout_gui_automation.widget_path import WidgetPath
 
+#---------------------------------------------------------------------------------
+#------------------------------  Qt-free snapshots  ------------------------------
+#---------------------------------------------------------------------------------
+
+# NOTE: events are captured in the GUI thread, but processed by the combiners and handlers
+#       in a worker thread (see AsyncEventHandler), so they must not hold any pya objects.
+
+class QtEventType(IntEnum):
+    # values of QEvent::Type (stable across Qt versions)
+    None_ = 0
+    MouseButtonPress = 2
+    MouseButtonRelease = 3
+    MouseButtonDblClick = 4
+    MouseMove = 5
+    KeyPress = 6
+    KeyRelease = 7
+    Resize = 14
+    Wheel = 31
+
+
+def qt_int(value: Any) -> int:
+    """
+    Converts a pya enum or flags value (or a getter returning one) into a plain int
+    """
+    if callable(value):  # e.g. modifiers is a getter method in some KLayout versions
+        value = value()
+    if isinstance(value, int):
+        return value
+    return value.to_i()
+
+
+class Point(NamedTuple):
+    x: int
+    y: int
+
+    @classmethod
+    def from_qt(cls, p: pya.QPoint) -> Point:
+        return Point(p.x, p.y)
+
+    def __add__(self, other: Point) -> Point:
+        return Point(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other: Point) -> Point:
+        return Point(self.x - other.x, self.y - other.y)
+
+
+class Size(NamedTuple):
+    width: int
+    height: int
+
+    @classmethod
+    def from_qt(cls, s: pya.QSize) -> Size:
+        return Size(s.width, s.height)
+
+# Qt::KeyboardModifier bits start at 0x02000000 (Shift), records store them shifted down,
+# so all enum-like fields fit into the small int range (shared int objects, no allocation)
+MODIFIER_SHIFT = 25
+
+
+def compact_modifiers(qt_modifiers: int) -> int:
+    return qt_modifiers >> MODIFIER_SHIFT
+
+
+def expand_modifiers(modifiers: int) -> int:
+    return modifiers << MODIFIER_SHIFT
+
 #---------------------------------------------------------------------------------
 #------------------------------  Low Level Events   ------------------------------
 #---------------------------------------------------------------------------------
 
-@dataclass
+# NOTE: long recordings hold hundreds of thousands of these records,
+#       so they are slotted and consist of plain ints only.
+#       Qt types are created only at replay time (to_qt).
+
+@dataclass(slots=True)
 class MouseEvent:
-    type: pya.QEvent.Type
-    pos: pya.QPoint
-    global_pos: pya.QPoint
-    button: pya.Qt.MouseButton
-    buttons: pya.Qt_QFlags_MouseButton
-    modifiers: pya.Qt_QFlags_KeyboardModifier
+    type: QtEventType
+    x: int
+    y: int
+    global_x: int
+    global_y: int
+    button: int     # Qt::MouseButton
+    buttons: int    # Qt::MouseButtons
+    modifiers: int  # Qt::KeyboardModifiers, see compact_modifiers()
+    # LayoutView.mode_name() at a press, set in the GUI thread for the GestureRecognizer,
+    # not kept by the binary formats
+    edit_mode: Optional[str] = None
     
     @classmethod
     def from_qt(cls, e: pya.QMouseEvent) -> MouseEvent:
+        pos = e.pos()
+        global_pos = e.globalPos()
         return MouseEvent(
-            type=e.type(),
-            pos=e.pos(),
-            global_pos=e.globalPos(),
-            button=e.button(),
-            buttons=e.buttons(),
-            modifiers=e.modifiers
+            type=QtEventType(qt_int(e.type())),
+            x=pos.x,
+            y=pos.y,
+            global_x=global_pos.x,
+            global_y=global_pos.y,
+            button=qt_int(e.button()),
+            buttons=qt_int(e.buttons()),
+            modifiers=compact_modifiers(qt_int(e.modifiers))
+        )
+    
+    @property
+    def pos(self) -> Point:
+        return Point(self.x, self.y)
+    
+    @property
+    def global_pos(self) -> Point:
+        return Point(self.global_x, self.global_y)
+    
+    @property
+    def qt_modifiers(self) -> int:
+        return expand_modifiers(self.modifiers)
+    
+    def to_qt(self) -> pya.QMouseEvent:
+        return pya.QMouseEvent(
+            pya.QEvent.Type(int(self.type)),
+            pya.QPointF(self.x, self.y),
+            pya.QPointF(self.global_x, self.global_y),
+            pya.Qt.MouseButton(self.button),
+            pya.Qt_QFlags_MouseButton(self.buttons),
+            pya.Qt_QFlags_KeyboardModifier(self.qt_modifiers)
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class KeyEvent:
-    type: pya.QEvent.Type
+    type: QtEventType
     key: int
     text: str
-    modifiers: pya.Qt_QFlags_KeyboardModifier
+    modifiers: int  # Qt::KeyboardModifiers, see compact_modifiers()
+    auto_repeat: bool = False
+    repeat_count: int = 1  # > 1: a press followed by autorepeats, see LowLevelEventCombiner
    
     @classmethod
     def from_qt(cls, e: pya.QKeyEvent) -> KeyEvent:
         return KeyEvent(
-            type=e.type(),
+            type=QtEventType(qt_int(e.type())),
             key=e.key(),
             text=e.text(),
-            modifiers=e.modifiers
+            modifiers=compact_modifiers(qt_int(e.modifiers)),
+            auto_repeat=e.isAutoRepeat()
+        )
+    
+    @property
+    def qt_modifiers(self) -> int:
+        return expand_modifiers(self.modifiers)
+    
+    def to_qt(self) -> pya.QKeyEvent:
+        return pya.QKeyEvent(
+            pya.QEvent.Type(int(self.type)),
+            self.key,
+            pya.Qt_QFlags_KeyboardModifier(self.qt_modifiers),
+            self.text,
+            self.auto_repeat
         )
    
     
-@dataclass
+@dataclass(slots=True)
 class ResizeEvent:
-    type: pya.QEvent.Type
-    old_size: pya.QSize
-    new_size: pya.QSize
+    type: QtEventType
+    old_width: int
+    old_height: int
+    new_width: int
+    new_height: int
 
     @classmethod
     def from_qt(cls, e: pya.QResizeEvent) -> ResizeEvent:
+        old_size = e.oldSize()
+        new_size = e.size()
         return ResizeEvent(
-            type=e.type(),
-            old_size=e.oldSize(),
-            new_size=e.size()
+            type=QtEventType(qt_int(e.type())),
+            old_width=old_size.width,
+            old_height=old_size.height,
+            new_width=new_size.width,
+            new_height=new_size.height
         )
+    
+    @property
+    def old_size(self) -> Size:
+        return Size(self.old_width, self.old_height)
+    
+    @property
+    def new_size(self) -> Size:
+        return Size(self.new_width, self.new_height)
+    
+    def to_qt(self) -> pya.QResizeEvent:
+        return pya.QResizeEvent(pya.QSize(self.new_width, self.new_height),
+                                pya.QSize(self.old_width, self.old_height))
 
 
-@dataclass
+@dataclass(slots=True)
+class WheelEvent:
+    type: QtEventType
+    x: int
+    y: int
+    global_x: int
+    global_y: int
+    angle_delta_x: int  # 1/8 degree, 120 per notch of a standard wheel
+    angle_delta_y: int
+    buttons: int    # Qt::MouseButtons
+    modifiers: int  # Qt::KeyboardModifiers, see compact_modifiers()
+    count: int = 1  # number of wheel events coalesced, see LowLevelEventCombiner
+    
+    @classmethod
+    def from_qt(cls, e: pya.QWheelEvent) -> WheelEvent:
+        # position()/globalPosition() replace pos()/globalPos() since Qt 5.14
+        if hasattr(e, 'position'):
+            pos = e.position().toPoint()
+            global_pos = e.globalPosition().toPoint()
+        else:
+            pos = e.pos()
+            global_pos = e.globalPos()
+        angle_delta = e.angleDelta()
+        return WheelEvent(
+            type=QtEventType.Wheel,
+            x=pos.x,
+            y=pos.y,
+            global_x=global_pos.x,
+            global_y=global_pos.y,
+            angle_delta_x=angle_delta.x,
+            angle_delta_y=angle_delta.y,
+            buttons=qt_int(e.buttons()),
+            modifiers=compact_modifiers(qt_int(e.modifiers))
+        )
+    
+    @property
+    def pos(self) -> Point:
+        return Point(self.x, self.y)
+    
+    @property
+    def qt_modifiers(self) -> int:
+        return expand_modifiers(self.modifiers)
+    
+    def to_qt(self) -> pya.QWheelEvent:
+        return pya.QWheelEvent(
+            pya.QPointF(self.x, self.y),
+            pya.QPointF(self.global_x, self.global_y),
+            pya.QPoint(0, 0),
+            pya.QPoint(self.angle_delta_x, self.angle_delta_y),
+            pya.Qt_QFlags_MouseButton(self.buttons),
+            pya.Qt_QFlags_KeyboardModifier(self.qt_modifiers),
+            pya.Qt.NoScrollPhase,
+            False
+        )
+
+
+@dataclass(slots=True)
 class ActionEvent:
-    action_name: str
+    action_name: str  # menu item path, e.g. "file_menu.open", see ActionIndex
 
     
-@dataclass
+@dataclass(slots=True)
 class ProbeEvent:
     data: Any
 
@@ -96,20 +288,83 @@ class ProbeEvent:
 #-----------------------------  High Level Events   ------------------------------
 #---------------------------------------------------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class ClickEvent:
-    pass
+    button: int = 1     # Qt::LeftButton
+    x: int = -1         # position within the target, -1: center of the target
+    y: int = -1
+    modifiers: int = 0  # see compact_modifiers()
+    count: int = 1      # 2: double click (both clicks)
+
+
+@dataclass(slots=True)
+class DragEvent:
+    button: int
+    modifiers: int
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    waypoints: Tuple[Tuple[int, int], ...] = ()  # simplified path between start and end
+    box_select: bool = False  # label: left drag on the canvas in selection mode
     
+    def __post_init__(self):
+        self.waypoints = tuple(tuple(p) for p in self.waypoints)  # JSON gives lists
 
-@dataclass
+
+@dataclass(slots=True)
+class ZoomEvent:
+    x: int
+    y: int
+    angle_delta_x: int  # accumulated over the wheel burst
+    angle_delta_y: int
+    modifiers: int
+    steps: int = 1      # number of wheel events merged
+
+
+@dataclass(slots=True)
 class TypeEvent:
     text: str
 
+#---------------------------------------------------------------------------------
+#------------------------------  View State Events  ------------------------------
+#---------------------------------------------------------------------------------
+
+# NOTE: captured from pya.LayoutView signals (see ViewStateRecorder),
+#       they hold the resulting state, so replaying them is idempotent.
+
+@dataclass(slots=True)
+class ActiveCellViewEvent:
+    cellview_index: int
+
+
+@dataclass(slots=True)
+class CurrentCellEvent:
+    cellview_index: int
+    cell_name: str
+
+
+@dataclass(slots=True)
+class ViewportEvent:
+    # visible area in micrometers
+    left: float
+    bottom: float
+    right: float
+    top: float
+
+
+@dataclass(slots=True)
+class LayerVisibilityEvent:
+    source: str  # LayerProperties.source, e.g. "1/0@1"
+    visible: bool
+    group: str = ''  # names of the enclosing groups, joined by '/'
+    name: str = ''
+
 #---------------------------------------------------------------------------------
 #------------------------------  Low Level Events   ------------------------------
 #---------------------------------------------------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class Event:
     class Kind(StrEnum):
         MOUSE_EVENT = 'mouse_event'
@@ -119,11 +374,20 @@ class Event:
         PROBE_EVENT = 'probe_event'
         CLICK_EVENT = 'click_event'
         TYPE_EVENT = 'type_event'
+        WHEEL_EVENT = 'wheel_event'
+        DRAG_EVENT = 'drag_event'
+        ZOOM_EVENT = 'zoom_event'
+        ACTIVE_CELLVIEW_EVENT = 'active_cellview_event'
+        CURRENT_CELL_EVENT = 'current_cell_event'
+        VIEWPORT_EVENT = 'viewport_event'
+        LAYER_VISIBILITY_EVENT = 'layer_visibility_event'
 
     kind: Event.Kind
     target: WidgetPath
-    event: MouseEvent | KeyEvent | ResizeEvent | ActionEvent | ProbeEvent\
-           | ClickEvent | TypeEvent
+    event: MouseEvent | KeyEvent | ResizeEvent | WheelEvent | ActionEvent | ProbeEvent\
+           | ClickEvent | TypeEvent | DragEvent | ZoomEvent\
+           | ActiveCellViewEvent | CurrentCellEvent | ViewportEvent | LayerVisibilityEvent
+    timestamp: int = 0  # time.monotonic_ns() at capture time (in the GUI thread)
 
     def __str__(self) -> str:
         return f"{self.kind.value} {self.target.xpath()}: {self.event}"
@@ -0,0 +1,347 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from enum import IntEnum
+from itertools import accumulate
+import json
+import lzma
+import os
+from pathlib import Path
+import struct
+import sys
+from typing import *
+import zlib
+
+from klayout_gui_automation.columnar_event_store import ColumnarEventStore, event_from_row, event_to_row
+from klayout_gui_automation.event import Event
+from klayout_gui_automation.event_codec import (
+    PAYLOAD_KINDS, payload_from_json, payload_to_json, widget_path_from_json, widget_path_to_json
+)
+from klayout_gui_automation.widget_path import WidgetPath
+
+#
+# Seekable archive format for recorded event streams
+#
+# File layout:
+#     header:  MAGIC, <H version> <B codec> <I block size>
+#     blocks:  compressed column blocks of up to <block size> events each
+#     paths:   compressed JSON list of all target paths (referenced by index)
+#     index:   one entry per block (offset, length, first event, count, first/last timestamp)
+#     footer:  <Q index offset> <I block count> <Q paths offset> <I paths length> MAGIC
+#
+# Within a block, each column of ColumnarEventStore.COLUMNS is stored contiguously,
+# timestamps and coordinates are delta-encoded. The index allows to seek to
+# event N or timestamp T by decoding a single block.
+#
+
+MAGIC = b'KGAA'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHBI')
+_INDEX_ENTRY = struct.Struct('<QIQIqq')
+_FOOTER = struct.Struct('<QIQI4s')
+
+COLUMNS = ColumnarEventStore.COLUMNS
+DELTA_COLUMNS = {'timestamp', 'x', 'y', 'global_x', 'global_y'}
+
+
+def _column_typecode(name: str) -> str:
+    # deltas of 32 bit coordinates need more than 32 bits in the worst case
+    return 'q' if name in DELTA_COLUMNS else COLUMNS[name]
+
+
+class ArchiveCodec(IntEnum):
+    ZLIB = 0
+    LZMA = 1
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        match self:
+            case ArchiveCodec.ZLIB:
+                return zlib.compress(data, 6 if level is None else level)
+            case ArchiveCodec.LZMA:
+                return lzma.compress(data, preset=6 if level is None else level)
+
+    def decompress(self, data: bytes) -> bytes:
+        match self:
+            case ArchiveCodec.ZLIB:
+                return zlib.decompress(data)
+            case ArchiveCodec.LZMA:
+                return lzma.decompress(data)
+
+
+@dataclass(frozen=True)
+class ArchiveBlock:
+    offset: int
+    length: int
+    first_event: int
+    count: int
+    first_timestamp: int
+    last_timestamp: int
+
+
+def _to_bytes(a: array) -> bytes:
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+def _extra_to_json(extra: Any) -> Any:
+    if isinstance(extra, str):  # key text
+        return extra
+    return {'kind': PAYLOAD_KINDS[type(extra)].value, 'event': payload_to_json(extra)}
+
+
+def _extra_from_json(data: Any) -> Any:
+    if isinstance(data, str):
+        return data
+    return payload_from_json(Event.Kind(data['kind']), data['event'])
+
+
+class EventArchiveWriter:
+    def __init__(self, 
+                 path: os.PathLike | str, 
+                 block_size: int = 4096,
+                 codec: ArchiveCodec = ArchiveCodec.ZLIB,
+                 level: Optional[int] = None):
+        self.path = Path(path)
+        self.block_size = block_size
+        self.codec = codec
+        self.level = level
+        
+        self._file = open(self.path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, codec, block_size))
+        self._paths: Dict[WidgetPath, int] = {}
+        self._rows: List[Tuple] = []
+        self._blocks: List[ArchiveBlock] = []
+        self._event_count = 0
+    
+    def __enter__(self) -> EventArchiveWriter:
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    def _path_id(self, path: WidgetPath) -> int:
+        pid = self._paths.get(path)
+        if pid is None:
+            pid = self._paths[path] = len(self._paths)
+        return pid
+    
+    def write(self, event: Event):
+        kind, event_type, x, y, gx, gy, button, buttons, modifiers, key, extra = event_to_row(event)
+        self._rows.append((kind, event_type, self._path_id(event.target), event.timestamp,
+                           x, y, gx, gy, button, buttons, modifiers, key, extra))
+        if len(self._rows) >= self.block_size:
+            self._write_block()
+    
+    def write_all(self, events: Iterable[Event]):
+        for e in events:
+            self.write(e)
+    
+    def _write_block(self):
+        rows = self._rows
+        if not rows:
+            return
+        self._rows = []
+        
+        chunks = [struct.pack('<I', len(rows))]
+        for ci, name in enumerate(COLUMNS):
+            values = [r[ci] for r in rows]
+            if name in DELTA_COLUMNS:
+                values = [values[0]] + [b - a for a, b in zip(values, values[1:])]
+            chunks.append(_to_bytes(array(_column_typecode(name), values)))
+        extras = {i: _extra_to_json(r[-1]) for i, r in enumerate(rows) if r[-1] is not None}
+        chunks.append(json.dumps(extras, separators=(',', ':')).encode('utf-8'))
+        
+        data = self.codec.compress(b''.join(chunks), self.level)
+        ts_column = list(COLUMNS).index('timestamp')
+        block = ArchiveBlock(offset=self._file.tell(), length=len(data),
+                             first_event=self._event_count, count=len(rows),
+                             first_timestamp=rows[0][ts_column], last_timestamp=rows[-1][ts_column])
+        self._file.write(data)
+        self._blocks.append(block)
+        self._event_count += len(rows)
+    
+    def close(self):
+        if self._file is None:
+            return
+        self._write_block()
+        
+        paths_offset = self._file.tell()
+        paths = sorted(self._paths.items(), key=lambda i: i[1])
+        paths_data = self.codec.compress(
+            json.dumps([widget_path_to_json(p) for p, _ in paths], separators=(',', ':')).encode('utf-8')
+        )
+        self._file.write(paths_data)
+        
+        index_offset = self._file.tell()
+        for b in self._blocks:
+            self._file.write(_INDEX_ENTRY.pack(b.offset, b.length, b.first_event, b.count,
+                                               b.first_timestamp, b.last_timestamp))
+        self._file.write(_FOOTER.pack(index_offset, len(self._blocks), paths_offset, len(paths_data), MAGIC))
+        self._file.close()
+        self._file = None
+
+
+class EventArchive:
+    """
+    Random access to an archive written by EventArchiveWriter.
+    
+    Seeking by timestamp assumes non-decreasing timestamps (the order of capture).
+    """
+    
+    def __init__(self, path: os.PathLike | str):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        
+        magic, version, codec, self.block_size = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a GUI automation event archive")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported event archive version {version}")
+        self.codec = ArchiveCodec(codec)
+        
+        self._file.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, block_count, self._paths_offset, self._paths_length, magic = \
+            _FOOTER.unpack(self._file.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: event archive is incomplete (missing footer)")
+        
+        self._file.seek(index_offset)
+        index_data = self._file.read(block_count * _INDEX_ENTRY.size)
+        self.blocks: List[ArchiveBlock] = [ArchiveBlock(*e) for e in _INDEX_ENTRY.iter_unpack(index_data)]
+        self._block_first_events = [b.first_event for b in self.blocks]
+        self._block_first_timestamps = [b.first_timestamp for b in self.blocks]
+        self._paths: Optional[List[WidgetPath]] = None
+    
+    def __enter__(self) -> EventArchive:
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    def close(self):
+        self._file.close()
+    
+    def __len__(self) -> int:
+        if not self.blocks:
+            return 0
+        last = self.blocks[-1]
+        return last.first_event + last.count
+    
+    def __iter__(self) -> Iterator[Event]:
+        return self.events()
+    
+    @property
+    def paths(self) -> List[WidgetPath]:
+        if self._paths is None:
+            self._file.seek(self._paths_offset)
+            data = self.codec.decompress(self._file.read(self._paths_length))
+            self._paths = [widget_path_from_json(p) for p in json.loads(data.decode('utf-8'))]
+        return self._paths
+    
+    def read_block(self, block_index: int) -> List[Event]:
+        block = self.blocks[block_index]
+        self._file.seek(block.offset)
+        data = self.codec.decompress(self._file.read(block.length))
+        
+        (count,) = struct.unpack_from('<I', data)
+        offset = 4
+        columns: Dict[str, Sequence[int]] = {}
+        for name in COLUMNS:
+            typecode = _column_typecode(name)
+            size = array(typecode).itemsize * count
+            values = _from_bytes(typecode, data[offset:offset + size])
+            offset += size
+            columns[name] = list(accumulate(values)) if name in DELTA_COLUMNS else values
+        extras = {int(k): _extra_from_json(v) for k, v in json.loads(data[offset:].decode('utf-8')).items()}
+        
+        paths = self.paths
+        c = columns
+        return [
+            event_from_row(kind=c['kind'][i], event_type=c['type'][i],
+                           target=paths[c['target'][i]], timestamp=c['timestamp'][i],
+                           x=c['x'][i], y=c['y'][i], global_x=c['global_x'][i], global_y=c['global_y'][i],
+                           button=c['button'][i], buttons=c['buttons'][i],
+                           modifiers=c['modifiers'][i], key=c['key'][i],
+                           extra=extras.get(i))
+            for i in range(count)
+        ]
+    
+    def block_for_event(self, n: int) -> int:
+        if n < 0 or n >= len(self):
+            raise IndexError(f"event index {n} out of range")
+        return bisect_right(self._block_first_events, n) - 1
+    
+    def block_for_timestamp(self, timestamp: int) -> int:
+        i = max(0, bisect_right(self._block_first_timestamps, timestamp) - 1)
+        # the event may still be in an earlier block, if the block starts exactly at timestamp
+        while i > 0 and self.blocks[i - 1].last_timestamp >= timestamp:
+            i -= 1
+        return i
+    
+    def event(self, n: int) -> Event:
+        bi = self.block_for_event(n)
+        return self.read_block(bi)[n - self.blocks[bi].first_event]
+    
+    def events(self, start: int = 0) -> Iterator[Event]:
+        """
+        Yields events from event index start on, decoding only the blocks needed
+        """
+        if start >= len(self):
+            return
+        bi = self.block_for_event(start)
+        skip = start - self.blocks[bi].first_event
+        for i in range(bi, len(self.blocks)):
+            events = self.read_block(i)
+            yield from events[skip:]
+            skip = 0
+    
+    def events_since(self, timestamp: int) -> Iterator[Event]:
+        """
+        Yields all events with event.timestamp >= timestamp
+        """
+        if not self.blocks:
+            return
+        for i in range(self.block_for_timestamp(timestamp), len(self.blocks)):
+            for e in self.read_block(i):
+                if e.timestamp >= timestamp:
+                    yield e
+
+
+def write_event_archive(path: os.PathLike | str, events: Iterable[Event], **kwargs):
+    with EventArchiveWriter(path, **kwargs) as w:
+        w.write_all(events)
+
+
+def read_event_archive(path: os.PathLike | str) -> Iterator[Event]:
+    with EventArchive(path) as a:
+        yield from a
@@ -0,0 +1,117 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+import dataclasses
+from typing import *
+
+from klayout_gui_automation.event import (
+    Event, QtEventType,
+    MouseEvent, KeyEvent, ResizeEvent, WheelEvent, ActionEvent, ProbeEvent, 
+    ClickEvent, TypeEvent, DragEvent, ZoomEvent,
+    ActiveCellViewEvent, CurrentCellEvent, ViewportEvent, LayerVisibilityEvent
+)
+from klayout_gui_automation.widget_path import WidgetPath, WidgetPathEntry
+
+#
+# Conversion of events and widget paths from/to JSON compatible structures,
+# shared by the persistence formats and the streaming/automation protocols
+#
+
+PAYLOAD_CLASSES: Dict[Event.Kind, type] = {
+    Event.Kind.MOUSE_EVENT: MouseEvent,
+    Event.Kind.KEY_EVENT: KeyEvent,
+    Event.Kind.RESIZE_EVENT: ResizeEvent,
+    Event.Kind.ACTION_EVENT: ActionEvent,
+    Event.Kind.PROBE_EVENT: ProbeEvent,
+    Event.Kind.CLICK_EVENT: ClickEvent,
+    Event.Kind.TYPE_EVENT: TypeEvent,
+    Event.Kind.WHEEL_EVENT: WheelEvent,
+    Event.Kind.DRAG_EVENT: DragEvent,
+    Event.Kind.ZOOM_EVENT: ZoomEvent,
+    Event.Kind.ACTIVE_CELLVIEW_EVENT: ActiveCellViewEvent,
+    Event.Kind.CURRENT_CELL_EVENT: CurrentCellEvent,
+    Event.Kind.VIEWPORT_EVENT: ViewportEvent,
+    Event.Kind.LAYER_VISIBILITY_EVENT: LayerVisibilityEvent,
+}
+
+PAYLOAD_KINDS: Dict[type, Event.Kind] = {cls: kind for kind, cls in PAYLOAD_CLASSES.items()}
+
+
+def widget_path_to_json(path: WidgetPath) -> List[Dict[str, Any]]:
+    return [
+        {
+            'widget_name': e.widget_name,
+            'class_name': e.class_name,
+            'child_index': e.child_index,
+            'property_filter': [list(kv) for kv in e.property_filter] if e.property_filter else None,
+        }
+        for e in path.entries
+    ]
+
+
+def widget_path_from_json(data: List[Dict[str, Any]]) -> WidgetPath:
+    return WidgetPath.from_entries(
+        WidgetPathEntry(
+            widget_name=d['widget_name'],
+            class_name=d['class_name'],
+            child_index=d.get('child_index'),
+            property_filter=tuple(tuple(kv) for kv in d['property_filter']) if d.get('property_filter') else None
+        )
+        for d in data
+    )
+
+
+def payload_to_json(payload: Any) -> Dict[str, Any]:
+    d = {}
+    for f in dataclasses.fields(payload):
+        v = getattr(payload, f.name)
+        d[f.name] = int(v) if isinstance(v, QtEventType) else v
+    return d
+
+
+def payload_from_json(kind: Event.Kind, data: Dict[str, Any]) -> Any:
+    cls = PAYLOAD_CLASSES[kind]
+    payload = cls(**data)
+    if 'type' in data:
+        payload.type = QtEventType(data['type'])
+    return payload
+
+
+def event_to_json(event: Event, target: Any = None) -> Dict[str, Any]:
+    """
+    target: optional replacement for the serialized target (e.g. a path id)
+    """
+    return {
+        'kind': event.kind.value,
+        'target': widget_path_to_json(event.target) if target is None else target,
+        'timestamp': event.timestamp,
+        'event': payload_to_json(event.event),
+    }
+
+
+def event_from_json(data: Dict[str, Any], 
+                    resolve_target: Optional[Callable[[Any], WidgetPath]] = None) -> Event:
+    kind = Event.Kind(data['kind'])
+    target = data['target']
+    return Event(
+        kind=kind,
+        target=resolve_target(target) if resolve_target is not None else widget_path_from_json(target),
+        event=payload_from_json(kind, data['event']),
+        timestamp=data.get('timestamp', 0)
+    )
@@ -32,3 +32,41 @@ class EventHandler(ABC):
     @abstractmethod
     def handle_event(self, event: Event):
         raise NotImplementedError()
+    
+    def release(self):
+        """
+        Emits events held back for combining (e.g. when the user is idle).
+        Unlike flush(), this is no barrier for downstream handlers.
+        """
+        pass
+
+
+class TeeEventHandler(EventHandler):
+    """
+    Forwards events to all delegates.
+    
+    Delegates can be added and removed from another thread while events are handled
+    (the tuple is replaced, never modified), a removed delegate may still see
+    the call in progress, so flush the producer before closing it.
+    """
+    
+    def __init__(self, delegates: Iterable[EventHandler] = ()):
+        self.delegates: Tuple[EventHandler, ...] = tuple(delegates)
+    
+    def add_delegate(self, delegate: EventHandler):
+        self.delegates = self.delegates + (delegate,)
+    
+    def remove_delegate(self, delegate: EventHandler):
+        self.delegates = tuple(d for d in self.delegates if d is not delegate)
+    
+    def flush(self):
+        for d in self.delegates:
+            d.flush()
+    
+    def handle_event(self, event: Event):
+        for d in self.delegates:
+            d.handle_event(event)
+    
+    def release(self):
+        for d in self.delegates:
+            d.release()
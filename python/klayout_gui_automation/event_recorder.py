@@ -16,21 +16,77 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 #--------------------------------------------------------------------------------
 
+from __future__ import annotations
+from dataclasses import dataclass, field
+import time
 import traceback
 from typing import *
 
 import pya
 
 from klayout_plugin_utils.debugging import debug, Debugging
-from klayout_gui_automation.event import Event, KeyEvent, MouseEvent, ResizeEvent, ProbeEvent
+from klayout_gui_automation.action_index import ActionIndex
+from klayout_gui_automation.event import Event, ActionEvent, KeyEvent, MouseEvent, ResizeEvent, ProbeEvent, WheelEvent, qt_int
 from klayout_gui_automation.event_handler import EventHandler
 from klayout_gui_automation.qwidget_helpers import *
+from klayout_gui_automation.widget_cache import WidgetPathCache, WidgetVerdictCache
 from klayout_gui_automation.widget_path import WidgetPath
 
+
+EventFilterHandler = Callable[[pya.QWidget, pya.QEvent], bool]
+
+
+@dataclass
+class EventFilterProfile:
+    # event type -> [count, accumulated filter time in ns]
+    samples: Dict[pya.QEvent.Type, List[int]] = field(default_factory=dict)
+    
+    def add(self, event_type: pya.QEvent.Type, duration_ns: int):
+        s = self.samples.get(event_type)
+        if s is None:
+            self.samples[event_type] = [1, duration_ns]
+        else:
+            s[0] += 1
+            s[1] += duration_ns
+    
+    @property
+    def count(self) -> int:
+        return sum(c for c, _ in self.samples.values())
+    
+    @property
+    def total_ns(self) -> int:
+        return sum(ns for _, ns in self.samples.values())
+    
+    def report(self) -> str:
+        lines = [f"{'event type':<32} {'count':>10} {'ns/event':>10}"]
+        for event_type, (count, ns) in sorted(self.samples.items(), key=lambda i: -i[1][1]):
+            lines.append(f"{str(event_type):<32} {count:>10} {ns / count:>10.0f}")
+        if self.count:
+            lines.append(f"{'total':<32} {self.count:>10} {self.total_ns / self.count:>10.0f}")
+        return '\n'.join(lines)
+
+
 class EventRecorder(pya.QObject):
     def __init__(self, event_handler: EventHandler):
         self._event_handler = event_handler
         self._recording = False
+        self._widget_path_cache = WidgetPathCache()
+        self._widget_verdict_cache = WidgetVerdictCache()
+        self._dispatch_table: Dict[pya.QEvent.Type, EventFilterHandler] = self.default_dispatch_table()
+        self._filter_profile: Optional[EventFilterProfile] = None
+        self._last_wheel_key: Optional[Tuple[int, int, int]] = None
+        self._action_index = ActionIndex(self.action)
+        # key of the last ShortcutOverride, the shortcut (if any) triggers its action right after
+        self._shortcut_candidate: Optional[int] = None
+        self._shortcut_keys: Set[int] = set()  # keys which triggered an action, until released
+
+    @property
+    def action_index(self) -> ActionIndex:
+        return self._action_index
+
+    @property
+    def widget_path_cache(self) -> WidgetPathCache:
+        return self._widget_path_cache
 
     def start(self):
         if Debugging.DEBUG:
@@ -42,9 +98,17 @@ class EventRecorder(pya.QObject):
             return
         self._recording = True
         
+        # structure events are only observed while recording, so start from scratch
+        self._widget_path_cache.clear()
+        self._widget_verdict_cache.clear()
+        self._shortcut_candidate = None
+        self._shortcut_keys.clear()
+        
         app = pya.Application.instance()
         app.installEventFilter(self)
         
+        self._action_index.start()
+        
     def stop(self):
         if not self._recording:
             if Debugging.DEBUG:
@@ -57,25 +121,43 @@ class EventRecorder(pya.QObject):
         
         app = pya.Application.instance()
         app.removeEventFilter(self)
+        self._action_index.stop()
         
         self._event_handler.flush()
+        
+        if Debugging.DEBUG:
+            debug(f"EventRecorder.stop: widget path cache statistics: {self._widget_path_cache.statistics}")
+            debug(f"EventRecorder.stop: widget verdict cache statistics: {self._widget_verdict_cache.statistics}")
     
-    def action(self, action: pya.QAction):
+    def action(self, path: str):
+        """
+        Records the action of the menu item path (see ActionIndex)
+        """
         if not self._recording:
             return
         
         if Debugging.DEBUG:
-             debug(f"EventRecorder.action")
+             debug(f"EventRecorder.action: {path}")
         
-        ## TODO! ##FIXME! action interception does not yet work!
-        widget_path = WidgetPath.for_widget(widget)
-        self.event_handler.handle_event(
+        if self._shortcut_candidate is not None:
+            # triggered by a keyboard shortcut, replaying the action replaces replaying the key
+            self._shortcut_keys.add(self._shortcut_candidate)
+            self._shortcut_candidate = None
+        
+        widget_path = self._widget_path_cache.get(pya.MainWindow.instance())
+        self._event_handler.handle_event(
             Event(
                 kind=Event.Kind.ACTION_EVENT,
                 target=widget_path,
-                action_name=action.objectName
+                event=ActionEvent(action_name=path),
+                timestamp=time.monotonic_ns()
             )
         )
+    
+    def _handle_menu_change_event(self, widget: pya.QWidget, event: pya.QEvent) -> bool:
+        if widget_kind(widget) & WidgetKind.TOOL_OR_MENU_BAR:
+            self._action_index.refresh_later()
+        return False
         
     @staticmethod
     def is_modifier_key(event: pya.QKeyEvent) -> bool:
@@ -90,12 +172,13 @@ class EventRecorder(pya.QObject):
             if Debugging.DEBUG:
                  debug(f"EventRecorder.probe")
         
-            widget_path = WidgetPath.for_widget(widget)
-            self.event_handler.handle_event(
+            widget_path = self._widget_path_cache.get(widget)
+            self._event_handler.handle_event(
                 Event(
                     kind=Event.Kind.PROBE_EVENT,
                     target=widget_path,
-                    event=ProbeEvent(data=data)
+                    event=ProbeEvent(data=data),
+                    timestamp=time.monotonic_ns()
                 )
             )
 
@@ -134,134 +217,255 @@ class EventRecorder(pya.QObject):
 
     def probe_std(self, widget: pya.QWidget) -> Any:
         if is_qtreeview(widget):
-            self.probe_qtreeview(widget)
+            return self.probe_qtreeview(widget)
         elif is_qlineedit(widget):
-            self.probe_qlineedit(widget)
+            return self.probe_qlineedit(widget)
         elif is_qtextedit(widget):
-            self.probe_qtextedit(widget)
+            return self.probe_qtextedit(widget)
         elif is_qspinbox(widget):
-            self.probe_qspinbox(widget)
+            return self.probe_qspinbox(widget)
         elif is_qcheckbox(widget):
-            self.probe_qcheckbox(widget)
+            return self.probe_qcheckbox(widget)
         elif is_qcombobox(widget):
-            self.probe_qcombobox(widget)
+            return self.probe_qcombobox(widget)
         elif is_qlistview(widget):
-            self.probe_qlistview(widget)
+            return self.probe_qlistview(widget)
         elif is_qradiobutton(widget):
-            self.probe_qradiobutton(widget)
+            return self.probe_qradiobutton(widget)
         elif is_qpushbutton(widget):
-            self.probe_qpushbutton(widget)
+            return self.probe_qpushbutton(widget)
         else:
             return None
     
     def is_valid_widget(self, widget: pya.QWidget) -> bool:
-        if is_qtoolbar(widget) or is_qmenubar(widget) or is_qmenu(widget):
-           return False
-        
-        if widget.parentWidget() is None:
-            return is_qdialog(widget) or is_qmainwindow(widget)
-        
-        return self.is_valid_widget(widget.parentWidget())
+        # valid widgets are not part of toolbars/menus and rooted in a dialog or main window
+        return self._widget_verdict_cache.get(widget).valid
     
-    def eventFilter(self, watched_object: pya.QObject, event: pya.QEvent) -> bool:
-        try:
-            # NOTE: don't log, its a hotspot
-            # if Debugging.DEBUG:
-            #    debug(f"EventRecorder.eventFilter: watched_object={watched_object}, eventType={event.type()}")
+    def default_dispatch_table(self) -> Dict[pya.QEvent.Type, EventFilterHandler]:
+        return {
+            pya.QEvent.ChildAdded: self._handle_structure_event,
+            pya.QEvent.ChildRemoved: self._handle_structure_event,
+            pya.QEvent.ParentChange: self._handle_structure_event,
+            pya.QEvent.Show: self._handle_structure_event,  # new top level widgets
+            pya.QEvent.ShortcutOverride: self._handle_shortcut_override_event,
+            pya.QEvent.KeyPress: self._handle_key_event,
+            pya.QEvent.KeyRelease: self._handle_key_event,
+            pya.QEvent.MouseButtonDblClick: self._handle_mouse_button_event,
+            pya.QEvent.MouseButtonPress: self._handle_mouse_button_event,
+            pya.QEvent.MouseButtonRelease: self._handle_mouse_button_event,
+            pya.QEvent.MouseMove: self._handle_mouse_move_event,
+            pya.QEvent.Resize: self._handle_resize_event,
+            pya.QEvent.Wheel: self._handle_wheel_event,
+            pya.QEvent.ActionAdded: self._handle_menu_change_event,
+            pya.QEvent.ActionRemoved: self._handle_menu_change_event,
+        }
     
-            # only handle events that targeted towards widgets
-            if not watched_object.isWidgetType():
-                return False
-            
-            widget: pya.QWidget = watched_object
+    @property
+    def recorded_event_types(self) -> FrozenSet[pya.QEvent.Type]:
+        return frozenset(self._dispatch_table.keys())
     
-            # if Debugging.DEBUG:
-            #    debug(f"EventRecorder.eventFilter: widget={widget} eventType={event.type()}")
+    def event_type_handler(self, event_type: pya.QEvent.Type) -> Optional[EventFilterHandler]:
+        return self._dispatch_table.get(event_type)
     
-            # only log key events that are targeted towards widgets that do not have the focus
-            # this propagation of events is done automatically on replay in the same fashion.
-            if isinstance(event, pya.QKeyEvent) and not widget.hasFocus():
+    def set_event_type_handler(self, event_type: pya.QEvent.Type, handler: Optional[EventFilterHandler]):
+        """
+        Configures the handler for one event type at runtime, None stops recording that type
+        """
+        if handler is None:
+            self._dispatch_table.pop(event_type, None)
+        else:
+            self._dispatch_table[event_type] = handler
+    
+    def enable_filter_profile(self, enabled: bool = True):
+        self._filter_profile = EventFilterProfile() if enabled else None
+    
+    @property
+    def filter_profile(self) -> Optional[EventFilterProfile]:
+        return self._filter_profile
+    
+    def eventFilter(self, watched_object: pya.QObject, event: pya.QEvent) -> bool:
+        if self._filter_profile is None:
+            return self._filter_event(watched_object, event)
+        
+        t0 = time.perf_counter_ns()
+        result = self._filter_event(watched_object, event)
+        self._filter_profile.add(event.type(), time.perf_counter_ns() - t0)
+        return result
+    
+    def _filter_event(self, watched_object: pya.QObject, event: pya.QEvent) -> bool:
+        # NOTE: don't log, its a hotspot
+        # if Debugging.DEBUG:
+        #    debug(f"EventRecorder.eventFilter: watched_object={watched_object}, eventType={event.type()}")
+        
+        try:
+            # fast reject: paint, timer, hover, layout requests etc. (the vast majority of traffic)
+            # cost exactly one lookup here
+            handler = self._dispatch_table.get(event.type())
+            if handler is None:
                 return False
             
-            # do not log propagation events for mouse events
-            if isinstance(event, pya.QMouseEvent) and not event.spontaneous():
+            # only handle events that targeted towards widgets
+            if not watched_object.isWidgetType():
                 return False
             
-            match event.type():
-                case pya.QEvent.KeyPress | pya.QEvent.KeyRelease:
-                    if self.is_modifier_key(event):
-                        return False
-
-                    widget_path = WidgetPath.for_widget(widget)
-                    self._event_handler.handle_event(
-                        Event(kind=Event.Kind.KEY_EVENT, target=widget_path, event=KeyEvent.from_qt(event))
-                    )
-                    
-                case pya.QEvent.MouseButtonDblClick |\
-                     pya.QEvent.MouseButtonPress |\
-                     pya.QEvent.MouseButtonRelease:
-                    mouse_event: pya.QMouseEvent = event
-                    
-                    # detect probe event
-                    if (
-                       event.type() == pya.QEvent.MouseButtonPress
-                       and mouse_event.button() == pya.Qt.LeftButton
-                       and (mouse_event.modifiers & (pya.Qt.AltModifier | pya.Qt.ControlModifier)) != 0
-                    ):
-                        if Debugging.DEBUG:
-                            debug(f"EventRecorder.eventFilter: probe event mode!")
-                        
-                        probe_event = pya.QEvent(pya.QEvent.MaxUser)
-                        probe_event.ignore()
-                        
-                        app = pya.QApplication.instance()
-                        
-                        next_widget = widget
-                        while next_widget is not None:
-                            app.sendEvent(next_widget, probe_event)
-                            if probe_event.isAccepted():
-                                if Debugging.DEBUG:
-                                     debug(f"EventRecorder.eventFilter: probed widget {next_widget}")
-                                return True
-                            next_widget = next_widget.parentWidget()
-                        
-                        # if there is no special handling, try the default impl
-                        next_widget = widget
-                        while next_widget is not None:
-                            p = self.probe_std(next_widget)
-                            if p is not None:
-                                self.probe(next_widget, p)
-                                if Debugging.DEBUG:
-                                     debug(f"EventRecorder.eventFilter: probed widget {next_widget}")
-                                return True
-                            next_widget = next_widget.parentWidget()
-                        
-                        return True  # eat probe events
-                    elif self.is_valid_widget(widget):
-                        widget_path = WidgetPath.for_widget(widget)
-                        self._event_handler.handle_event(
-                            Event(kind=Event.Kind.MOUSE_EVENT, target=widget_path, event=MouseEvent.from_qt(event))
-                        )
-                    else:
-                        if Debugging.DEBUG:
-                            debug(f"EventRecorder.eventFilter: mouse event, but not a valid widget: {widget}")
-                case pya.QEvent.MouseMove:
-                    if self.is_valid_widget(widget):
-                        widget_path = WidgetPath.for_widget(widget)
-                        self._event_handler.handle_event(
-                            Event(kind=Event.Kind.MOUSE_EVENT, target=widget_path, event=MouseEvent.from_qt(event))
-                        )
-                case pya.QEvent.Resize:
-                    if widget.parentWidget() is None and self.is_valid_widget(widget):
-                        widget_path = WidgetPath.for_widget(widget)
-                        self._event_handler.handle_event(
-                            Event(kind=Event.Kind.RESIZE_EVENT, target=widget_path, event=ResizeEvent.from_qt(event))
-                        )
+            return handler(watched_object, event)
         except Exception as e:
             app = pya.Application.instance()
             app.removeEventFilter(self)
 
-            print("EventRecorder.ctor caught an exception", e)
+            print("EventRecorder.eventFilter caught an exception", e)
             traceback.print_exc()
             
         return False
+    
+    def _handle_structure_event(self, widget: pya.QWidget, event: pya.QEvent) -> bool:
+        self._widget_path_cache.handle_structure_event(widget, event)
+        self._widget_verdict_cache.handle_structure_event(widget, event)
+        return False
+    
+    def _handle_shortcut_override_event(self, widget: pya.QWidget, event: pya.QKeyEvent) -> bool:
+        # Qt asks the focus widget before it triggers a shortcut's action, see action()
+        self._shortcut_candidate = event.key()
+        return False
+    
+    def _handle_key_event(self, widget: pya.QWidget, event: pya.QKeyEvent) -> bool:
+        self._shortcut_candidate = None
+        
+        # the key triggered an action, which is recorded instead (see action())
+        key = event.key()
+        if key in self._shortcut_keys:
+            if event.type() == pya.QEvent.KeyRelease and not event.isAutoRepeat():
+                self._shortcut_keys.discard(key)
+            return False
+        
+        # only log key events that are targeted towards widgets that do not have the focus
+        # this propagation of events is done automatically on replay in the same fashion.
+        if not widget.hasFocus():
+            return False
+        
+        if self.is_modifier_key(event):
+            return False
+        
+        # menu navigation, the triggered action is recorded instead
+        if widget_kind(widget) & WidgetKind.TOOL_OR_MENU_BAR:
+            return False
+
+        widget_path = self._widget_path_cache.get(widget)
+        self._event_handler.handle_event(
+            Event(kind=Event.Kind.KEY_EVENT, target=widget_path, event=KeyEvent.from_qt(event),
+                  timestamp=time.monotonic_ns())
+        )
+        return False
+    
+    def _handle_mouse_button_event(self, widget: pya.QWidget, event: pya.QMouseEvent) -> bool:
+        # do not log propagation events for mouse events
+        if not event.spontaneous():
+            return False
+        
+        # detect probe event
+        if (
+           event.type() == pya.QEvent.MouseButtonPress
+           and event.button() == pya.Qt.LeftButton
+           and (event.modifiers & (pya.Qt.AltModifier | pya.Qt.ControlModifier)) != 0
+        ):
+            return self._handle_probe_event(widget)
+        
+        if self.is_valid_widget(widget):
+            widget_path = self._widget_path_cache.get(widget)
+            mouse_event = MouseEvent.from_qt(event)
+            if event.type() == pya.QEvent.MouseButtonPress:
+                mouse_event.edit_mode = self.edit_mode()
+            self._event_handler.handle_event(
+                Event(kind=Event.Kind.MOUSE_EVENT, target=widget_path, event=mouse_event,
+                      timestamp=time.monotonic_ns())
+            )
+        else:
+            if Debugging.DEBUG:
+                debug(f"EventRecorder.eventFilter: mouse event, but not a valid widget: {widget}")
+        return False
+    
+    @staticmethod
+    def edit_mode() -> Optional[str]:
+        """
+        Edit mode of the current layout view (e.g. 'select', 'move', 'ruler')
+        """
+        view = pya.LayoutView.current()
+        try:
+            return view.mode_name() if view is not None else None
+        except AttributeError:  # LayoutView.mode_name is not available in older KLayout versions
+            return None
+    
+    def _handle_probe_event(self, widget: pya.QWidget) -> bool:
+        if Debugging.DEBUG:
+            debug(f"EventRecorder.eventFilter: probe event mode!")
+        
+        probe_event = pya.QEvent(pya.QEvent.MaxUser)
+        probe_event.ignore()
+        
+        app = pya.QApplication.instance()
+        
+        next_widget = widget
+        while next_widget is not None:
+            app.sendEvent(next_widget, probe_event)
+            if probe_event.isAccepted():
+                if Debugging.DEBUG:
+                     debug(f"EventRecorder.eventFilter: probed widget {next_widget}")
+                return True
+            next_widget = next_widget.parentWidget()
+        
+        # if there is no special handling, try the default impl
+        next_widget = widget
+        while next_widget is not None:
+            p = self.probe_std(next_widget)
+            if p is not None:
+                self.probe(next_widget, p)
+                if Debugging.DEBUG:
+                     debug(f"EventRecorder.eventFilter: probed widget {next_widget}")
+                return True
+            next_widget = next_widget.parentWidget()
+        
+        return True  # eat probe events
+    
+    def _handle_mouse_move_event(self, widget: pya.QWidget, event: pya.QMouseEvent) -> bool:
+        # do not log propagation events for mouse events
+        if not event.spontaneous():
+            return False
+        
+        if self.is_valid_widget(widget):
+            widget_path = self._widget_path_cache.get(widget)
+            self._event_handler.handle_event(
+                Event(kind=Event.Kind.MOUSE_EVENT, target=widget_path, event=MouseEvent.from_qt(event),
+                      timestamp=time.monotonic_ns())
+            )
+        return False
+    
+    def _handle_resize_event(self, widget: pya.QWidget, event: pya.QResizeEvent) -> bool:
+        if widget.parentWidget() is None and self.is_valid_widget(widget):
+            widget_path = self._widget_path_cache.get(widget)
+            self._event_handler.handle_event(
+                Event(kind=Event.Kind.RESIZE_EVENT, target=widget_path, event=ResizeEvent.from_qt(event),
+                      timestamp=time.monotonic_ns())
+            )
+        return False
+    
+    def _handle_wheel_event(self, widget: pya.QWidget, event: pya.QWheelEvent) -> bool:
+        # do not log propagation events for wheel events
+        if not event.spontaneous():
+            return False
+        
+        # a wheel event ignored by a widget (e.g. a label over a scroll area) is propagated
+        # to the parents, passing the application event filter again
+        global_pos = event.globalPosition().toPoint() if hasattr(event, 'globalPosition') else event.globalPos()
+        # timestamp has a setter, so pya exposes it as a property (qt_int copes with both)
+        key = (qt_int(event.timestamp), global_pos.x, global_pos.y)
+        if key == self._last_wheel_key:
+            return False
+        self._last_wheel_key = key
+        
+        if self.is_valid_widget(widget):
+            widget_path = self._widget_path_cache.get(widget)
+            self._event_handler.handle_event(
+                Event(kind=Event.Kind.WHEEL_EVENT, target=widget_path, event=WheelEvent.from_qt(event),
+                      timestamp=time.monotonic_ns())
+            )
+        return False
@@ -16,8 +16,294 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 #--------------------------------------------------------------------------------
 
+from __future__ import annotations
+from dataclasses import dataclass, field
+import time
+from typing import *
+
 import pya
 
+from klayout_plugin_utils.debugging import debug, Debugging
 
-class EventReplayer:
+from klayout_gui_automation.action_index import ActionIndex
+from klayout_gui_automation.event import Event, KeyEvent, MouseEvent, QtEventType, WheelEvent
+from klayout_gui_automation.replay_synchronizer import ReplaySynchronizer, SynchronizationTimeout
+from klayout_gui_automation.replay_timing import ReplayClock, ReplayTiming
+from klayout_gui_automation.text_injection import TextInjectionMode, TextInjector
+from klayout_gui_automation.widget_path import WidgetPath
+from klayout_gui_automation.view_state_recorder import (
+    VIEW_STATE_EVENT_KINDS, apply_view_state_event, is_view_state_applicable
+)
+from klayout_gui_automation.widget_resolver import WidgetResolver
+
+
+class ReplayError(Exception):
     pass
+
+
+@dataclass
+class ReplayStatistics:
+    steps: int = 0
+    unresolved: int = 0
+    resolve_ns: List[int] = field(default_factory=list)  # per step widget path resolution time
+    wait_ns: List[int] = field(default_factory=list)     # per step synchronization time
+    delay_ns: int = 0                                    # total time spent reproducing recorded gaps
+    
+    @property
+    def mean_resolve_us(self) -> float:
+        return sum(self.resolve_ns) / len(self.resolve_ns) / 1000 if self.resolve_ns else 0.0
+    
+    @property
+    def max_resolve_us(self) -> float:
+        return max(self.resolve_ns) / 1000 if self.resolve_ns else 0.0
+    
+    @property
+    def total_wait_ms(self) -> float:
+        return sum(self.wait_ns) / 1_000_000
+    
+    def __str__(self) -> str:
+        return f"steps={self.steps}, unresolved={self.unresolved}, "\
+               f"resolve mean={self.mean_resolve_us:.1f}µs max={self.max_resolve_us:.1f}µs, "\
+               f"waited={self.total_wait_ms:.1f}ms, delayed={self.delay_ns / 1_000_000:.1f}ms"
+
+
+ReplayPrecondition = Callable[[Event, pya.QWidget], bool]
+
+# readiness of these kinds does not show in widget events (menu item enabled, 
+# view state applicable), their waits are rechecked periodically
+RECHECKED_EVENT_KINDS = frozenset((Event.Kind.ACTION_EVENT,)) | VIEW_STATE_EVENT_KINDS
+
+
+class EventReplayer:
+    """
+    Replays recorded events at application speed.
+    
+    Before each step, the replayer waits (event driven, see ReplaySynchronizer)
+    until the event queue is idle, the target widget exists and is visible,
+    and all additional preconditions hold. 
+    
+    Recorded probe events become preconditions as well, if a probe function 
+    is given (e.g. EventRecorder.probe_std): replay continues once the probed
+    value of the target widget equals the recorded one. Actions are triggered
+    directly (without opening menus) once their menu item is enabled,
+    view state events are applied through the pya API (see ViewStateRecorder).
+    
+    Timing (see ReplayTiming) is a lower bound on top of that: by default 
+    (ReplaySpeed.FAST) think time is removed entirely, alternatively the recorded
+    gaps are reproduced faithfully or scaled by a speed factor.
+    """
+    
+    def __init__(self, 
+                 resolver: Optional[WidgetResolver] = None,
+                 synchronizer: Optional[ReplaySynchronizer] = None,
+                 probe: Optional[Callable[[pya.QWidget], Any]] = None,
+                 timing: Optional[ReplayTiming] = None,
+                 text_injection: TextInjectionMode = TextInjectionMode.BULK,
+                 action_index: Optional[ActionIndex] = None,
+                 recheck_interval_ms: int = 50):
+        self.recheck_interval_ms = recheck_interval_ms  # see RECHECKED_EVENT_KINDS
+        self.resolver = resolver or WidgetResolver()
+        self.synchronizer = synchronizer or ReplaySynchronizer(self.resolver)
+        self.clock = ReplayClock(timing or ReplayTiming())
+        self.text_injector = TextInjector(self.send_text)
+        self.text_injection = text_injection
+        self.probe = probe
+        self.action_index = action_index or ActionIndex()
+        self.preconditions: List[ReplayPrecondition] = []
+        self.statistics = ReplayStatistics()
+    
+    def replay(self, 
+               events: Iterable[Event], 
+               stop_on_error: bool = True,
+               text_injection: Optional[TextInjectionMode] = None) -> ReplayStatistics:
+        """
+        text_injection overrides the replayer's default for this recording
+        """
+        default_text_injection = self.text_injection
+        if text_injection is not None:
+            self.text_injection = text_injection
+        self.statistics = ReplayStatistics()
+        self.clock.reset()
+        self.resolver.start()
+        try:
+            for event in events:
+                try:
+                    self.replay_event(event)
+                except ReplayError as e:
+                    if stop_on_error:
+                        raise
+                    if Debugging.DEBUG:
+                        debug(f"EventReplayer.replay: {e}")
+        finally:
+            self.resolver.stop()
+            self.text_injection = default_text_injection
+        
+        if Debugging.DEBUG:
+            debug(f"EventReplayer.replay: {self.statistics}")
+        return self.statistics
+    
+    def resolve(self, path: WidgetPath) -> pya.QWidget:
+        t0 = time.perf_counter_ns()
+        widget = self.resolver.resolve(path)
+        self.statistics.resolve_ns.append(time.perf_counter_ns() - t0)
+        if widget is None:
+            self.statistics.unresolved += 1
+            raise ReplayError(f"Can't resolve widget for path {path}")
+        return widget
+    
+    def is_ready(self, event: Event, widget: Optional[pya.QWidget]) -> bool:
+        if widget is None or widget._destroyed() or not widget.visible:
+            return False
+        if event.kind == Event.Kind.PROBE_EVENT and self.probe(widget) != event.event.data:
+            return False
+        if event.kind == Event.Kind.ACTION_EVENT and not self.action_index.is_enabled(event.event.action_name):
+            return False
+        if event.kind in VIEW_STATE_EVENT_KINDS and not is_view_state_applicable(event):
+            return False
+        return all(p(event, widget) for p in self.preconditions)
+    
+    def synchronize(self, event: Event) -> pya.QWidget:
+        """
+        Waits until the target of event is ready, see is_ready
+        """
+        def condition() -> bool:
+            widget = self.resolver.resolve(event.target)
+            if widget is not None and event.kind == Event.Kind.PROBE_EVENT:
+                # re-evaluate once the probed value changes
+                self.resolver.watch_state_changes(widget)
+            return self.is_ready(event, widget)
+        
+        t0 = time.perf_counter_ns()
+        try:
+            self.synchronizer.wait_until(
+                condition,
+                description=f"{event.kind.value} on {event.target}",
+                recheck_interval_ms=self.recheck_interval_ms if event.kind in RECHECKED_EVENT_KINDS else None
+            )
+        except SynchronizationTimeout as e:
+            self.statistics.unresolved += 1
+            raise ReplayError(str(e)) from e
+        finally:
+            self.resolver.unwatch_state_changes()
+            self.statistics.wait_ns.append(time.perf_counter_ns() - t0)
+        return self.resolve(event.target)
+    
+    def replay_event(self, event: Event):
+        self.statistics.steps += 1
+        
+        if event.kind == Event.Kind.PROBE_EVENT and self.probe is None:
+            if Debugging.DEBUG:
+                debug(f"EventReplayer.replay_event: skipping probe event, no probe function")
+            return
+        
+        # synchronization first, time spent waiting for widgets counts towards the gap
+        widget = self.synchronize(event)
+        
+        delay_ns = self.clock.delay_ns(event.timestamp)
+        if delay_ns:
+            self.statistics.delay_ns += delay_ns
+            self.synchronizer.wait_ms(delay_ns / 1_000_000)
+            if not self.is_ready(event, widget):  # the application kept running meanwhile
+                widget = self.synchronize(event)
+        
+        if event.kind != Event.Kind.PROBE_EVENT:
+            self.dispatch(widget, event)
+        self.clock.mark(event.timestamp)
+    
+    def dispatch(self, widget: pya.QWidget, event: Event):
+        e = event.event
+        match event.kind:
+            case Event.Kind.RESIZE_EVENT:
+                widget.resize(e.new_width, e.new_height)
+            
+            case Event.Kind.ACTION_EVENT:
+                self.action_index.trigger(e.action_name)
+            
+            case kind if kind in VIEW_STATE_EVENT_KINDS:
+                apply_view_state_event(event)
+            
+            case Event.Kind.TYPE_EVENT:
+                self.text_injector.inject(widget, e.text, self.text_injection)
+            
+            case Event.Kind.KEY_EVENT if e.repeat_count > 1:
+                # the press, followed by the autorepeats of the held key
+                pya.QApplication.sendEvent(widget, e.to_qt())
+                for t in (QtEventType.KeyRelease, QtEventType.KeyPress) * (e.repeat_count - 1):
+                    pya.QApplication.sendEvent(widget, KeyEvent(
+                        type=t, key=e.key, text=e.text, modifiers=e.modifiers, auto_repeat=True
+                    ).to_qt())
+            
+            case Event.Kind.WHEEL_EVENT if e.count > 1:
+                self.send_wheel_events(widget, e.x, e.y, e.angle_delta_x, e.angle_delta_y, 
+                                       e.buttons, e.modifiers, e.count)
+            
+            case Event.Kind.MOUSE_EVENT | Event.Kind.KEY_EVENT | Event.Kind.WHEEL_EVENT:
+                pya.QApplication.sendEvent(widget, e.to_qt())
+            
+            case Event.Kind.CLICK_EVENT:
+                if e.x < 0 or e.y < 0:
+                    x, y = widget.width() // 2, widget.height() // 2
+                else:
+                    x, y = e.x, e.y
+                types = [QtEventType.MouseButtonPress, QtEventType.MouseButtonRelease]
+                if e.count >= 2:
+                    types += [QtEventType.MouseButtonDblClick, QtEventType.MouseButtonRelease]
+                for t in types:
+                    self.send_mouse_event(widget, t, x, y, e.button, e.modifiers)
+            
+            case Event.Kind.DRAG_EVENT:
+                self.send_mouse_event(widget, QtEventType.MouseButtonPress, e.start_x, e.start_y, e.button, e.modifiers)
+                for x, y in e.waypoints:
+                    self.send_mouse_event(widget, QtEventType.MouseMove, x, y, e.button, e.modifiers)
+                self.send_mouse_event(widget, QtEventType.MouseMove, e.end_x, e.end_y, e.button, e.modifiers)
+                self.send_mouse_event(widget, QtEventType.MouseButtonRelease, e.end_x, e.end_y, e.button, e.modifiers)
+            
+            case Event.Kind.ZOOM_EVENT:
+                self.send_wheel_events(widget, e.x, e.y, e.angle_delta_x, e.angle_delta_y, 
+                                       0, e.modifiers, e.steps)
+    
+    @staticmethod
+    def send_wheel_events(widget: pya.QWidget,
+                          x: int, y: int,
+                          angle_delta_x: int, angle_delta_y: int,
+                          buttons: int,
+                          modifiers: int,
+                          count: int):
+        # one wheel event per recorded step, widgets typically zoom/scroll per notch
+        count = max(count, 1)
+        global_pos = widget.mapToGlobal(pya.QPoint(x, y))
+        for i in range(count):
+            dx = angle_delta_x * (i + 1) // count - angle_delta_x * i // count
+            dy = angle_delta_y * (i + 1) // count - angle_delta_y * i // count
+            pya.QApplication.sendEvent(widget, WheelEvent(
+                type=QtEventType.Wheel, x=x, y=y, global_x=global_pos.x, global_y=global_pos.y,
+                angle_delta_x=dx, angle_delta_y=dy, buttons=buttons, modifiers=modifiers
+            ).to_qt())
+    
+    @staticmethod
+    def send_mouse_event(widget: pya.QWidget, 
+                         type: QtEventType, 
+                         x: int, y: int, 
+                         button: int, 
+                         modifiers: int):
+        # buttons held after the event (Qt semantics)
+        buttons = 0 if type == QtEventType.MouseButtonRelease else button
+        global_pos = widget.mapToGlobal(pya.QPoint(x, y))
+        pya.QApplication.sendEvent(widget, MouseEvent(
+            type=type, x=x, y=y, global_x=global_pos.x, global_y=global_pos.y,
+            button=0 if type == QtEventType.MouseMove else button,
+            buttons=buttons, modifiers=modifiers
+        ).to_qt())
+    
+    @staticmethod
+    def key_for_char(ch: str) -> int:
+        # Qt::Key values of letters, digits and ASCII punctuation are their (upper case) code points
+        if ch.isascii() and ch.isprintable():
+            return ord(ch.upper())
+        return 0x01ffffff  # Qt::Key_unknown
+    
+    def send_text(self, widget: pya.QWidget, text: str):
+        for ch in text:
+            key = self.key_for_char(ch)
+            for t in (QtEventType.KeyPress, QtEventType.KeyRelease):
+                pya.QApplication.sendEvent(widget, KeyEvent(type=t, key=key, text=ch, modifiers=0).to_qt())
@@ -0,0 +1,255 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Replays a suite tree (see recording.py) inside a single KLayout process:
+# each node's recording is replayed once, then the prepared process is forked
+# for each child, so shared prefixes (start up, loading a large layout,
+# layer setup, ...) are not repeated per test. Used by suite_runner, e.g.:
+#
+#   QT_QPA_PLATFORM=offscreen klayout -nc -rx \
+#       -rd suite=tests/drc.kgsuite -rd results=/tmp/results -rd jobs=8 \
+#       -r python/klayout_gui_automation/fork_replay.py
+#
+# Results are written per test as <results>/<test id>.json.
+#
+# NOTE: POSIX only (os.fork). Only the forking thread exists in the children,
+#       this is fine for replay, which runs on the GUI thread and uses no worker threads.
+#       Use the offscreen platform, children must not share a display connection.
+#
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+import math
+import os
+import signal
+import sys
+import time
+import traceback
+from typing import *
+
+if __package__ in (None, ''):  # run as a script by KLayout
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import Event
+from klayout_gui_automation.event_replayer import EventReplayer, ReplayError
+from klayout_gui_automation.recording import load_suite, read_recording, suite_tests
+from klayout_gui_automation.replay_worker import write_result
+
+
+@dataclass
+class SuiteNode:
+    events: List[Event]
+    children: List[SuiteNode] = field(default_factory=list)
+    test: Optional[Dict[str, Any]] = None  # leaves only, see recording.prepare_suite
+    
+    @property
+    def is_test(self) -> bool:
+        return self.test is not None
+    
+    def tests(self) -> List[Dict[str, Any]]:
+        if self.test is not None:
+            return [self.test]
+        return [t for c in self.children for t in c.tests()]
+
+
+def same_event(a: Event, b: Event) -> bool:
+    # timestamps differ between recordings, targets are interned WidgetPaths
+    return a.kind == b.kind and a.target is b.target and a.event == b.event
+
+
+def _event_at(node: SuiteNode, offset: int) -> Optional[Event]:
+    return node.events[offset] if offset < len(node.events) else None
+
+
+def build_prefix_tree(nodes: List[SuiteNode], offset: int = 0) -> List[SuiteNode]:
+    """
+    Groups test nodes by their common event prefixes (starting at offset)
+    """
+    groups: List[List[SuiteNode]] = []
+    for n in nodes:
+        e = _event_at(n, offset)
+        for g in groups:
+            ge = _event_at(g[0], offset)
+            if (e is None and ge is None) or (e is not None and ge is not None and same_event(e, ge)):
+                g.append(n)
+                break
+        else:
+            groups.append([n])
+    
+    result = []
+    for g in groups:
+        if len(g) == 1 or _event_at(g[0], offset) is None:
+            result.extend(SuiteNode(events=n.events[offset:], test=n.test) for n in g)
+            continue
+        
+        end = min(len(n.events) for n in g)
+        lcp = offset + 1
+        while lcp < end and all(same_event(n.events[lcp], g[0].events[lcp]) for n in g[1:]):
+            lcp += 1
+        result.append(SuiteNode(events=g[0].events[offset:lcp], children=build_prefix_tree(g, lcp)))
+    return result
+
+
+def load_suite_node(node: Dict[str, Any]) -> SuiteNode:
+    events = list(read_recording(node['recording'])) if node.get('recording') else []
+    children = node.get('children') or []
+    if not children:
+        return SuiteNode(events=events, test=node)
+    
+    loaded = [load_suite_node(c) for c in children]
+    if node.get('detect_prefixes'):
+        leaves = [c for c in loaded if c.is_test]
+        loaded = [c for c in loaded if not c.is_test] + build_prefix_tree(leaves)
+    return SuiteNode(events=events, children=loaded)
+
+
+class ForkReplayer:
+    def __init__(self, 
+                 replayer: EventReplayer,
+                 results_dir: str,
+                 jobs: int = 1,
+                 timeout: float = 300.0,
+                 retries: int = 1):
+        self.replayer = replayer
+        self.results_dir = results_dir
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.retries = retries
+    
+    def result_path(self, test: Dict[str, Any]) -> str:
+        return os.path.join(self.results_dir, f"{test['id']}.json")
+    
+    def write_results(self, node: SuiteNode, status: str, message: str = '', 
+                      duration: float = 0.0, attempts: int = 1, only_missing: bool = False):
+        for test in node.tests():
+            path = self.result_path(test)
+            if only_missing and os.path.exists(path):
+                continue
+            write_result(path, {
+                'id': test['id'],
+                'name': test['test_name'],
+                'recording': test.get('recording', ''),
+                'status': status,
+                'message': message,
+                'duration': duration,
+                'attempts': attempts,
+            })
+    
+    def run(self, root: SuiteNode):
+        self.run_node(root, attempts=1)
+    
+    def run_node(self, node: SuiteNode, attempts: int, before_fork: Optional[Callable[[], None]] = None):
+        t0 = time.monotonic()
+        try:
+            self.replayer.replay(node.events)
+        except ReplayError as e:
+            self.write_results(node, 'failed', str(e), time.monotonic() - t0, attempts)
+            return
+        except Exception as e:
+            self.write_results(node, 'error', ''.join(traceback.format_exception(e)), time.monotonic() - t0, attempts)
+            return
+        
+        if node.is_test:
+            self.write_results(node, 'passed', duration=time.monotonic() - t0, attempts=attempts)
+        else:
+            if before_fork is not None:
+                before_fork()
+            self.fork_children(node.children)
+    
+    def fork_children(self, children: List[SuiteNode]):
+        pending: Deque[Tuple[SuiteNode, int]] = deque((c, 1) for c in children)
+        running: Dict[int, Tuple[SuiteNode, int, float]] = {}
+        
+        while pending or running:
+            while pending and len(running) < self.jobs:
+                child, attempts = pending.popleft()
+                pid = os.fork()
+                if pid == 0:
+                    self._run_forked(child, attempts)  # never returns
+                running[pid] = (child, attempts, time.monotonic())
+            
+            pid, status = os.wait()
+            if pid not in running:
+                continue
+            child, attempts, t0 = running.pop(pid)
+            duration = time.monotonic() - t0
+            if all(os.path.exists(self.result_path(t)) for t in child.tests()):
+                continue
+            
+            if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGALRM:
+                self.write_results(child, 'timeout', f"killed after {self.timeout}s", 
+                                   duration, attempts, only_missing=True)
+            elif attempts <= self.retries:
+                if Debugging.DEBUG:
+                    debug(f"ForkReplayer.fork_children: child {pid} crashed (status {status}), retrying")
+                pending.append((child, attempts + 1))  # the prepared state is still here
+            else:
+                self.write_results(child, 'crashed', f"forked worker exited with status {status} without result",
+                                   duration, attempts, only_missing=True)
+    
+    def _run_forked(self, node: SuiteNode, attempts: int):
+        exit_code = 0
+        try:
+            # the time budget covers this node's own events, not the subtrees forked from it
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+            signal.alarm(max(1, math.ceil(self.timeout)))
+            self.run_node(node, attempts, before_fork=lambda: signal.alarm(0))
+            signal.alarm(0)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+
+def main(variables: Dict[str, Any]) -> int:
+    results_dir = variables['results']
+    os.makedirs(results_dir, exist_ok=True)
+    
+    tree = load_suite(variables['suite'])
+    fork_replayer = ForkReplayer(
+        replayer=EventReplayer(),
+        results_dir=results_dir,
+        jobs=int(variables.get('jobs', 1)),
+        timeout=float(variables.get('timeout', 300.0)),
+        retries=int(variables.get('retries', 1)),
+    )
+    
+    mw = pya.MainWindow.instance()
+    if mw is None or not hasattr(os, 'fork'):
+        all_tests = SuiteNode(events=[], children=[SuiteNode(events=[], test=t) for t in suite_tests(tree)])
+        fork_replayer.write_results(all_tests, 'error', 
+                                    "fork replay requires KLayout in GUI mode (-nc -rx, offscreen) on a POSIX system")
+        return 1
+    mw.show()
+    
+    fork_replayer.run(load_suite_node(tree))
+    return 0
+
+
+if 'suite' in globals():  # variables given by klayout -rd
+    exit_code = main(globals())
+    pya.Application.instance().exit(exit_code)
@@ -0,0 +1,248 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+#
+# Recognition of mouse gestures: press/move*/release sequences become ClickEvents
+# (incl. double clicks) or DragEvents, wheel events become ZoomEvents.
+# Sequences not matching a gesture are emitted unchanged.
+#
+# A drag always keeps its (simplified) trajectory, box selection is only a label
+# on top of it: left button drags on the layout canvas while the view is in
+# one of the box_select_modes (MouseEvent.edit_mode of the press).
+#
+
+from __future__ import annotations
+from dataclasses import dataclass
+from itertools import chain
+import math
+from typing import *
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import (
+    Event, QtEventType, ClickEvent, DragEvent, ZoomEvent
+)
+from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.trajectory import rdp
+from klayout_gui_automation.widget_path import WidgetPath
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the gesture classification falls back to plain Python
+    np = None
+
+
+HOT_SPOT_DEBUGGING = False
+
+LEFT_BUTTON = 1  # Qt::LeftButton
+
+# objectName of KLayout's layout canvas, a left button drag on it may select a box
+CANVAS_WIDGET_NAMES = frozenset(('canvas',))
+
+# LayoutView.mode_name() of the modes in which a left drag on the canvas is a box selection
+BOX_SELECT_MODES = frozenset(('select',))
+
+
+def is_canvas_target(target: WidgetPath) -> bool:
+    return any(e.widget_name in CANVAS_WIDGET_NAMES for e in target.entries)
+
+
+@dataclass
+class GestureOptions:
+    click_tolerance: float = 4.0           # max. distance (pixels) from the press of a click
+    double_click_interval_ms: float = 500.0
+    # RDP tolerance (pixels) of the drag path, 0: keep all moves as they arrive.
+    # Trajectories are simplified once, by default upstream (LowLevelEventCombiner, TrajectoryMode.SAMPLED),
+    # simplifying again here would add up both tolerances.
+    waypoint_tolerance: float = 0.0
+    box_select_target: Callable[[WidgetPath], bool] = is_canvas_target
+    box_select_modes: FrozenSet[str] = BOX_SELECT_MODES  # an unknown mode (None) is no box select
+
+
+def gesture_points(press: Event, moves: List[Event], release: Event) -> Sequence[Tuple[int, int]]:
+    """
+    Coordinates of the buffered gesture (press, moves, release), 
+    a (n, 2) array if numpy is available
+    """
+    events = [press, *moves, release]
+    if np is not None:
+        return np.fromiter(chain.from_iterable((e.event.x, e.event.y) for e in events),
+                           dtype=np.int64, count=2 * len(events)).reshape(-1, 2)
+    return [(e.event.x, e.event.y) for e in events]
+
+
+def max_distance(points: Sequence[Tuple[int, int]], origin: Tuple[int, int]) -> float:
+    if np is not None:
+        a = np.asarray(points, dtype=np.float64) - np.asarray(origin, dtype=np.float64)
+        return float(np.sqrt(np.max(np.einsum('ij,ij->i', a, a)))) if len(a) else 0.0
+    x0, y0 = origin
+    return max((math.hypot(x - x0, y - y0) for x, y in points), default=0.0)
+
+
+class GestureRecognizer(EventHandler):
+    """
+    Runs after the LowLevelEventCombiner (so drag trajectories are already sampled).
+    
+    Mouse events are buffered from the press until the release, each (coalesced)
+    wheel event becomes a ZoomEvent. A single click is held back until the next
+    press or release(), so that a following double click is emitted as one
+    ClickEvent with count=2 (otherwise the double click is emitted unchanged).
+    """
+    
+    def __init__(self, delegate: EventHandler, options: Optional[GestureOptions] = None):
+        self.delegate = delegate
+        self.options = options or GestureOptions()
+        
+        self.gesture: List[Event] = []     # press (or double click), moves
+        self.click: Optional[Event] = None  # single click, candidate for a double click
+        self.hover: List[Event] = []       # moves after the held back click
+    
+    def flush(self):
+        self._emit_pending()
+        self.delegate.flush()
+    
+    def release(self):
+        # a gesture in progress is kept, it is completed with the release
+        self._emit_click()
+        self.delegate.release()
+    
+    def _emit_raw(self, events: List[Event]):
+        for e in events:
+            self.delegate.handle_event(e)
+    
+    def _emit_wheel(self, wheel: Event):
+        # wheel bursts are already coalesced by the LowLevelEventCombiner
+        e = wheel.event
+        self.delegate.handle_event(Event(
+            kind=Event.Kind.ZOOM_EVENT,
+            target=wheel.target,
+            event=ZoomEvent(x=e.x, y=e.y,
+                            angle_delta_x=e.angle_delta_x,
+                            angle_delta_y=e.angle_delta_y,
+                            modifiers=e.modifiers,
+                            steps=e.count),
+            timestamp=wheel.timestamp
+        ))
+    
+    def _emit_click(self):
+        if self.click is not None:
+            self.delegate.handle_event(self.click)
+            self.click = None
+        self._emit_raw(self.hover)
+        self.hover = []
+    
+    def _emit_gesture(self):
+        # the release did not arrive (e.g. flush while the button is held)
+        self._emit_raw(self.gesture)
+        self.gesture = []
+    
+    def _emit_pending(self):
+        self._emit_click()
+        self._emit_gesture()
+    
+    def _is_double_click_of(self, press: Event) -> bool:
+        c = self.click
+        return c is not None and \
+               c.target is press.target and \
+               c.event.button == press.event.button and \
+               press.timestamp - c.timestamp <= self.options.double_click_interval_ms * 1_000_000
+    
+    def _is_box_select(self, press: Event) -> bool:
+        if press.event.button != LEFT_BUTTON or not self.options.box_select_target(press.target):
+            return False
+        return press.event.edit_mode in self.options.box_select_modes
+    
+    def _make_drag(self, press: Event, points: Sequence[Tuple[int, int]]) -> Event:
+        p = press.event
+        kept = rdp(points, self.options.waypoint_tolerance)
+        waypoints = [points[i] for i in kept[1:-1]]
+        end_x, end_y = points[-1]
+        return Event(kind=Event.Kind.DRAG_EVENT,
+                     target=press.target,
+                     event=DragEvent(button=p.button, modifiers=p.modifiers,
+                                     start_x=p.x, start_y=p.y, end_x=int(end_x), end_y=int(end_y),
+                                     waypoints=tuple((int(x), int(y)) for x, y in waypoints),
+                                     box_select=self._is_box_select(press)),
+                     timestamp=press.timestamp)
+    
+    def _complete_gesture(self, release: Event):
+        press, *moves = self.gesture
+        self.gesture = []
+        p = press.event
+        points = gesture_points(press, moves, release)
+        is_click = max_distance(points[1:], (p.x, p.y)) <= self.options.click_tolerance
+        
+        if press.event.type == QtEventType.MouseButtonDblClick:
+            if is_click and self._is_double_click_of(press):
+                c = self.click.event
+                c.count = 2
+                self.hover = []  # moves between the clicks are within the tolerance
+                self._emit_click()
+            else:
+                self._emit_click()
+                self._emit_raw([press] + moves + [release])
+            return
+        
+        self._emit_click()
+        if is_click:
+            self.click = Event(kind=Event.Kind.CLICK_EVENT,
+                               target=press.target,
+                               event=ClickEvent(button=p.button, x=p.x, y=p.y, modifiers=p.modifiers),
+                               timestamp=press.timestamp)
+        else:
+            self.delegate.handle_event(self._make_drag(press, points))
+    
+    def handle_event(self, event: Event):
+        if event.kind == Event.Kind.WHEEL_EVENT:
+            self._emit_pending()
+            self._emit_wheel(event)
+            return
+        
+        if event.kind != Event.Kind.MOUSE_EVENT:
+            self._emit_pending()
+            self.delegate.handle_event(event)
+            return
+        
+        e = event.event
+        match e.type:
+            case QtEventType.MouseButtonPress | QtEventType.MouseButtonDblClick:
+                self._emit_gesture()  # e.g. a second button pressed while dragging
+                if e.type == QtEventType.MouseButtonPress or not self._is_double_click_of(event):
+                    self._emit_click()
+                self.gesture.append(event)
+                
+            case QtEventType.MouseMove:
+                if self.gesture:
+                    self.gesture.append(event)
+                elif self.click is not None:
+                    self.hover.append(event)
+                else:
+                    self.delegate.handle_event(event)
+            
+            case QtEventType.MouseButtonRelease:
+                if self.gesture and self.gesture[0].target is event.target and \
+                   self.gesture[0].event.button == e.button:
+                    self._complete_gesture(event)
+                else:
+                    if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+                        debug(f"GestureRecognizer.handle_event: release without matching press")
+                    self._emit_pending()
+                    self.delegate.handle_event(event)
+            
+            case _:
+                self._emit_pending()
+                self.delegate.handle_event(event)
@@ -17,7 +17,9 @@
 #--------------------------------------------------------------------------------
 
 from __future__ import annotations
+import os
 from pathlib import Path
+import time
 import traceback
 from typing import *
 
@@ -27,9 +29,19 @@ from klayout_plugin_utils.debugging import debug, Debugging
 from klayout_plugin_utils.event_loop import EventLoop
 from klayout_plugin_utils.str_enum_compat import StrEnum
 
+from klayout_gui_automation.async_event_handler import AsyncEventHandler
+from klayout_gui_automation.automation_server import AUTOMATION_SOCKET_ENV, AutomationServer
+from klayout_gui_automation.binary_event_log import RECORDING_DIR_ENV, BinaryEventLogWriter
+from klayout_gui_automation.event_archive import write_event_archive
+from klayout_gui_automation.event_handler import TeeEventHandler
+from klayout_gui_automation.gesture_recognizer import GestureRecognizer
 from klayout_gui_automation.log_event_handler import LogEventHandler
 from klayout_gui_automation.low_level_event_combiner import LowLevelEventCombiner
+from klayout_gui_automation.recording import read_recording
 from klayout_gui_automation.high_level_event_combiner import HighLevelEventCombiner
+from klayout_gui_automation.streaming_event_handler import STREAM_SOCKET_ENV, StreamingEventHandler
+from klayout_gui_automation.trajectory import TrajectoryMode, TrajectoryOptions
+from klayout_gui_automation.view_state_recorder import VIEW_STATE_ENV, ViewStateRecorder
 from klayout_gui_automation.event_recorder import *
 from klayout_gui_automation.event_replayer import *
 
@@ -46,9 +58,42 @@ class GUIAutomationPluginFactory(pya.PluginFactory):
             self._record_tray: Optional[pya.QSystemTrayIcon] = None
             self._state: GUIAutomationPluginState = GUIAutomationPluginState.STOPPED
             
-            self._recorded_event_handler = HighLevelEventCombiner(LowLevelEventCombiner(LogEventHandler()))
+            # write recording files and/or stream to external consumers if requested,
+            # printing every event slows down recording
+            self._recording_dir = os.environ.get(RECORDING_DIR_ENV)
+            self._recording_writer: Optional[BinaryEventLogWriter] = None
+            stream_socket_path = os.environ.get(STREAM_SOCKET_ENV)
+            self._sink_event_handler = TeeEventHandler()
+            if stream_socket_path:
+                self._stream_event_handler = StreamingEventHandler(stream_socket_path)
+                # consumers usually connect before the first event is recorded
+                self._stream_event_handler.start()
+                self._sink_event_handler.add_delegate(self._stream_event_handler)
+            else:
+                self._stream_event_handler = None
+                if not self._recording_dir:
+                    self._sink_event_handler.add_delegate(LogEventHandler())
+            
+            # the event filter only captures snapshots, the combiners run in a worker thread
+            self._recorded_event_handler = AsyncEventHandler(
+                # key autorepeats are collapsed before key presses/releases are combined into text
+                LowLevelEventCombiner(
+                    HighLevelEventCombiner(GestureRecognizer(self._sink_event_handler)),
+                    # drags on the canvas (selection, paths, rulers) keep their shape within 1px
+                    TrajectoryOptions(mode=TrajectoryMode.SAMPLED, tolerance=1.0, min_distance=1.0)
+                )
+            )
             self._recorder = EventRecorder(self._recorded_event_handler)
-            self._replayer = EventReplayer()
+            # layer panel, cell hierarchy and viewport changes as semantic events (opt-in)
+            self._view_state_recorder = ViewStateRecorder(self._recorded_event_handler, self._recorder) \
+                                        if os.environ.get(VIEW_STATE_ENV) else None
+            self._replayer = EventReplayer(probe=self._recorder.probe_std, 
+                                           action_index=self._recorder.action_index)
+            self._automation_server: Optional[AutomationServer] = None
+            
+            socket_path = os.environ.get(AUTOMATION_SOCKET_ENV)
+            if socket_path:
+                self.start_automation_server(socket_path)
             
             self.has_tool_entry = False
             self.register(-1000, "gui_automation", "GUI Automation")
@@ -99,14 +144,73 @@ class GUIAutomationPluginFactory(pya.PluginFactory):
         if Debugging.DEBUG:
             debug("GUIAutomationPluginFactory.start_recording")
         
+        if self._recording_dir:
+            self.start_recording_file()
+        
         self._recorder.start()
+        if self._view_state_recorder is not None:
+            self._view_state_recorder.start()
         
     def stop_recording(self):
         if Debugging.DEBUG:
             debug("GUIAutomationPluginFactory.stop_recording")
 
-        self._recorder.stop()
+        if self._view_state_recorder is not None:
+            self._view_state_recorder.stop()
+        self._recorder.stop()  # flushes the pipeline
+        self.stop_recording_file()
+    
+    def start_recording_file(self):
+        """
+        Opens a new crash safe log (*.kgal) for this recording session, see stop_recording_file()
+        """
+        os.makedirs(self._recording_dir, exist_ok=True)
+        path = os.path.join(self._recording_dir, time.strftime('recording-%Y%m%d-%H%M%S.kgal'))
+        self._recording_writer = BinaryEventLogWriter(path)
+        self._sink_event_handler.add_delegate(self._recording_writer)
+        print(f"GUI Automation: recording to {path}")
+    
+    def stop_recording_file(self):
+        """
+        Compacts the log of the session into a seekable event archive (*.kgaa)
+        """
+        writer = self._recording_writer
+        if writer is None:
+            return
+        self._recording_writer = None
+        self._sink_event_handler.remove_delegate(writer)
+        self._recorded_event_handler.flush()  # the worker is done with the writer
+        writer.close()
+        
+        archive_path = writer.path.with_suffix('.kgaa')
+        try:
+            write_event_archive(archive_path, read_recording(writer.path))
+        except Exception as e:
+            print(f"GUIAutomationPluginFactory.stop_recording_file: keeping {writer.path}, "
+                  f"can't write the archive", e)
+            traceback.print_exc()
+            return
+        os.unlink(writer.path)
+        print(f"GUI Automation: recorded {writer.event_count} events to {archive_path}")
 
+    def start_automation_server(self, socket_path: str):
+        if Debugging.DEBUG:
+            debug(f"GUIAutomationPluginFactory.start_automation_server: socket_path={socket_path}")
+        
+        self.stop_automation_server()
+        server = AutomationServer(socket_path, self._replayer, self._recorder)
+        try:
+            server.start()
+        except Exception as e:
+            print("GUIAutomationPluginFactory.start_automation_server caught an exception", e)
+            return
+        self._automation_server = server
+    
+    def stop_automation_server(self):
+        if self._automation_server is not None:
+            self._automation_server.stop()
+            self._automation_server = None
+    
     def install_system_tray_icons(self):
         if Debugging.DEBUG:
             debug("GUIAutomationPluginFactory.install_system_tray_icons")
@@ -167,6 +271,10 @@ class GUIAutomationPluginFactory(pya.PluginFactory):
             debug(f"GUIAutomationPluginFactory.stop")
     
         self.state = GUIAutomationPluginState.STOPPED
+        self._recorded_event_handler.stop()
+        if self._stream_event_handler is not None:
+            self._stream_event_handler.stop()
+        self.stop_automation_server()
     
         if self._record_tray_icon is not None:
             self._record_tray_icon.hide()
@@ -18,24 +18,64 @@
 
 from typing import *
 
-import pya
-
 from klayout_plugin_utils.debugging import debug, Debugging
 
-from klayout_gui_automation.event import Event, TypeEvent, ClickEvent
+from klayout_gui_automation.event import Event, QtEventType, TypeEvent
 from klayout_gui_automation.event_handler import EventHandler
 
 
 HOT_SPOT_DEBUGGING = True
 
+PENDING_EVENT_OVERHEAD_BYTES = 64  # rough size of a held back event, excl. its text
+
 
 class HighLevelEventCombiner(EventHandler):
-    def __init__(self, delegate: EventHandler):
+    """
+    Combines key presses/releases of plain text into TypeEvents,
+    mouse gestures are recognized downstream (see GestureRecognizer)
+    """
+    
+    def __init__(self, 
+                 delegate: EventHandler,
+                 max_pending_events: int = 256,
+                 max_pending_bytes: int = 64 * 1024):
         self.delegate = delegate
+        self.max_pending_events = max_pending_events
+        self.max_pending_bytes = max_pending_bytes
         
         self.previous_events: List[Event] = []
     
     def flush(self):
+        self._emit_pending()
+        self.delegate.flush()
+    
+    def release(self):
+        # a press without its release yet is kept, it is completed within milliseconds
+        p = self.previous_event
+        held = None
+        if p is not None and p.kind == Event.Kind.KEY_EVENT and p.event.type == QtEventType.KeyPress:
+            held = self.previous_events.pop()
+        self._emit_pending()
+        if held is not None:
+            self.previous_events.append(held)
+        self.delegate.release()
+    
+    @property
+    def pending_bytes(self) -> int:
+        return sum(PENDING_EVENT_OVERHEAD_BYTES + (len(e.event.text) if e.kind == Event.Kind.TYPE_EVENT else 0)
+                   for e in self.previous_events)
+    
+    def _enforce_pending_limits(self):
+        # e.g. typing into the same widget for a long time, emit the TypeEvent so far
+        p = self.previous_event
+        if p is None or p.kind != Event.Kind.TYPE_EVENT:
+            return
+        if len(self.previous_events) > self.max_pending_events or self.pending_bytes > self.max_pending_bytes:
+            if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+                debug(f"HighLevelEventCombiner._enforce_pending_limits: emitting {len(self.previous_events)} held back events")
+            self._emit_pending()
+    
+    def _emit_pending(self):
         for e in self.previous_events:
             self.delegate.handle_event(e)
         self.previous_events = []
@@ -51,20 +91,20 @@ class HighLevelEventCombiner(EventHandler):
         if p is None:
             return False
             
-        if p.target != event.target:
+        if p.target is not event.target:  # WidgetPaths are interned
             if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
                 debug(f"HighLevelEventCombiner.needs_flush: yes (different target)!")
             return True
             
         p_kind = p.kind if p else None
-        p_event_type = p.event.type if p and hasattr(p.event, 'type') else pya.QEvent.None_
+        p_event_type = p.event.type if p and hasattr(p.event, 'type') else QtEventType.None_
         match (p_kind, event.kind):
             case (Event.Kind.KEY_EVENT, Event.Kind.KEY_EVENT):  # we can merge keyDown/keyUp into TypeEvents
                 match (p_event_type, event.event.type):
-                    case (pya.QEvent.None_, pya.QEvent.KeyPress):
+                    case (QtEventType.None_, QtEventType.KeyPress):
                         return False
                     
-                    case (pya.QEvent.KeyPress, pya.QEvent.KeyRelease):
+                    case (QtEventType.KeyPress, QtEventType.KeyRelease):
                         return False
                 
                 if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
@@ -74,22 +114,14 @@ class HighLevelEventCombiner(EventHandler):
             case (Event.Kind.TYPE_EVENT, Event.Kind.KEY_EVENT):
                 return False
         
-            case (Event.Kind.MOUSE_EVENT, Event.Kind.MOUSE_EVENT):  # TODO
-                match (p_event_type, event.event.type):
-                    case (pya.QEvent.None_, pya.QEvent.MouseButtonPress):
-                        return False
-                
-                    case (pya.QEvent.MouseButtonPress, pya.QEvent.MouseButtonRelease):
-                        return False
-                
-                if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
-                    debug(f"HighLevelEventCombiner.needs_flush: no matching combination NOUSE_EVENT/NOUSE_EVENT!")
-                return True
-
         if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
             debug(f"HighLevelEventCombiner.needs_flush: fallback")
         return True
     
+    @staticmethod
+    def is_plain_text(text: str) -> bool:
+        return bool(text) and text.isprintable()
+    
     def _try_combine_key_event(self, event: Event) -> bool:
         # see if we can combine
         if event.kind != Event.Kind.KEY_EVENT:
@@ -99,31 +131,39 @@ class HighLevelEventCombiner(EventHandler):
         
         p = self.previous_event
         p_kind = p.kind if p else None
-        p_event_type = p.event.type if p and hasattr(p.event, 'type') else pya.QEvent.None_
+        p_event_type = p.event.type if p and hasattr(p.event, 'type') else QtEventType.None_
         
         match (p_kind, event.kind):
             case (None, Event.Kind.KEY_EVENT):
-                if event.event.type == pya.QEvent.KeyPress:
+                if event.event.type == QtEventType.KeyPress:
                     # delay emitting this event, as we can combine
                     self.previous_events.append(event)
                     return True
             case (Event.Kind.KEY_EVENT, Event.Kind.KEY_EVENT):  # we can merge keyDown/keyUp into TypeEvents
                 match (p_event_type, event.event.type):
-                    case (pya.QEvent.None_, pya.QEvent.KeyPress):
+                    case (QtEventType.None_, QtEventType.KeyPress):
                         # delay emitting this event, as we can combine
                         self.previous_events.append(event)
                         return True
                         
-                    case (pya.QEvent.KeyPress, pya.QEvent.KeyRelease):
-                        self.previous_events.pop()
+                    case (QtEventType.KeyPress, QtEventType.KeyRelease):
+                        if not self.is_plain_text(event.event.text):
+                            # Enter, Backspace, arrows, ... must be replayed as key events
+                            self.previous_events.append(event)
+                            self._emit_pending()
+                            return True
+                        
+                        press = self.previous_events.pop()
+                        text = event.event.text * press.event.repeat_count  # a held key
                         p = self.previous_event
                         if p is None:
                             te = Event(kind=Event.Kind.TYPE_EVENT,
                                        target=event.target,
-                                       event=TypeEvent(text=event.event.text))
+                                       event=TypeEvent(text=text),
+                                       timestamp=press.timestamp)
                             self.previous_events.append(te)
                         elif p.kind == Event.Kind.TYPE_EVENT:
-                            p.text += event.event.text
+                            p.event.text += text
                         # delay emitting this event, as we can combine
                         return True
                     
@@ -143,38 +183,6 @@ class HighLevelEventCombiner(EventHandler):
         
         return False
     
-    def _try_combine_mouse_event(self, event: Event) -> bool:
-        # see if we can combine
-        if event.kind != Event.Kind.MOUSE_EVENT:
-            return False
-        
-        p = self.previous_event
-        p_kind = p.kind if p else None
-        p_event_type = p.event.type if p else pya.QEvent.None_
-        
-        match (p_kind, event.kind):
-            case (Event.Kind.MOUSE_EVENT, Event.Kind.MOUSE_EVENT):  # we can merge keyDown/keyUp into TypeEvents
-                match (p_event_type, event.event.type):
-                    case (pya.QEvent.None_, pya.QEvent.MouseButtonPress):
-                        # delay emitting this event, as we can combine
-                        self.previous_events.append(event)
-                        return True
-                        
-                    case (pya.QEvent.MouseButtonPress, pya.QEvent.MouseButtonRelease):
-                        self.previous_events.pop()
-                        p = self.previous_event
-                        if p is None:
-                            te = Event(kind=Event.Kind.CLICK_EVENT,
-                                       target=event.target,
-                                       event=TypeEvent(text=event.event.text))
-                            self.previous_events.append(te)
-                        elif p.kind == Event.Kind.TYPE_Event:
-                            p.text += event.event.text
-                        # delay emitting this event, as we can combine
-                        return True
-                
-        return False
-
     def handle_event(self, event: Event):
         if Debugging.DEBUG:
             debug(f"HighLevelEventCombiner.handle_event: enter!")
@@ -183,17 +191,14 @@ class HighLevelEventCombiner(EventHandler):
             if Debugging.DEBUG:
                 debug(f"HighLevelEventCombiner.handle_event: need flush!")
             
-            self.flush()
+            self._emit_pending()
             self.delegate.handle_event(event)
             return
         
         if self._try_combine_key_event(event):
             if Debugging.DEBUG:
                 debug(f"HighLevelEventCombiner.handle_event: merging key event worked!")
-            return
-        elif self._try_combine_mouse_event(event):
-            if Debugging.DEBUG:
-                debug(f"HighLevelEventCombiner.handle_event: merging key event worked!")
+            self._enforce_pending_limits()
             return
         else:           
             if Debugging.DEBUG:
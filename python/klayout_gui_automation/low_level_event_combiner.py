@@ -18,24 +18,82 @@
 
 from typing import *
 
-import pya
-
 from klayout_plugin_utils.debugging import debug, Debugging
 
-from klayout_gui_automation.event import Event
+from klayout_gui_automation.event import Event, QtEventType
 from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.trajectory import TrajectoryMode, TrajectoryOptions, simplify
 
 
 HOT_SPOT_DEBUGGING = False
 
 
 class LowLevelEventCombiner(EventHandler):
-    def __init__(self, delegate: EventHandler):
+    """
+    Combines consecutive MouseMoves (see TrajectoryOptions) and Resizes on the same target,
+    bursts of wheel events (accumulating the deltas, see WheelEvent.count) and
+    key autorepeats (into the repeat_count of the initial KeyPress)
+    """
+    
+    def __init__(self, 
+                 delegate: EventHandler, 
+                 trajectory_options: Optional[TrajectoryOptions] = None,
+                 wheel_burst_gap_ms: float = 300.0):
         self.delegate = delegate
+        self.trajectory_options = trajectory_options or TrajectoryOptions()
+        self.wheel_burst_gap_ns = int(wheel_burst_gap_ms * 1_000_000)
         
         self.previous_event: Optional[Event] = None
+        self.previous_timestamp = 0  # of the last event combined into previous_event
+        self.trajectory: List[Event] = []  # TrajectoryMode.SAMPLED only
+    
+    @staticmethod
+    def _is_mouse_move(event: Event) -> bool:
+        return event.kind == Event.Kind.MOUSE_EVENT and event.event.type == QtEventType.MouseMove
+    
+    @staticmethod
+    def _continues_trajectory(p: Event, event: Event) -> bool:
+        return p.target is event.target and \
+               p.event.buttons == event.event.buttons and \
+               p.event.modifiers == event.event.modifiers
+    
+    def _emit_trajectory(self):
+        moves = self.trajectory
+        if not moves:
+            return
+        self.trajectory = []
+        points = [(m.event.x, m.event.y) for m in moves]
+        timestamps = [m.timestamp for m in moves]
+        kept = simplify(points, timestamps, self.trajectory_options)
+        if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+            debug(f"LowLevelEventCombiner._emit_trajectory: kept {len(kept)} of {len(moves)} moves")
+        for i in kept:
+            self.delegate.handle_event(moves[i])
+    
+    def _handle_sampled_move(self, event: Event) -> bool:
+        t = self.trajectory
+        if t and self._continues_trajectory(t[-1], event) and len(t) < self.trajectory_options.max_points:
+            t.append(event)
+            return True
+        self._emit_pending()
+        self.trajectory = [event]
+        return True
     
     def flush(self):
+        self._emit_pending()
+        self.delegate.flush()
+    
+    def release(self):
+        # a held key is kept, its autorepeats start only after the autorepeat delay
+        p = self.previous_event
+        if p is not None and p.kind == Event.Kind.KEY_EVENT:
+            self._emit_trajectory()
+        else:
+            self._emit_pending()
+        self.delegate.release()
+    
+    def _emit_pending(self):
+        self._emit_trajectory()
         if self.previous_event is not None:
             self.delegate.handle_event(self.previous_event)
         self.previous_event = None
@@ -45,8 +103,8 @@ class LowLevelEventCombiner(EventHandler):
             return False
     
         match event.kind:
-            case Event.Kind.MOUSE_EVENT | Event.Kind.RESIZE_EVENT:
-                if self.previous_event.target != event.target:
+            case Event.Kind.MOUSE_EVENT | Event.Kind.RESIZE_EVENT | Event.Kind.WHEEL_EVENT | Event.Kind.KEY_EVENT:
+                if self.previous_event.target is not event.target:  # WidgetPaths are interned
                     if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
                         debug(f"LowLevelEventCombiner.needs_flush: yes (different target)!")
                     return True
@@ -56,8 +114,27 @@ class LowLevelEventCombiner(EventHandler):
                     return True
         if event.kind == Event.Kind.RESIZE_EVENT:
             return False
+        elif event.kind == Event.Kind.WHEEL_EVENT:
+            p = self.previous_event.event
+            e = event.event
+            if p.buttons != e.buttons or p.modifiers != e.modifiers \
+               or (p.angle_delta_x > 0) != (e.angle_delta_x > 0) \
+               or (p.angle_delta_y > 0) != (e.angle_delta_y > 0) \
+               or event.timestamp - self.previous_timestamp > self.wheel_burst_gap_ns:
+                if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+                    debug(f"LowLevelEventCombiner.needs_flush: yes (wheel burst ended)!")
+                return True
+            return False
+        elif event.kind == Event.Kind.KEY_EVENT:
+            p = self.previous_event.event
+            e = event.event
+            if not e.auto_repeat or p.key != e.key or p.modifiers != e.modifiers:
+                if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+                    debug(f"LowLevelEventCombiner.needs_flush: yes (no autorepeat of the held key)!")
+                return True
+            return False
         elif event.kind == Event.Kind.MOUSE_EVENT\
-            and event.event.type == pya.QEvent.MouseMove:
+            and event.event.type == QtEventType.MouseMove:
             if self.previous_event.event.type != event.event.type\
                 or self.previous_event.event.button != event.event.button\
                 or self.previous_event.event.buttons != event.event.buttons\
@@ -74,22 +151,63 @@ class LowLevelEventCombiner(EventHandler):
     def handle_event(self, event: Event):
         if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
             debug(f"LowLevelEventCombiner.handle_event: enter!")
-            
+        
+        match self.trajectory_options.mode:
+            case TrajectoryMode.SAMPLED:
+                if self._is_mouse_move(event):
+                    self._handle_sampled_move(event)
+                    return
+                self._emit_trajectory()  # the gesture ended
+            case TrajectoryMode.FULL:
+                if self._is_mouse_move(event):
+                    self._emit_pending()
+                    self.delegate.handle_event(event)
+                    return
+        
         if self.needs_flush(event):
-            self.flush()
-            self.delegate.handle_event(event)
-            return
+            self._emit_pending()
+            # a new wheel burst or key press may again be combined with its successors
+            if event.kind not in (Event.Kind.WHEEL_EVENT, Event.Kind.KEY_EVENT):
+                self.delegate.handle_event(event)
+                return
         
         # see if we can combine
-        if event.kind == Event.Kind.MOUSE_EVENT and event.event.type == pya.QEvent.MouseMove:
+        if event.kind == Event.Kind.MOUSE_EVENT and event.event.type == QtEventType.MouseMove:
             if self.previous_event is None:
                 # delay emitting this event, as we can combine moves
                 self.previous_event = event
                 return
             else: # needs_flush()==False guarantees this is also a mergeable QMouseMoveEvent
-                delta = event.event.global_pos - self.previous_event.event.global_pos
-                self.previous_event.event.pos += delta
-                self.previous_event.event.global_pos += delta
+                p = self.previous_event.event
+                e = event.event
+                p.x += e.global_x - p.global_x
+                p.y += e.global_y - p.global_y
+                p.global_x = e.global_x
+                p.global_y = e.global_y
+                return
+        elif event.kind == Event.Kind.WHEEL_EVENT:
+            if self.previous_event is None:
+                # delay emitting this event, as we can combine the burst
+                self.previous_event = event
+                self.previous_timestamp = event.timestamp
+                return
+            else: # needs_flush()==False guarantees this continues the burst
+                p = self.previous_event.event
+                p.angle_delta_x += event.event.angle_delta_x
+                p.angle_delta_y += event.event.angle_delta_y
+                p.count += 1
+                self.previous_timestamp = event.timestamp
+                return
+        elif event.kind == Event.Kind.KEY_EVENT:
+            if self.previous_event is None:
+                if event.event.type == QtEventType.KeyPress:
+                    # delay emitting this event, as we can combine autorepeats
+                    self.previous_event = event
+                    return
+            else: # needs_flush()==False guarantees this is an autorepeat of the held key
+                if event.event.type == QtEventType.KeyPress:
+                    self.previous_event.event.repeat_count += 1
+                # autorepeat releases (X11 sends them in between) are implied
                 return
         elif event.kind == Event.Kind.RESIZE_EVENT:
             if self.previous_event is None:
@@ -97,7 +215,8 @@ class LowLevelEventCombiner(EventHandler):
                 self.previous_event = event
                 return
             else: # needs_flush()==False guarantees this is also a mergeable QMouseMoveEvent
-                self.previous_event.event.new_size = event.event.new_size
+                self.previous_event.event.new_width = event.event.new_width
+                self.previous_event.event.new_height = event.event.new_height
                 return
         
         if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
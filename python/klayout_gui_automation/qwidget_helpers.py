@@ -18,50 +18,127 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
+from enum import IntFlag
 from typing import *
 
 import pya
 
 
+class WidgetKind(IntFlag):
+    NONE = 0
+    WIDGET = 1 << 0
+    TOOLBAR = 1 << 1
+    MENUBAR = 1 << 2
+    MENU = 1 << 3
+    MAINWINDOW = 1 << 4
+    DIALOG = 1 << 5
+    TREEVIEW = 1 << 6
+    LINEEDIT = 1 << 7
+    TEXTEDIT = 1 << 8
+    SPINBOX = 1 << 9
+    CHECKBOX = 1 << 10
+    COMBOBOX = 1 << 11
+    LISTVIEW = 1 << 12
+    RADIOBUTTON = 1 << 13
+    PUSHBUTTON = 1 << 14
+    
+    TOOL_OR_MENU_BAR = TOOLBAR | MENUBAR | MENU
+    TOP_LEVEL_WINDOW = DIALOG | MAINWINDOW
+
+
+_KIND_CLASS_NAMES: List[Tuple[WidgetKind, str]] = [
+    (WidgetKind.WIDGET, 'QWidget'),
+    (WidgetKind.TOOLBAR, 'QToolBar'),
+    (WidgetKind.MENUBAR, 'QMenuBar'),
+    (WidgetKind.MENU, 'QMenu'),
+    (WidgetKind.MAINWINDOW, 'QMainWindow'),
+    (WidgetKind.DIALOG, 'QDialog'),
+    (WidgetKind.TREEVIEW, 'QTreeView'),
+    (WidgetKind.LINEEDIT, 'QLineEdit'),
+    (WidgetKind.TEXTEDIT, 'QTextEdit'),
+    (WidgetKind.SPINBOX, 'QSpinBox'),
+    (WidgetKind.CHECKBOX, 'QCheckBox'),
+    (WidgetKind.COMBOBOX, 'QComboBox'),
+    (WidgetKind.LISTVIEW, 'QListView'),
+    (WidgetKind.RADIOBUTTON, 'QRadioButton'),
+    (WidgetKind.PUSHBUTTON, 'QPushButton'),
+]
+
+_kind_classes: Optional[List[Tuple[WidgetKind, Tuple[type, ...]]]] = None
+
+# Python wrapper class -> WidgetKind, each class is classified only once
+_classification_table: Dict[type, WidgetKind] = {}
+
+
+def _resolve_kind_classes() -> List[Tuple[WidgetKind, Tuple[type, ...]]]:
+    global _kind_classes
+    if _kind_classes is None:
+        _kind_classes = []
+        for kind, name in _KIND_CLASS_NAMES:
+            classes = tuple(c for c in (getattr(pya, name, None), getattr(pya, f"{name}_Native", None)) 
+                            if c is not None)
+            _kind_classes.append((kind, classes))
+    return _kind_classes
+
+
+def classify_widget_class(cls: type) -> WidgetKind:
+    kind = _classification_table.get(cls)
+    if kind is None:
+        kind = WidgetKind.NONE
+        for k, classes in _resolve_kind_classes():
+            if issubclass(cls, classes):
+                kind |= k
+        _classification_table[cls] = kind
+    return kind
+
+
+def widget_kind(widget: Optional[pya.QObject]) -> WidgetKind:
+    if widget is None:
+        return WidgetKind.NONE
+    return classify_widget_class(type(widget))
+
+
+def is_qwidget(widget: pya.QObject) -> bool:
+    return bool(widget_kind(widget) & WidgetKind.WIDGET)
+
 def is_qtoolbar(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QToolBar) or isinstance(widget, pya.QToolBar_Native)
+    return bool(widget_kind(widget) & WidgetKind.TOOLBAR)
 
 def is_qmenubar(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QMenuBar) or isinstance(widget, pya.QMenuBar_Native)
+    return bool(widget_kind(widget) & WidgetKind.MENUBAR)
 
 def is_qmenu(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QMenu) or isinstance(widget, pya.QMenu_Native)
+    return bool(widget_kind(widget) & WidgetKind.MENU)
 
 def is_qmainwindow(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QMainWindow) or isinstance(widget, pya.QMainWindow_Native)
+    return bool(widget_kind(widget) & WidgetKind.MAINWINDOW)
 
 def is_qdialog(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QDialog) or isinstance(widget, pya.QDialog_Native)
+    return bool(widget_kind(widget) & WidgetKind.DIALOG)
 
 def is_qtreeview(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QTreeView) or isinstance(widget, pya.QTreeView_Native)
+    return bool(widget_kind(widget) & WidgetKind.TREEVIEW)
     
 def is_qlineedit(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QLineEdit) or isinstance(widget, pya.QLineEdit_Native)
+    return bool(widget_kind(widget) & WidgetKind.LINEEDIT)
            
 def is_qtextedit(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QTextEdit) or isinstance(widget, pya.QTextEdit_Native)
+    return bool(widget_kind(widget) & WidgetKind.TEXTEDIT)
 
 def is_qspinbox(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QSpinBox) or isinstance(widget, pya.QSpinBox_Native)
+    return bool(widget_kind(widget) & WidgetKind.SPINBOX)
            
 def is_qcheckbox(widget: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QCheckBox) or isinstance(widget, pya.QCheckBox_Native)
-
-def is_qcombobox(wigdet: pya.QWidget) -> bool:
-    return isinstance(widget, pya.QComboBox) or isinstance(widget, pya.QComboBox_Native)
+    return bool(widget_kind(widget) & WidgetKind.CHECKBOX)
 
-def is_qlistview(widget: pya.QListView) -> bool:
-    return isinstance(widget, pya.QListView) or isinstance(widget, pya.QListView_Native)
+def is_qcombobox(widget: pya.QWidget) -> bool:
+    return bool(widget_kind(widget) & WidgetKind.COMBOBOX)
 
-def is_qradiobutton(widget: pya.QListView) -> bool:
-    return isinstance(widget, pya.QRadioButton) or isinstance(widget, pya.QRadioButton_Native)
+def is_qlistview(widget: pya.QWidget) -> bool:
+    return bool(widget_kind(widget) & WidgetKind.LISTVIEW)
 
-def is_qpushbutton(widget: pya.QListView) -> bool:
-    return isinstance(widget, pya.QPushButton) or isinstance(widget, pya.QPushButton_Native)
+def is_qradiobutton(widget: pya.QWidget) -> bool:
+    return bool(widget_kind(widget) & WidgetKind.RADIOBUTTON)
 
+def is_qpushbutton(widget: pya.QWidget) -> bool:
+    return bool(widget_kind(widget) & WidgetKind.PUSHBUTTON)
@@ -0,0 +1,130 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Recording files, the format is detected from the file contents:
+#   - event archives (EventArchiveWriter, magic KGAA), usually *.kgaa
+#   - binary event logs (BinaryEventLogWriter, magic KGAL), usually *.kgal
+#   - JSON lines (one event_to_json() object per line), usually *.jsonl
+#
+# Suites (*.kgsuite, JSON) describe recordings sharing common prefixes as a tree,
+# each node's recording continues the one of its parent, leaves are the tests:
+#
+#   {
+#       "name": "drc",
+#       "recording": "open_large_gds.kgaa",
+#       "children": [
+#           {"recording": "run_drc.kgaa"},
+#           {"recording": "setup_layers.kgaa", "children": [...]},
+#           {"detect_prefixes": true, "children": [{"recording": "a.kgaa"}, {"recording": "b.kgaa"}]}
+#       ]
+#   }
+#
+# Recording paths are relative to the suite file. With "detect_prefixes", 
+# common prefixes of the node's leaf children are detected when loading the events.
+#
+# NOTE: this module is also used outside of KLayout (see suite_runner),
+#       the event modules (which depend on pya) are only imported when reading.
+#
+
+from __future__ import annotations
+import itertools
+import json
+import os
+from typing import *
+
+RECORDING_SUFFIXES = ('.kgaa', '.kgal', '.jsonl')
+SUITE_SUFFIX = '.kgsuite'
+
+
+def is_recording(path: os.PathLike | str) -> bool:
+    return os.path.splitext(str(path))[1].lower() in RECORDING_SUFFIXES
+
+
+def find_recordings(paths: Iterable[os.PathLike | str]) -> List[str]:
+    """
+    Expands directories (recursively) to the recordings they contain, sorted by path
+    """
+    result = []
+    for p in paths:
+        p = str(p)
+        if os.path.isdir(p):
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames.sort()
+                result.extend(os.path.join(dirpath, f) for f in sorted(filenames) if is_recording(f))
+        else:
+            result.append(p)
+    return result
+
+
+def read_recording(path: os.PathLike | str) -> Iterator['Event']:
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    
+    if magic == b'KGAA':
+        from klayout_gui_automation.event_archive import read_event_archive
+        yield from read_event_archive(path)
+    elif magic == b'KGAL':
+        from klayout_gui_automation.binary_event_log import read_binary_event_log
+        yield from read_binary_event_log(path)
+    else:
+        from klayout_gui_automation.event_codec import event_from_json
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield event_from_json(json.loads(line))
+
+
+def prepare_suite(tree: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    """
+    Resolves recording paths, names all nodes and numbers the tests (leaves), in place.
+    Tests get an 'id' and a 'test_name' qualified by the names of their ancestors (except the root).
+    """
+    counter = itertools.count()
+    
+    def visit(node: Dict[str, Any], prefix: Optional[str]):
+        recording = node.get('recording')
+        if recording:
+            node['recording'] = os.path.join(base_dir, recording)
+            node.setdefault('name', os.path.splitext(os.path.basename(recording))[0])
+        node.setdefault('name', 'unnamed')
+        qualified = node['name'] if prefix is None else (f"{prefix}.{node['name']}" if prefix else node['name'])
+        children = node.setdefault('children', [])
+        if not children:
+            node['id'] = next(counter)
+            node['test_name'] = qualified
+        for c in children:
+            visit(c, '' if prefix is None else qualified)
+    
+    visit(tree, None)
+    return tree
+
+
+def load_suite(path: os.PathLike | str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    tree.setdefault('name', os.path.splitext(os.path.basename(str(path)))[0])
+    return prepare_suite(tree, os.path.dirname(os.path.abspath(path)))
+
+
+def suite_tests(tree: Dict[str, Any]) -> List[Dict[str, Any]]:
+    children = tree.get('children') or []
+    if not children:
+        return [tree]
+    return [t for c in children for t in suite_tests(c)]
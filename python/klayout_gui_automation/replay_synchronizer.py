@@ -0,0 +1,148 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.widget_resolver import WidgetResolver
+
+
+class SynchronizationTimeout(Exception):
+    pass
+
+
+class ReplaySynchronizer:
+    """
+    Blocks the replay until a precondition holds, instead of sleeping.
+    
+    The wait runs a nested event loop, so the application keeps working.
+    The condition is evaluated only when the event queue ran idle
+    (zero interval single shot timer), and this idle check is re-armed 
+    whenever something happened that could change the outcome: widgets
+    were added, removed, reparented, shown or hidden (as reported by the 
+    WidgetResolver), or the state of a watched widget changed 
+    (e.g. the text of a line edit, see WidgetResolver.watch_state_changes). 
+    A burst of structure events, like a dialog being constructed, 
+    therefore results in a single evaluation afterwards.
+    
+    For conditions depending on state nobody reports (e.g. whether a menu item
+    is enabled), a recheck timer can be enabled, per wait or for all waits 
+    (recheck_interval_ms), it is off by default.
+    """
+    
+    def __init__(self, 
+                 resolver: WidgetResolver,
+                 timeout_ms: int = 30_000,
+                 recheck_interval_ms: Optional[int] = None):
+        self.resolver = resolver
+        self.timeout_ms = timeout_ms
+        self.recheck_interval_ms = recheck_interval_ms
+        self.evaluations = 0
+    
+    def wait_until(self, 
+                   condition: Callable[[], bool], 
+                   description: str = 'condition',
+                   timeout_ms: Optional[int] = None,
+                   recheck_interval_ms: Optional[int] = None):
+        """
+        Returns as soon as the event queue is idle and condition() is true,
+        raises SynchronizationTimeout otherwise.
+        
+        recheck_interval_ms overrides the synchronizer's default for this wait
+        """
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        recheck_interval_ms = self.recheck_interval_ms if recheck_interval_ms is None else recheck_interval_ms
+        
+        loop = pya.QEventLoop()
+        satisfied = False
+        error: Optional[BaseException] = None
+        
+        def evaluate(*args):
+            nonlocal satisfied, error
+            if satisfied or error is not None:
+                return
+            self.evaluations += 1
+            try:
+                satisfied = bool(condition())
+            except Exception as e:
+                error = e
+            if satisfied or error is not None:
+                loop.exit(0)
+        
+        idle_timer = pya.QTimer()
+        idle_timer.singleShot = True
+        idle_timer.interval = 0
+        idle_timer.timeout.connect(evaluate)
+        
+        def on_widget_event(*args):
+            # (obj, event) from the resolver (event None for state changes),
+            # no arguments from the recheck timer
+            if not idle_timer.isActive():
+                idle_timer.start()
+        
+        deadline_timer = pya.QTimer()
+        deadline_timer.singleShot = True
+        deadline_timer.interval = timeout_ms
+        deadline_timer.timeout.connect(lambda *args: loop.exit(1))
+        
+        recheck_timer = None
+        if recheck_interval_ms:
+            recheck_timer = pya.QTimer()
+            recheck_timer.interval = recheck_interval_ms
+            recheck_timer.timeout.connect(on_widget_event)
+        
+        self.resolver.add_structure_listener(on_widget_event)
+        try:
+            idle_timer.start()
+            deadline_timer.start()
+            if recheck_timer is not None:
+                recheck_timer.start()
+            loop.exec_()
+        finally:
+            self.resolver.remove_structure_listener(on_widget_event)
+            for t in (idle_timer, deadline_timer, recheck_timer):
+                if t is not None:
+                    t.stop()
+        
+        if error is not None:
+            raise error
+        if not satisfied:
+            if Debugging.DEBUG:
+                debug(f"ReplaySynchronizer.wait_until: timeout after {timeout_ms}ms waiting for {description}")
+            raise SynchronizationTimeout(f"Timeout after {timeout_ms}ms waiting for {description}")
+    
+    def wait_ms(self, ms: float):
+        """
+        Lets the application run for the given time, without blocking the event loop
+        """
+        if ms <= 0:
+            return
+        loop = pya.QEventLoop()
+        timer = pya.QTimer()
+        timer.singleShot = True
+        timer.interval = max(1, int(round(ms)))
+        timer.timeout.connect(lambda *args: loop.exit(0))
+        timer.start()
+        try:
+            loop.exec_()
+        finally:
+            timer.stop()
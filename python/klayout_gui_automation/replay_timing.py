@@ -0,0 +1,94 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from dataclasses import dataclass
+import time
+from typing import *
+
+from klayout_plugin_utils.str_enum_compat import StrEnum
+
+
+class ReplaySpeed(StrEnum):
+    FAITHFUL = 'faithful'  # recorded gaps between events
+    SCALED = 'scaled'      # recorded gaps divided by speed_factor
+    FAST = 'fast'          # no think time, only min_gap_ms (and synchronization)
+
+
+@dataclass
+class ReplayTiming:
+    speed: ReplaySpeed = ReplaySpeed.FAST
+    speed_factor: float = 1.0
+    min_gap_ms: float = 0.0             # minimal gap the application gets between two steps
+    max_gap_ms: Optional[float] = None  # idle time compression: cap on any single gap
+    
+    def __post_init__(self):
+        if self.speed_factor <= 0:
+            raise ValueError(f"speed_factor must be positive, got {self.speed_factor}")
+    
+    def gap_ns(self, recorded_gap_ns: int) -> int:
+        """
+        Maps a recorded gap between two events to the gap used during replay
+        """
+        match self.speed:
+            case ReplaySpeed.FAITHFUL:
+                gap = float(recorded_gap_ns)
+            case ReplaySpeed.SCALED:
+                gap = recorded_gap_ns / self.speed_factor
+            case ReplaySpeed.FAST:
+                gap = 0.0
+        if self.max_gap_ms is not None:
+            gap = min(gap, self.max_gap_ms * 1_000_000)
+        return int(max(gap, self.min_gap_ms * 1_000_000))
+
+
+class ReplayClock:
+    """
+    Tracks recorded and replay time, computes how long to wait before the next step.
+    
+    Gaps are relative to the previous step, so time spent in synchronization
+    (waiting for widgets) counts towards the gap rather than adding to it.
+    Events without timestamp (0, recorded by older versions) have no gap.
+    """
+    
+    def __init__(self, timing: ReplayTiming):
+        self.timing = timing
+        self.reset()
+    
+    def reset(self):
+        self._last_recorded_ns: Optional[int] = None
+        self._last_replayed_ns: Optional[int] = None
+    
+    def delay_ns(self, timestamp: int) -> int:
+        if self._last_replayed_ns is None:
+            return 0
+        
+        recorded_gap = 0
+        if timestamp and self._last_recorded_ns:
+            recorded_gap = max(0, timestamp - self._last_recorded_ns)
+        
+        elapsed = time.monotonic_ns() - self._last_replayed_ns
+        return max(0, self.timing.gap_ns(recorded_gap) - elapsed)
+    
+    def mark(self, timestamp: int):
+        """
+        Called once the event with the given timestamp was replayed
+        """
+        if timestamp:
+            self._last_recorded_ns = timestamp
+        self._last_replayed_ns = time.monotonic_ns()
@@ -0,0 +1,111 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Replays a single recording inside a KLayout GUI process and writes the
+# outcome as JSON, used by suite_runner. Can also be started manually, e.g.:
+#
+#   QT_QPA_PLATFORM=offscreen klayout -nc -rx \
+#       -rd recording=test.kgaa -rd result=test.result.json \
+#       -r python/klayout_gui_automation/replay_worker.py
+#
+# Optional variables: speed (see ReplaySpeed), text_injection (see TextInjectionMode),
+#                     timeout_ms (synchronization timeout per step)
+#
+
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+import traceback
+from typing import *
+
+if __package__ in (None, ''):  # run as a script by KLayout
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import pya
+
+from klayout_gui_automation.event_replayer import EventReplayer, ReplayError
+from klayout_gui_automation.recording import read_recording
+from klayout_gui_automation.replay_synchronizer import ReplaySynchronizer
+from klayout_gui_automation.replay_timing import ReplaySpeed, ReplayTiming
+from klayout_gui_automation.text_injection import TextInjectionMode
+from klayout_gui_automation.widget_resolver import WidgetResolver
+
+
+def write_result(path: str, result: Dict[str, Any]):
+    # atomic, the runner treats a missing result file as a crashed worker
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def run_replay(recording: str,
+               speed: ReplaySpeed = ReplaySpeed.FAST,
+               text_injection: TextInjectionMode = TextInjectionMode.BULK,
+               timeout_ms: int = 30_000) -> Dict[str, Any]:
+    mw = pya.MainWindow.instance()
+    if mw is None:
+        return {'status': 'error', 'message': "KLayout runs without GUI (MainWindow missing), use -nc -rx without -b/-z"}
+    mw.show()
+    
+    resolver = WidgetResolver()
+    replayer = EventReplayer(resolver=resolver,
+                             synchronizer=ReplaySynchronizer(resolver, timeout_ms=timeout_ms),
+                             timing=ReplayTiming(speed=speed),
+                             text_injection=text_injection)
+    t0 = time.monotonic()
+    try:
+        statistics = replayer.replay(read_recording(recording))
+        status, message = 'passed', ''
+    except ReplayError as e:
+        statistics = replayer.statistics
+        status, message = 'failed', str(e)
+    except Exception as e:
+        statistics = replayer.statistics
+        status, message = 'error', ''.join(traceback.format_exception(e))
+    
+    return {
+        'status': status,
+        'message': message,
+        'duration': time.monotonic() - t0,
+        'steps': statistics.steps,
+        'unresolved': statistics.unresolved,
+        'statistics': str(statistics),
+    }
+
+
+def main(variables: Dict[str, Any]) -> int:
+    result = run_replay(
+        recording=variables['recording'],
+        speed=ReplaySpeed(variables.get('speed', ReplaySpeed.FAST.value)),
+        text_injection=TextInjectionMode(variables.get('text_injection', TextInjectionMode.BULK.value)),
+        timeout_ms=int(variables.get('timeout_ms', 30_000))
+    )
+    if 'result' in variables:
+        write_result(variables['result'], result)
+    else:
+        print(json.dumps(result))
+    return 0 if result['status'] == 'passed' else 1
+
+
+if 'recording' in globals():  # variables given by klayout -rd
+    exit_code = main(globals())
+    pya.Application.instance().exit(exit_code)
@@ -0,0 +1,300 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+from klayout_gui_automation.qwidget_helpers import is_qwidget
+from klayout_gui_automation.safe_attr_get import safe_attr_get
+
+
+HOT_SPOT_DEBUGGING = False
+
+SiblingKey = Tuple[str, str]  # (class_name, objectName)
+
+
+def sibling_key(widget: pya.QWidget) -> SiblingKey:
+    return (widget.__class__.__name__, safe_attr_get(widget, 'objectName') or '')
+
+
+class SiblingBucket:
+    """
+    Ordered list of the siblings sharing one (class_name, objectName) key
+    """
+    
+    def __init__(self):
+        self.widgets: List[pya.QWidget] = []
+        self._positions: Optional[Dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.widgets)
+
+    def append(self, widget: pya.QWidget):
+        if self._positions is not None:
+            self._positions[id(widget)] = len(self.widgets)
+        self.widgets.append(widget)
+
+    def remove(self, widget: pya.QWidget):
+        wid = id(widget)
+        for i, w in enumerate(self.widgets):
+            if id(w) == wid:
+                del self.widgets[i]
+                self._positions = None  # positions behind i shifted, rebuild lazily
+                return
+
+    def position(self, widget: pya.QWidget) -> Optional[int]:
+        if self._positions is None:
+            self._positions = {id(w): i for i, w in enumerate(self.widgets)}
+        return self._positions.get(id(widget))
+
+
+class SiblingTable:
+    """
+    Per-parent index: (class_name, objectName) -> ordered child list.
+    
+    parent is None for the table of top level widgets.
+    """
+    
+    def __init__(self, parent: Optional[pya.QWidget]):
+        self.parent = parent
+        self.buckets: Dict[SiblingKey, SiblingBucket] = {}
+        self.keys: Dict[int, Optional[SiblingKey]] = {}  # child id -> key, None for non-widget children
+        self.children: Dict[int, pya.QObject] = {}       # keep wrappers alive, so ids stay unique
+        self.pending = 0  # children added since the last lookup, at the end of parent.children()
+        self.misses: Dict[int, pya.QObject] = {}  # looked up, but not children (until the children change)
+        self.dirty = True
+
+    def insert(self, child: pya.QObject, key: Optional[SiblingKey]):
+        self.misses.clear()
+        cid = id(child)
+        self.keys[cid] = key
+        self.children[cid] = child
+        if key is not None:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = SiblingBucket()
+            bucket.append(child)
+
+    def remove(self, child: pya.QObject):
+        self.misses.clear()
+        cid = id(child)
+        if cid not in self.keys:
+            if self.pending:
+                self.pending -= 1  # added and removed again before it was classified
+            return
+        key = self.keys.pop(cid)
+        self.children.pop(cid, None)
+        if key is not None:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.remove(child)
+
+
+class SiblingIndex:
+    """
+    Replaces the O(number of siblings) scan used to compute WidgetPathEntry.child_index
+    by a lookup in per-parent tables.
+    
+    Tables are built once per parent and maintained from the structure events
+    (ChildAdded/ChildRemoved/ParentChange) forwarded via handle_structure_event():
+    added children are classified and appended on the next lookup, removed ones
+    are dropped immediately. Top level widgets are dropped when destroyed.
+    Lookups of widgets which are not children of a parent are cached until
+    the parent's children change.
+    """
+    
+    def __init__(self):
+        self._tables: Dict[int, SiblingTable] = {}
+        self._top_level = SiblingTable(parent=None)
+        # widget id -> (widget, [(signal, handler)]), the wrapper is kept alive, so the id stays unique
+        self._observed: Dict[int, Tuple[pya.QWidget, List[Tuple[Any, Callable]]]] = {}
+        self.top_level_listeners: List[Callable[[], None]] = []  # notified when a top level widget is dropped
+
+    def clear(self):
+        self._tables.clear()
+        self._top_level = SiblingTable(parent=None)
+        for widget, connections in self._observed.values():
+            self._disconnect(widget, connections)
+        self._observed.clear()
+
+    def table(self, parent: Optional[pya.QWidget]) -> SiblingTable:
+        if parent is None:
+            table = self._top_level
+        else:
+            table = self._tables.get(id(parent))
+            if table is None or table.parent._destroyed():
+                table = SiblingTable(parent=parent)
+                self._tables[id(parent)] = table
+        if table.dirty:
+            self._reconcile(table)
+        elif table.pending:
+            self._append_pending(table)
+        return table
+
+    def bucket(self, parent: Optional[pya.QWidget], key: SiblingKey) -> Sequence[pya.QWidget]:
+        bucket = self.table(parent).buckets.get(key)
+        return bucket.widgets if bucket is not None else ()
+
+    def child_index(self, widget: pya.QWidget, parent: Optional[pya.QWidget]) -> int:
+        """
+        1-based index of widget among the siblings of the same class and objectName
+        """
+        table = self.table(parent)
+        position = self._position(table, widget)
+        if position is None and id(widget) not in table.misses:
+            # the table missed an update (e.g. a new top level widget), rebuild once
+            table.dirty = True
+            self._reconcile(table)
+            position = self._position(table, widget)
+            if position is None and parent is not None:
+                # cached until the next ChildAdded/ChildRemoved, top level widgets have no such events
+                table.misses[id(widget)] = widget
+        if position is None:
+            # not a child of parent at all, same result as the sibling scan
+            bucket = table.buckets.get(sibling_key(widget))
+            return 1 + (len(bucket) if bucket is not None else 0)
+        return position + 1
+
+    def handle_structure_event(self, obj: pya.QObject, event: pya.QEvent):
+        match event.type():
+            case pya.QEvent.ChildAdded:
+                # NOTE: on ChildAdded the child is not yet fully constructed,
+                #       so it must not be wrapped or classified now.
+                #       Qt appends it to parent.children(), it is classified 
+                #       and appended on the next lookup (see _append_pending).
+                table = self._tables.get(id(obj))
+                if table is not None and not table.dirty:
+                    table.pending += 1
+            case pya.QEvent.ChildRemoved:
+                child = event.child()
+                if child is None:
+                    return
+                table = self._tables.get(id(obj))
+                if table is not None:
+                    table.remove(child)
+                self._tables.pop(id(child), None)
+            case pya.QEvent.ParentChange:
+                # obj may have become or ceased to be a top level widget
+                self._top_level.dirty = True
+
+    def _position(self, table: SiblingTable, widget: pya.QWidget) -> Optional[int]:
+        key = table.keys.get(id(widget))
+        if key is None:
+            return None
+        return table.buckets[key].position(widget)
+
+    def _classify(self, table: SiblingTable, child: pya.QObject) -> Optional[SiblingKey]:
+        key = sibling_key(child) if is_qwidget(child) else None
+        if key is not None:
+            self._observe(child)
+        return key
+
+    def _append_pending(self, table: SiblingTable):
+        try:
+            children = table.parent.children()
+        except Exception:
+            children = None
+        n = len(children) if children is not None else -1
+        if n != len(table.keys) + table.pending or \
+           any(id(c) in table.keys for c in children[n - table.pending:]):
+            # the new children are not (only) the last ones, rebuild
+            if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+                debug(f"SiblingIndex._append_pending: inconsistent table for {table.parent}")
+            table.dirty = True
+            self._reconcile(table)
+            return
+        
+        for child in children[n - table.pending:]:
+            table.insert(child, self._classify(table, child))
+        table.pending = 0
+
+    def _reconcile(self, table: SiblingTable):
+        if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+            debug(f"SiblingIndex._reconcile: rebuilding table for {table.parent}")
+        
+        try:
+            if table.parent is None:
+                children = pya.QApplication.topLevelWidgets()
+            else:
+                children = table.parent.children()
+        except Exception:
+            # fallback to top-level if something odd happens (same as the sibling scan)
+            children = pya.QApplication.topLevelWidgets()
+        
+        keys: Dict[int, Optional[SiblingKey]] = {}
+        wrappers: Dict[int, pya.QObject] = {}
+        buckets: Dict[SiblingKey, SiblingBucket] = {}
+        for child in children:
+            cid = id(child)
+            if cid in table.keys:  # already classified, no need to query Qt again
+                key = table.keys[cid]
+            else:
+                key = self._classify(table, child)
+            keys[cid] = key
+            wrappers[cid] = child
+            if key is not None:
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = SiblingBucket()
+                bucket.append(child)
+        
+        table.keys = keys
+        table.children = wrappers
+        table.buckets = buckets
+        table.pending = 0
+        table.misses.clear()
+        table.dirty = False
+
+    def _observe(self, widget: pya.QWidget):
+        wid = id(widget)
+        if wid in self._observed:
+            return
+        
+        def on_object_name_changed(*args):
+            # the sibling key changed, re-classify the widget within its parent's table
+            for table in (self._top_level, *self._tables.values()):
+                if wid in table.keys:
+                    table.keys.pop(wid)
+                    table.dirty = True
+        
+        def on_destroyed(*args):
+            observed = self._observed.pop(wid, None)
+            if observed is not None:
+                self._disconnect(*observed)
+            # top level widgets get no ChildRemoved, drop them from the table,
+            # so the following siblings of the same key move up
+            child = self._top_level.children.get(wid)
+            if child is not None:
+                self._top_level.remove(child)
+                for listener in self.top_level_listeners:
+                    listener()
+        
+        connections = [(widget.objectNameChanged, on_object_name_changed), (widget.destroyed, on_destroyed)]
+        for signal, handler in connections:
+            signal.connect(handler)
+        self._observed[wid] = (widget, connections)
+
+    @staticmethod
+    def _disconnect(widget: pya.QWidget, connections: List[Tuple[Any, Callable]]):
+        if widget._destroyed():
+            return  # Qt dropped the connections already
+        for signal, handler in connections:
+            signal.disconnect(handler)
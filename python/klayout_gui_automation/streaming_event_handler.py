@@ -0,0 +1,248 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Streams recorded events live to external consumers (e.g. a tool building
+# test scripts on the fly), connected to a Unix domain socket.
+#
+# Wire format: line delimited JSON, one line per batch
+#
+#   {"seq": 17, "dropped": 0, "events": [<event_to_json>, ...]}
+#
+# where dropped is the number of events dropped since the previous batch.
+#
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+import json
+import os
+import socket
+import stat
+import threading
+import time
+import traceback
+from typing import *
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import Event, QtEventType
+from klayout_gui_automation.event_codec import event_to_json
+from klayout_gui_automation.event_handler import EventHandler
+
+
+STREAM_SOCKET_ENV = 'KLAYOUT_GUI_AUTOMATION_STREAM'
+
+
+@dataclass
+class StreamStatistics:
+    sent_events: int = 0
+    sent_batches: int = 0
+    coalesced_events: int = 0  # MouseMoves replaced by a later one while waiting
+    dropped_events: int = 0    # outbox full
+    
+    def __str__(self) -> str:
+        return f"sent {self.sent_events} events in {self.sent_batches} batches, "\
+               f"coalesced {self.coalesced_events}, dropped {self.dropped_events}"
+
+
+def is_mouse_move(event: Event) -> bool:
+    return event.kind == Event.Kind.MOUSE_EVENT and event.event.type == QtEventType.MouseMove
+
+
+class StreamingEventHandler(EventHandler):
+    """
+    handle_event() never blocks and does no I/O: events go into a bounded outbox,
+    a sender thread serializes them and writes one batch per wake-up (gathering 
+    events for batch_interval seconds, about one frame) to all connected consumers.
+    
+    Backpressure, while events are waiting to be sent:
+        - a MouseMove replaces a waiting MouseMove on the same target (coalescing)
+        - if the outbox is full, MouseMoves are dropped first, other events only
+          if there is no MouseMove left to drop
+    A consumer which does not accept a batch within send_timeout is disconnected.
+    Batches gathered while no consumer is connected are dropped, they are counted
+    in the statistics and in the 'dropped' field of the next batch sent.
+    
+    start() creates the listening socket, call it before consumers connect
+    (handle_event() starts the handler as well, if that was missed).
+    """
+    
+    def __init__(self,
+                 socket_path: str,
+                 max_pending: int = 10_000,
+                 batch_interval: float = 0.016,
+                 send_timeout: float = 2.0):
+        self.socket_path = socket_path
+        self.max_pending = max_pending
+        self.batch_interval = batch_interval
+        self.send_timeout = send_timeout
+        self.statistics = StreamStatistics()
+        
+        self._outbox: Deque[Event] = deque()
+        self._dropped_since_batch = 0
+        self._sending = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._listener: Optional[socket.socket] = None
+        self._consumers: List[socket.socket] = []
+    
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            try:
+                if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                    os.unlink(self.socket_path)  # stale socket of a previous process
+            except FileNotFoundError:
+                pass
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.socket_path)
+            listener.listen(4)
+            listener.setblocking(False)
+            self._listener = listener
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='StreamingEventHandler', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join()
+        with self._condition:
+            self._thread = None
+        for c in self._consumers:
+            c.close()
+        self._consumers = []
+        self._listener.close()
+        self._listener = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        if Debugging.DEBUG:
+            debug(f"StreamingEventHandler.stop: {self.statistics}")
+    
+    def handle_event(self, event: Event):
+        if self._thread is None:
+            self.start()
+        
+        with self._condition:
+            outbox = self._outbox
+            if outbox and is_mouse_move(event):
+                last = outbox[-1]
+                if is_mouse_move(last) and last.target is event.target and \
+                   last.event.buttons == event.event.buttons and last.event.modifiers == event.event.modifiers:
+                    outbox[-1] = event
+                    self.statistics.coalesced_events += 1
+                    return
+            
+            if len(outbox) >= self.max_pending:
+                if is_mouse_move(event) or not self._drop_oldest_mouse_move():
+                    self._dropped_since_batch += 1
+                    self.statistics.dropped_events += 1
+                    return
+            
+            outbox.append(event)
+            if len(outbox) == 1:
+                self._condition.notify_all()
+    
+    def flush(self):
+        # waits (bounded) until everything handled so far was sent
+        with self._condition:
+            if self._thread is None:
+                return
+            self._condition.wait_for(lambda: not self._outbox and not self._sending, 
+                                     timeout=self.send_timeout)
+    
+    def _drop_oldest_mouse_move(self) -> bool:
+        # NOTE: called with the lock held
+        for i, e in enumerate(self._outbox):
+            if is_mouse_move(e):
+                del self._outbox[i]
+                self._dropped_since_batch += 1
+                self.statistics.dropped_events += 1
+                return True
+        return False
+    
+    def _accept_consumers(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except (BlockingIOError, OSError):
+                return
+            conn.setblocking(True)
+            conn.settimeout(self.send_timeout)
+            self._consumers.append(conn)
+            if Debugging.DEBUG:
+                debug(f"StreamingEventHandler: consumer connected ({len(self._consumers)} total)")
+    
+    def _send(self, data: bytes):
+        for c in list(self._consumers):
+            try:
+                c.sendall(data)
+            except OSError:  # incl. timeout, the consumer is too slow or gone
+                c.close()
+                self._consumers.remove(c)
+    
+    def _run(self):
+        seq = 0
+        unsent = 0  # events dropped since the last batch sent
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._outbox or self._stopping)
+                if not self._outbox and self._stopping:
+                    return
+                if not self._stopping:
+                    # gather the events of (about) one GUI frame into this batch
+                    self._condition.wait_for(lambda: self._stopping, timeout=self.batch_interval)
+                batch = list(self._outbox)
+                self._outbox.clear()
+                unsent += self._dropped_since_batch
+                self._dropped_since_batch = 0
+                self._sending = True
+            
+            try:
+                self._accept_consumers()
+                if not self._consumers:
+                    unsent += len(batch)
+                    with self._condition:
+                        self.statistics.dropped_events += len(batch)
+                else:
+                    seq += 1
+                    line = json.dumps({
+                        'seq': seq,
+                        'dropped': unsent,
+                        'events': [event_to_json(e) for e in batch],
+                    }).encode('utf-8') + b'\n'
+                    self._send(line)
+                    unsent = 0
+                    self.statistics.sent_events += len(batch)
+                    self.statistics.sent_batches += 1
+            except Exception as e:
+                print("StreamingEventHandler: sender caught an exception", e)
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
@@ -0,0 +1,353 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Runs recordings as a regression suite, sharded across a pool of 
+# headless KLayout GUI processes (QT_QPA_PLATFORM=offscreen), one 
+# process per recording (see replay_worker). Runs outside of KLayout:
+#
+#   python -m klayout_gui_automation.suite_runner tests/recordings \
+#       --jobs 8 --timeout 300 --retries 1 --junit results.xml
+#
+# A worker which exits without writing a result (crash, killed by a signal)
+# is retried, failed replays and timeouts are not.
+#
+# Suite trees (*.kgsuite, see recording.py) and, with --fork, the given
+# recordings (common prefixes are detected) run in a single KLayout process
+# instead, which replays shared prefixes once and forks per test (see fork_replay).
+#
+
+from __future__ import annotations
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from enum import Enum
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import *
+import xml.etree.ElementTree as ET
+
+if __package__ in (None, ''):  # run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from klayout_gui_automation.recording import SUITE_SUFFIX, find_recordings, load_suite, suite_tests
+
+
+REPLAY_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'replay_worker.py')
+FORK_REPLAY_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fork_replay.py')
+
+
+class TestStatus(str, Enum):  # NOTE: stdlib only, klayout_plugin_utils lives in KLayout's package tree
+    PASSED = 'passed'
+    FAILED = 'failed'    # the replay failed (e.g. unresolved widget, synchronization timeout)
+    ERROR = 'error'      # unexpected exception in the replay
+    TIMEOUT = 'timeout'  # the test exceeded its time budget and was killed
+    CRASHED = 'crashed'  # the worker exited without result, also after all retries
+
+
+@dataclass
+class TestResult:
+    name: str
+    recording: str
+    status: TestStatus
+    message: str = ''
+    duration: float = 0.0   # wall time of the last attempt, incl. KLayout startup
+    attempts: int = 1
+    output: str = ''        # tail of stdout/stderr of the last attempt
+
+
+@dataclass
+class SuiteResult:
+    tests: List[TestResult] = field(default_factory=list)
+    duration: float = 0.0
+    
+    def count(self, status: TestStatus) -> int:
+        return sum(1 for t in self.tests if t.status == status)
+    
+    @property
+    def passed(self) -> bool:
+        return all(t.status == TestStatus.PASSED for t in self.tests)
+    
+    def __str__(self) -> str:
+        counts = ', '.join(f"{s.value}={self.count(s)}" for s in TestStatus if self.count(s))
+        return f"{len(self.tests)} tests in {self.duration:.1f}s: {counts or 'none'}"
+
+
+@dataclass
+class SuiteRunnerConfig:
+    klayout: str = 'klayout'
+    jobs: int = field(default_factory=lambda: os.cpu_count() or 1)
+    timeout: float = 300.0   # per test, seconds
+    retries: int = 1         # additional attempts for crashed workers
+    speed: str = 'fast'
+    text_injection: str = 'bulk'
+    step_timeout_ms: int = 30_000
+    output_tail: int = 4000  # characters of worker output kept per test
+
+
+class SuiteRunner:
+    def __init__(self, config: SuiteRunnerConfig):
+        self.config = config
+    
+    @staticmethod
+    def test_name(recording: str, root: Optional[str]) -> str:
+        name = os.path.relpath(recording, root) if root else os.path.basename(recording)
+        return os.path.splitext(name)[0].replace(os.sep, '.')
+    
+    def command(self, recording: str, result_path: str) -> List[str]:
+        return [
+            self.config.klayout, '-nc', '-rx',
+            '-rd', f"recording={os.path.abspath(recording)}",
+            '-rd', f"result={result_path}",
+            '-rd', f"speed={self.config.speed}",
+            '-rd', f"text_injection={self.config.text_injection}",
+            '-rd', f"timeout_ms={self.config.step_timeout_ms}",
+            '-r', REPLAY_WORKER_SCRIPT,
+        ]
+    
+    def environment(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+        return env
+    
+    def run_attempt(self, name: str, recording: str) -> TestResult:
+        with tempfile.TemporaryDirectory(prefix='kga_') as tmp:
+            result_path = os.path.join(tmp, 'result.json')
+            t0 = time.monotonic()
+            proc = subprocess.Popen(self.command(recording, result_path), 
+                                    env=self.environment(), cwd=tmp,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
+                                    stdin=subprocess.DEVNULL, text=True, errors='replace')
+            try:
+                output, _ = proc.communicate(timeout=self.config.timeout)
+                timed_out = False
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                output, _ = proc.communicate()
+                timed_out = True
+            duration = time.monotonic() - t0
+            output = (output or '')[-self.config.output_tail:]
+            
+            if timed_out:
+                return TestResult(name=name, recording=recording, status=TestStatus.TIMEOUT,
+                                  message=f"killed after {self.config.timeout}s", 
+                                  duration=duration, output=output)
+            
+            if not os.path.exists(result_path):
+                return TestResult(name=name, recording=recording, status=TestStatus.CRASHED,
+                                  message=f"worker exited with code {proc.returncode} without result",
+                                  duration=duration, output=output)
+            
+            with open(result_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return TestResult(name=name, recording=recording, status=TestStatus(data['status']),
+                              message=data.get('message', ''), duration=duration, output=output)
+    
+    def run_test(self, name: str, recording: str) -> TestResult:
+        attempts = 0
+        while True:
+            attempts += 1
+            result = self.run_attempt(name, recording)
+            result.attempts = attempts
+            if result.status != TestStatus.CRASHED or attempts > self.config.retries:
+                return result
+    
+    def run(self, 
+            recordings: Sequence[str], 
+            root: Optional[str] = None,
+            progress: Optional[Callable[[TestResult], None]] = None) -> SuiteResult:
+        # longest (largest) recordings first, so the tail of the schedule is made of short tests
+        ordered = sorted(recordings, key=lambda r: os.path.getsize(r), reverse=True)
+        
+        suite = SuiteResult()
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.config.jobs)) as pool:
+            futures = [pool.submit(self.run_test, self.test_name(r, root), r) for r in ordered]
+            for future in as_completed(futures):
+                result = future.result()
+                suite.tests.append(result)
+                if progress is not None:
+                    progress(result)
+        suite.duration = time.monotonic() - t0
+        suite.tests.sort(key=lambda t: t.name)
+        return suite
+    
+    def fork_command(self, suite_path: str, results_dir: str) -> List[str]:
+        return [
+            self.config.klayout, '-nc', '-rx',
+            '-rd', f"suite={os.path.abspath(suite_path)}",
+            '-rd', f"results={results_dir}",
+            '-rd', f"jobs={self.config.jobs}",
+            '-rd', f"timeout={self.config.timeout}",
+            '-rd', f"retries={self.config.retries}",
+            '-r', FORK_REPLAY_SCRIPT,
+        ]
+    
+    def run_forked(self, 
+                   suite_path: str,
+                   progress: Optional[Callable[[TestResult], None]] = None) -> SuiteResult:
+        tests = suite_tests(load_suite(suite_path))
+        
+        suite = SuiteResult()
+        t0 = time.monotonic()
+        with tempfile.TemporaryDirectory(prefix='kga_') as tmp:
+            results_dir = os.path.join(tmp, 'results')
+            proc = subprocess.Popen(self.fork_command(suite_path, results_dir),
+                                    env=self.environment(), cwd=tmp,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    stdin=subprocess.DEVNULL, text=True, errors='replace')
+            try:
+                # per test timeouts are enforced in the forked processes, this is a safety net
+                output, _ = proc.communicate(timeout=self.config.timeout * max(1, len(tests)))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                output, _ = proc.communicate()
+            output = (output or '')[-self.config.output_tail:]
+            
+            for test in tests:
+                result_path = os.path.join(results_dir, f"{test['id']}.json")
+                if os.path.exists(result_path):
+                    with open(result_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    result = TestResult(name=test['test_name'], recording=test.get('recording', ''),
+                                        status=TestStatus(data['status']), message=data.get('message', ''),
+                                        duration=data.get('duration', 0.0), attempts=data.get('attempts', 1))
+                    if result.status != TestStatus.PASSED:
+                        result.output = output
+                else:
+                    result = TestResult(name=test['test_name'], recording=test.get('recording', ''),
+                                        status=TestStatus.CRASHED, 
+                                        message=f"fork replay exited with code {proc.returncode} without result",
+                                        output=output)
+                suite.tests.append(result)
+                if progress is not None:
+                    progress(result)
+        suite.duration = time.monotonic() - t0
+        return suite
+    
+    def run_recordings_forked(self,
+                              recordings: Sequence[str], 
+                              root: Optional[str] = None,
+                              progress: Optional[Callable[[TestResult], None]] = None) -> SuiteResult:
+        tree = {
+            'name': 'suite',
+            'detect_prefixes': True,
+            'children': [{'name': self.test_name(r, root), 'recording': os.path.abspath(r)} for r in recordings],
+        }
+        with tempfile.TemporaryDirectory(prefix='kga_') as tmp:
+            suite_path = os.path.join(tmp, f"suite{SUITE_SUFFIX}")
+            with open(suite_path, 'w', encoding='utf-8') as f:
+                json.dump(tree, f)
+            return self.run_forked(suite_path, progress)
+
+
+def write_junit_xml(suite: SuiteResult, path: str, suite_name: str = 'klayout_gui_automation'):
+    failures = suite.count(TestStatus.FAILED)
+    errors = len(suite.tests) - suite.count(TestStatus.PASSED) - failures
+    
+    testsuite = ET.Element('testsuite', {
+        'name': suite_name,
+        'tests': str(len(suite.tests)),
+        'failures': str(failures),
+        'errors': str(errors),
+        'time': f"{suite.duration:.3f}",
+    })
+    for t in suite.tests:
+        testcase = ET.SubElement(testsuite, 'testcase', {
+            'classname': suite_name,
+            'name': t.name,
+            'file': t.recording,
+            'time': f"{t.duration:.3f}",
+        })
+        if t.attempts > 1:
+            ET.SubElement(ET.SubElement(testcase, 'properties'), 'property', 
+                          {'name': 'attempts', 'value': str(t.attempts)})
+        match t.status:
+            case TestStatus.PASSED:
+                pass
+            case TestStatus.FAILED:
+                ET.SubElement(testcase, 'failure', {'message': t.message.splitlines()[0] if t.message else ''}).text = t.message
+            case _:
+                ET.SubElement(testcase, 'error', {'type': t.status.value, 'message': t.message}).text = t.message
+        if t.output and t.status != TestStatus.PASSED:
+            ET.SubElement(testcase, 'system-out').text = t.output
+    
+    tree = ET.ElementTree(ET.Element('testsuites'))
+    tree.getroot().append(testsuite)
+    ET.indent(tree)
+    tree.write(path, encoding='utf-8', xml_declaration=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = SuiteRunnerConfig()
+    parser = argparse.ArgumentParser(description="Replays recordings in parallel headless KLayout processes")
+    parser.add_argument('paths', nargs='+', help=f"recordings, suites (*{SUITE_SUFFIX}) or directories containing recordings")
+    parser.add_argument('--fork', action='store_true', 
+                        help="replay common prefixes of the recordings once, fork per test (POSIX only)")
+    parser.add_argument('--klayout', default=defaults.klayout, help="KLayout executable")
+    parser.add_argument('-j', '--jobs', type=int, default=defaults.jobs, help="parallel KLayout processes")
+    parser.add_argument('--timeout', type=float, default=defaults.timeout, help="per test timeout in seconds")
+    parser.add_argument('--retries', type=int, default=defaults.retries, help="retries of crashed workers")
+    parser.add_argument('--speed', default=defaults.speed, help="replay timing (faithful, scaled, fast)")
+    parser.add_argument('--text-injection', default=defaults.text_injection, help="keys or bulk")
+    parser.add_argument('--step-timeout-ms', type=int, default=defaults.step_timeout_ms, 
+                        help="synchronization timeout per replayed event")
+    parser.add_argument('--junit', help="write JUnit XML results to this file")
+    args = parser.parse_args(argv)
+    
+    suites = [p for p in args.paths if p.endswith(SUITE_SUFFIX)]
+    recordings = find_recordings(p for p in args.paths if not p.endswith(SUITE_SUFFIX))
+    if not recordings and not suites:
+        print("suite_runner: no recordings found", file=sys.stderr)
+        return 2
+    root = args.paths[0] if len(args.paths) == 1 and os.path.isdir(args.paths[0]) else None
+    
+    runner = SuiteRunner(SuiteRunnerConfig(
+        klayout=args.klayout,
+        jobs=args.jobs,
+        timeout=args.timeout,
+        retries=args.retries,
+        speed=args.speed,
+        text_injection=args.text_injection,
+        step_timeout_ms=args.step_timeout_ms,
+    ))
+    
+    def progress(result: TestResult):
+        retried = f" (attempts: {result.attempts})" if result.attempts > 1 else ''
+        print(f"[{result.status.value:>7}] {result.name} {result.duration:.1f}s{retried}", flush=True)
+    
+    suite = SuiteResult()
+    t0 = time.monotonic()
+    if recordings:
+        run = runner.run_recordings_forked if args.fork else runner.run
+        suite.tests.extend(run(recordings, root=root, progress=progress).tests)
+    for suite_path in suites:
+        suite.tests.extend(runner.run_forked(suite_path, progress=progress).tests)
+    suite.duration = time.monotonic() - t0
+    print(suite)
+    if args.junit:
+        write_junit_xml(suite, args.junit)
+    return 0 if suite.passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+from klayout_plugin_utils.str_enum_compat import StrEnum
+
+from klayout_gui_automation.qwidget_helpers import is_qlineedit, is_qspinbox, is_qtextedit
+
+
+class TextInjectionMode(StrEnum):
+    KEYS = 'keys'  # one synthesized KeyPress/KeyRelease pair per character
+    BULK = 'bulk'  # class specific setters where this is equivalent, keys otherwise
+
+
+@dataclass
+class TextInjectionStatistics:
+    bulk: int = 0
+    keys: int = 0
+
+
+_KEY_HANDLER_NAMES = ('event', 'keyPressEvent', 'keyReleaseEvent', 'inputMethodEvent')
+
+
+def has_python_key_handlers(widget: pya.QWidget) -> bool:
+    """
+    True if the widget's class is implemented in Python and reimplements key handling
+    """
+    for cls in type(widget).__mro__:
+        module = getattr(cls, '__module__', '') or ''
+        # the wrapped Qt classes, not Python packages like klayout_gui_automation or other plugins
+        if module == 'pya' or module.split('.')[0] == 'klayout' or cls is object:
+            break
+        if any(name in vars(cls) for name in _KEY_HANDLER_NAMES):
+            return True
+    return False
+
+
+class TextInjector:
+    """
+    Replays TypeEvents, using a single setter call instead of 
+    two synthesized key events per character where possible.
+    
+    Spin boxes get the text inserted into their line edit at the cursor (like typing, 
+    combined with the text already there), validated as a whole by the spin box's validator.
+    
+    Widgets reacting to individual keystrokes fall back to key events:
+        - line edits with validator, completer or input mask
+        - read only widgets
+        - widget classes reimplementing key handling in Python
+        - text which is not plain printable text
+    """
+    
+    def __init__(self, send_keys: Callable[[pya.QWidget, str], None]):
+        self.send_keys = send_keys
+        self.statistics = TextInjectionStatistics()
+    
+    def inject(self, widget: pya.QWidget, text: str, mode: TextInjectionMode = TextInjectionMode.BULK):
+        if mode == TextInjectionMode.BULK and self.try_bulk(widget, text):
+            self.statistics.bulk += 1
+            return
+        self.statistics.keys += 1
+        self.send_keys(widget, text)
+    
+    def try_bulk(self, widget: pya.QWidget, text: str) -> bool:
+        if not text or not text.isprintable() or has_python_key_handlers(widget):
+            return False
+        
+        if is_qlineedit(widget):
+            if widget.readOnly or widget.validator is not None or \
+               widget.completer is not None or widget.inputMask:
+                return False
+            widget.insert(text)  # at the cursor, replacing the selection, like typing
+            return True
+        
+        if is_qtextedit(widget):
+            if widget.readOnly:
+                return False
+            widget.insertPlainText(text)
+            return True
+        
+        if is_qspinbox(widget):
+            if widget.readOnly:
+                return False
+            line_edit = self.spin_box_line_edit(widget)
+            if line_edit is None:
+                return False
+            line_edit.insert(text)  # rejected as a whole, if the spin box's validator says Invalid
+            return True
+        
+        if Debugging.DEBUG:
+            debug(f"TextInjector.try_bulk: no bulk setter for {type(widget).__name__}, falling back to key events")
+        return False
+    
+    @staticmethod
+    def spin_box_line_edit(spin_box: pya.QWidget) -> Optional[pya.QWidget]:
+        # QAbstractSpinBox.lineEdit() is protected, the editor is its QLineEdit child
+        for child in spin_box.children():
+            if child.isWidgetType() and is_qlineedit(child):
+                return child
+        return None
@@ -0,0 +1,151 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+#
+# Simplification of mouse trajectories (sequences of MouseMoves, e.g. drags
+# on the layout canvas): time/distance decimation followed by Ramer-Douglas-Peucker.
+# The simplified polyline stays within the tolerance (pixels) of the recorded one.
+#
+
+from __future__ import annotations
+from dataclasses import dataclass
+import math
+from typing import *
+
+from klayout_plugin_utils.str_enum_compat import StrEnum
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, simplification falls back to plain Python
+    np = None
+
+
+class TrajectoryMode(StrEnum):
+    MERGE = 'merge'      # consecutive moves are merged into one (only the end point is kept)
+    FULL = 'full'        # every move is kept
+    SAMPLED = 'sampled'  # moves are buffered, decimated and simplified when the gesture ends
+
+
+@dataclass
+class TrajectoryOptions:
+    mode: TrajectoryMode = TrajectoryMode.MERGE
+    tolerance: float = 1.0        # RDP tolerance in pixels, 0 disables RDP
+    min_distance: float = 0.0     # decimation: minimal distance between kept points (pixels)
+    min_interval_ms: float = 0.0  # decimation: minimal time between kept points
+    max_points: int = 100_000     # buffered points before a trajectory is simplified early
+
+
+Point2D = Tuple[float, float]
+
+
+def decimate(points: Sequence[Point2D], 
+             timestamps: Sequence[int],
+             min_distance: float = 0.0, 
+             min_interval_ms: float = 0.0) -> List[int]:
+    """
+    Indices of the points kept, first and last are always kept
+    """
+    n = len(points)
+    if n <= 2 or (min_distance <= 0 and min_interval_ms <= 0):
+        return list(range(n))
+    
+    min_distance_sq = min_distance * min_distance
+    min_interval_ns = min_interval_ms * 1_000_000
+    kept = [0]
+    lx, ly = points[0]
+    lt = timestamps[0]
+    for i in range(1, n - 1):
+        x, y = points[i]
+        if (x - lx) ** 2 + (y - ly) ** 2 >= min_distance_sq and timestamps[i] - lt >= min_interval_ns:
+            kept.append(i)
+            lx, ly, lt = x, y, timestamps[i]
+    kept.append(n - 1)
+    return kept
+
+
+def _rdp_numpy(points: Sequence[Point2D], tolerance: float) -> List[int]:
+    pts = np.asarray(points, dtype=np.float64)
+    n = len(pts)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = pts[first]
+        d = pts[last] - a
+        inner = pts[first + 1:last] - a
+        length = math.hypot(d[0], d[1])
+        if length == 0.0:
+            dist = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            dist = np.abs(inner[:, 0] * d[1] - inner[:, 1] * d[0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            index = first + 1 + i
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep).tolist()
+
+
+def _rdp_python(points: Sequence[Point2D], tolerance: float) -> List[int]:
+    n = len(points)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        ax, ay = points[first]
+        dx = points[last][0] - ax
+        dy = points[last][1] - ay
+        length = math.hypot(dx, dy)
+        max_dist, index = -1.0, -1
+        for i in range(first + 1, last):
+            px = points[i][0] - ax
+            py = points[i][1] - ay
+            dist = math.hypot(px, py) if length == 0.0 else abs(px * dy - py * dx) / length
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [i for i, k in enumerate(keep) if k]
+
+
+def rdp(points: Sequence[Point2D], tolerance: float) -> List[int]:
+    """
+    Ramer-Douglas-Peucker, indices of the points kept, first and last are always kept
+    """
+    if len(points) <= 2 or tolerance <= 0:
+        return list(range(len(points)))
+    if np is not None:
+        return _rdp_numpy(points, tolerance)
+    return _rdp_python(points, tolerance)
+
+
+def simplify(points: Sequence[Point2D], timestamps: Sequence[int], options: TrajectoryOptions) -> List[int]:
+    kept = decimate(points, timestamps, options.min_distance, options.min_interval_ms)
+    if len(kept) <= 2:
+        return kept
+    decimated = [points[i] for i in kept]
+    return [kept[i] for i in rdp(decimated, options.tolerance)]
@@ -0,0 +1,327 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+#
+# Semantic capture of LayoutView state changes (active cellview, current cell,
+# viewport, layer visibility) from the pya signals of the current view.
+# Replay applies them through the pya API instead of reproducing the clicks
+# on the layer panel, the cell hierarchy or the canvas: while the stage is
+# active, the EventRecorder does not record the input to those panels and
+# the wheel events on the canvas (see ViewStateRecorder.suppress_low_level).
+#
+
+from __future__ import annotations
+import time
+import traceback
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.event import (
+    Event, ActiveCellViewEvent, CurrentCellEvent, ViewportEvent, LayerVisibilityEvent
+)
+from klayout_gui_automation.event_handler import EventHandler
+from klayout_gui_automation.event_recorder import EventFilterHandler, EventRecorder
+from klayout_gui_automation.gesture_recognizer import is_canvas_target
+from klayout_gui_automation.widget_path import WidgetPath
+
+
+VIEW_STATE_ENV = 'KLAYOUT_GUI_AUTOMATION_VIEW_STATE'
+
+VIEW_STATE_EVENT_KINDS = frozenset((
+    Event.Kind.ACTIVE_CELLVIEW_EVENT,
+    Event.Kind.CURRENT_CELL_EVENT,
+    Event.Kind.VIEWPORT_EVENT,
+    Event.Kind.LAYER_VISIBILITY_EVENT,
+))
+
+
+# objectNames of KLayout's layer panel and cell hierarchy panel
+SUPPRESSED_PANEL_NAMES = frozenset(('lcp', 'hcp'))
+
+# input event types recorded by the EventRecorder, which the suppression applies to
+SUPPRESSED_EVENT_TYPES = (
+    pya.QEvent.MouseButtonPress, pya.QEvent.MouseButtonRelease, pya.QEvent.MouseButtonDblClick,
+    pya.QEvent.MouseMove, pya.QEvent.KeyPress, pya.QEvent.KeyRelease, pya.QEvent.Wheel,
+)
+
+LayerKey = Tuple[str, str, str]  # (group path, name, source)
+
+
+def layer_key(it: pya.LayerPropertiesIterator) -> LayerKey:
+    # the same source may appear in several groups, so the groups are part of the key
+    groups = []
+    p = it.parent()
+    while not p.is_null():
+        groups.append(p.current().name)
+        p = p.parent()
+    lp = it.current()
+    return ('/'.join(reversed(groups)), lp.name, lp.source)
+
+
+def layer_visibility(view: pya.LayoutView) -> Dict[LayerKey, bool]:
+    visibility = {}
+    it = view.begin_layers()
+    while not it.at_end():
+        visibility[layer_key(it)] = it.current().visible
+        it.next()
+    return visibility
+
+
+def current_cell_names(view: pya.LayoutView) -> List[str]:
+    return [view.cellview(i).cell_name for i in range(view.cellviews())]
+
+
+class ViewStateRecorder:
+    """
+    Optional recorder stage next to the EventRecorder, emitting view state events
+    into the same handler. Only changes are emitted, compared to the state seen
+    when recording started (or the current view changed).
+    
+    Viewport changes come in bursts (e.g. while panning), they are emitted once
+    the viewport was unchanged for viewport_settle_ms.
+    
+    With an event_recorder and suppress_low_level, the input to the panels in
+    suppressed_panel_names and wheel events on the canvas are not recorded while
+    this stage is active, the view state events replace them. NOTE: this includes
+    the current layer selection in the layer panel, which is not a view state event.
+    """
+    
+    def __init__(self, 
+                 event_handler: EventHandler, 
+                 event_recorder: Optional[EventRecorder] = None,
+                 viewport_settle_ms: int = 100,
+                 suppress_low_level: bool = True,
+                 suppressed_panel_names: FrozenSet[str] = SUPPRESSED_PANEL_NAMES):
+        self._event_handler = event_handler
+        self._event_recorder = event_recorder
+        self.suppress_low_level = suppress_low_level
+        self.suppressed_panel_names = suppressed_panel_names
+        self._original_handlers: Dict[pya.QEvent.Type, EventFilterHandler] = {}
+        self._suppressed_paths: Dict[WidgetPath, bool] = {}  # verdict per (interned) path
+        self._recording = False
+        self._view: Optional[pya.LayoutView] = None
+        self._target: Optional[WidgetPath] = None
+        self._connections: List[Tuple[Any, Callable]] = []
+        
+        self._active_cellview_index = -1
+        self._cell_names: List[str] = []
+        self._layer_visibility: Dict[LayerKey, bool] = {}
+        self._viewport: Optional[Tuple[float, float, float, float]] = None
+        self._viewport_changed_at = 0
+        
+        self._viewport_timer = pya.QTimer()
+        self._viewport_timer.singleShot = True
+        self._viewport_timer.interval = viewport_settle_ms
+        self._viewport_timer.timeout.connect(self._emit_viewport)
+    
+    def start(self):
+        if self._recording:
+            return
+        self._recording = True
+        
+        mw = pya.MainWindow.instance()
+        self._target = WidgetPath.for_widget(mw)  # view state events target the main window
+        mw.on_current_view_changed += self._on_current_view_changed
+        self._attach(pya.LayoutView.current())
+        
+        if self._event_recorder is not None and self.suppress_low_level:
+            self._install_suppression()
+    
+    def stop(self):
+        if not self._recording:
+            return
+        self._recording = False
+        
+        mw = pya.MainWindow.instance()
+        mw.on_current_view_changed -= self._on_current_view_changed
+        self._uninstall_suppression()
+        self._emit_viewport()
+        self._detach()
+    
+    def _install_suppression(self):
+        recorder = self._event_recorder
+        for event_type in SUPPRESSED_EVENT_TYPES:
+            handler = recorder.event_type_handler(event_type)
+            if handler is None:
+                continue
+            self._original_handlers[event_type] = handler
+            
+            def suppressing_handler(widget: pya.QWidget, event: pya.QEvent, handler=handler) -> bool:
+                if self.is_suppressed(widget, event):
+                    return False
+                return handler(widget, event)
+            
+            recorder.set_event_type_handler(event_type, suppressing_handler)
+    
+    def _uninstall_suppression(self):
+        for event_type, handler in self._original_handlers.items():
+            self._event_recorder.set_event_type_handler(event_type, handler)
+        self._original_handlers = {}
+        self._suppressed_paths.clear()
+    
+    def is_suppressed(self, widget: pya.QWidget, event: pya.QEvent) -> bool:
+        path = self._event_recorder.widget_path_cache.get(widget)
+        if event.type() == pya.QEvent.Wheel and is_canvas_target(path):
+            return True  # zooming, see ViewportEvent
+        verdict = self._suppressed_paths.get(path)
+        if verdict is None:
+            verdict = any(e.widget_name in self.suppressed_panel_names for e in path.entries)
+            self._suppressed_paths[path] = verdict
+        return verdict
+    
+    def _emit(self, kind: Event.Kind, payload: Any, timestamp: Optional[int] = None):
+        if Debugging.DEBUG:
+            debug(f"ViewStateRecorder._emit: {kind.value} {payload}")
+        self._event_handler.handle_event(
+            Event(kind=kind, target=self._target, event=payload,
+                  timestamp=timestamp or time.monotonic_ns())
+        )
+    
+    def _connect(self, signal: Any, handler: Callable):
+        signal += handler
+        self._connections.append((signal, handler))
+    
+    def _attach(self, view: Optional[pya.LayoutView]):
+        self._view = view
+        if view is None:
+            return
+        
+        self._active_cellview_index = view.active_cellview_index
+        self._cell_names = current_cell_names(view)
+        self._layer_visibility = layer_visibility(view)
+        self._viewport = self._viewport_of(view)
+        
+        self._connect(view.on_active_cellview_changed, self._on_active_cellview_changed)
+        self._connect(view.on_cellview_changed, self._on_cellview_changed)
+        self._connect(view.on_viewport_changed, self._on_viewport_changed)
+        self._connect(view.on_layer_list_changed, self._on_layer_list_changed)
+    
+    def _detach(self):
+        self._viewport_timer.stop()
+        if self._view is not None and not self._view._destroyed():
+            for signal, handler in self._connections:
+                signal -= handler
+        self._connections = []
+        self._view = None
+    
+    def _on_current_view_changed(self):
+        try:
+            # the tab switch itself is recorded as a click on the tab bar
+            self._emit_viewport()
+            self._detach()
+            self._attach(pya.LayoutView.current())
+        except Exception as e:
+            print("ViewStateRecorder._on_current_view_changed caught an exception", e)
+            traceback.print_exc()
+    
+    def _on_active_cellview_changed(self):
+        try:
+            index = self._view.active_cellview_index
+            if index != self._active_cellview_index:
+                self._active_cellview_index = index
+                self._emit(Event.Kind.ACTIVE_CELLVIEW_EVENT, ActiveCellViewEvent(cellview_index=index))
+        except Exception as e:
+            print("ViewStateRecorder._on_active_cellview_changed caught an exception", e)
+            traceback.print_exc()
+    
+    def _on_cellview_changed(self, cellview_index: int):
+        try:
+            names = current_cell_names(self._view)
+            for i, name in enumerate(names):
+                previous = self._cell_names[i] if i < len(self._cell_names) else None
+                if name and name != previous:
+                    self._emit(Event.Kind.CURRENT_CELL_EVENT, CurrentCellEvent(cellview_index=i, cell_name=name))
+            self._cell_names = names
+        except Exception as e:
+            print("ViewStateRecorder._on_cellview_changed caught an exception", e)
+            traceback.print_exc()
+    
+    @staticmethod
+    def _viewport_of(view: pya.LayoutView) -> Tuple[float, float, float, float]:
+        box = view.box()
+        return (box.left, box.bottom, box.right, box.top)
+    
+    def _on_viewport_changed(self):
+        self._viewport_changed_at = time.monotonic_ns()
+        self._viewport_timer.start()
+    
+    def _emit_viewport(self):
+        self._viewport_timer.stop()
+        if not self._viewport_changed_at or self._view is None or self._view._destroyed():
+            return
+        try:
+            timestamp = self._viewport_changed_at
+            self._viewport_changed_at = 0
+            viewport = self._viewport_of(self._view)
+            if viewport != self._viewport:
+                self._viewport = viewport
+                self._emit(Event.Kind.VIEWPORT_EVENT, ViewportEvent(*viewport), timestamp)
+        except Exception as e:
+            print("ViewStateRecorder._emit_viewport caught an exception", e)
+            traceback.print_exc()
+    
+    def _on_layer_list_changed(self, flags: int):
+        try:
+            visibility = layer_visibility(self._view)
+            for key, visible in visibility.items():
+                if self._layer_visibility.get(key, visible) != visible:
+                    group, name, source = key
+                    self._emit(Event.Kind.LAYER_VISIBILITY_EVENT, 
+                               LayerVisibilityEvent(source=source, visible=visible, group=group, name=name))
+            self._layer_visibility = visibility
+        except Exception as e:
+            print("ViewStateRecorder._on_layer_list_changed caught an exception", e)
+            traceback.print_exc()
+
+#---------------------------------------------------------------------------------
+
+def is_view_state_applicable(event: Event) -> bool:
+    view = pya.LayoutView.current()
+    if view is None:
+        return False
+    e = event.event
+    match event.kind:
+        case Event.Kind.ACTIVE_CELLVIEW_EVENT:
+            return e.cellview_index < view.cellviews()
+        case Event.Kind.CURRENT_CELL_EVENT:
+            return e.cellview_index < view.cellviews() and \
+                   view.cellview(e.cellview_index).layout().cell(e.cell_name) is not None
+    return True
+
+
+def apply_view_state_event(event: Event):
+    view = pya.LayoutView.current()
+    e = event.event
+    match event.kind:
+        case Event.Kind.ACTIVE_CELLVIEW_EVENT:
+            view.active_cellview_index = e.cellview_index
+        case Event.Kind.CURRENT_CELL_EVENT:
+            view.cellview(e.cellview_index).cell_name = e.cell_name
+        case Event.Kind.VIEWPORT_EVENT:
+            view.zoom_box(pya.DBox(e.left, e.bottom, e.right, e.top))
+        case Event.Kind.LAYER_VISIBILITY_EVENT:
+            key = (e.group, e.name, e.source)
+            it = view.begin_layers()
+            while not it.at_end():
+                if layer_key(it) == key:
+                    it.current().visible = e.visible
+                it.next()
+        case _:
+            raise ValueError(f"not a view state event: {event.kind.value}")
@@ -0,0 +1,293 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.qwidget_helpers import WidgetKind, widget_kind
+from klayout_gui_automation.sibling_index import SiblingIndex
+from klayout_gui_automation.widget_path import WidgetPath
+
+
+HOT_SPOT_DEBUGGING = False
+
+T = TypeVar('T')
+
+
+@dataclass
+class WidgetCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __str__(self) -> str:
+        return f"hits={self.hits}, misses={self.misses}, "\
+               f"invalidations={self.invalidations}, hit_rate={self.hit_rate:.1%}"
+
+
+@dataclass
+class WidgetCacheEntry(Generic[T]):
+    widget: pya.QWidget
+    value: T
+    chain: Tuple[int, ...]  # ids of the widget and all of its ancestors
+
+
+class WidgetCache(ABC, Generic[T]):
+    """
+    Caches a per-widget value that depends on the widget and its ancestors.
+
+    Entries are keyed by widget identity and invalidated precisely when the
+    structure of the ancestor chain changes, i.e. on ChildAdded/ChildRemoved of
+    an ancestor, on ParentChange, on objectName changes and on destruction.
+    Top level widgets have no parent to report them, so their appearance (Show
+    of a new parentless widget, ParentChange to none) and their destruction
+    invalidate all entries. Structure events have to be forwarded by the owner's 
+    event filter using handle_structure_event().
+    
+    Subclasses whose values do not depend on sibling order or object names
+    can opt out of the corresponding invalidations.
+    """
+    
+    depends_on_siblings: bool = True
+    depends_on_names: bool = True
+
+    def __init__(self):
+        self._entries: Dict[int, WidgetCacheEntry[T]] = {}
+        self._dependents: Dict[int, Set[int]] = {}  # widget id -> ids of cached widgets below (and incl.) it
+        # widget id -> (widget, [(signal, handler)]), the wrapper is kept alive, so the id stays unique
+        self._observed: Dict[int, Tuple[pya.QObject, List[Tuple[Any, Callable]]]] = {}
+        self._roots: Set[int] = set()  # ids of the top level widgets of cached chains
+        self.statistics = WidgetCacheStatistics()
+
+    @abstractmethod
+    def compute(self, widget: pya.QWidget) -> T:
+        raise NotImplementedError()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, widget: pya.QWidget) -> T:
+        wid = id(widget)
+        entry = self._entries.get(wid)
+        if entry is not None:
+            if not widget._destroyed():
+                self.statistics.hits += 1
+                return entry.value
+            self._invalidate_dependents(wid, include_self=True)
+
+        self.statistics.misses += 1
+        if Debugging.DEBUG and HOT_SPOT_DEBUGGING:
+            debug(f"{type(self).__name__}.get: miss for {widget}")
+
+        value = self.compute(widget)
+        chain = self._ancestor_chain(widget)
+        self._entries[wid] = WidgetCacheEntry(widget=widget, value=value, chain=chain)
+        self._roots.add(chain[-1])
+        for aid in chain:
+            self._dependents.setdefault(aid, set()).add(wid)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._dependents.clear()
+        self._roots.clear()
+        for widget, connections in self._observed.values():
+            self._disconnect(widget, connections)
+        self._observed.clear()
+        self.statistics.reset()
+
+    def handle_structure_event(self, obj: pya.QObject, event: pya.QEvent):
+        match event.type():
+            case pya.QEvent.ChildAdded | pya.QEvent.ChildRemoved:
+                if not self.depends_on_siblings:
+                    return
+                child = event.child()
+                if child is not None and not child.isWidgetType():
+                    return  # non-widget children do not contribute to widget paths
+                # the sibling indices below obj may have changed, obj itself is unaffected
+                self._invalidate_dependents(id(obj), include_self=False)
+            case pya.QEvent.ParentChange:
+                wid = id(obj)
+                if self.depends_on_siblings and (wid in self._roots or self._is_top_level(obj)):
+                    # the set of top level widgets changed, their indices may have shifted
+                    self._invalidate_all()
+                else:
+                    self._invalidate_dependents(wid, include_self=True)
+            case pya.QEvent.Show:
+                if self.depends_on_siblings and id(obj) not in self._observed and self._is_top_level(obj):
+                    # a new top level widget, it may shift the indices of the others
+                    self._invalidate_all()
+
+    @staticmethod
+    def _is_top_level(obj: pya.QObject) -> bool:
+        try:
+            return obj.isWidgetType() and obj.parentWidget() is None
+        except Exception:
+            return False
+
+    def invalidate(self, widget: pya.QWidget):
+        self._invalidate_dependents(id(widget), include_self=True)
+
+    def _ancestor_chain(self, widget: pya.QWidget) -> Tuple[int, ...]:
+        chain: List[int] = []
+        w = widget
+        while w is not None:
+            wid = id(w)
+            if wid in chain:  # cycle guard, see WidgetPath.prepend_entries_for_widget
+                break
+            chain.append(wid)
+            self._observe(w)
+            try:
+                w = w.parentWidget() if hasattr(w, 'parentWidget') else None
+            except Exception:
+                w = None
+        return tuple(chain)
+
+    def _observe(self, widget: pya.QObject):
+        wid = id(widget)
+        if wid in self._observed:
+            return
+        connections = []
+        if self.depends_on_names:
+            connections.append((widget.objectNameChanged, lambda *args: self._on_object_name_changed(wid)))
+        connections.append((widget.destroyed, lambda *args: self._on_destroyed(wid)))
+        for signal, handler in connections:
+            signal.connect(handler)
+        self._observed[wid] = (widget, connections)
+
+    @staticmethod
+    def _disconnect(widget: pya.QObject, connections: List[Tuple[Any, Callable]]):
+        if widget._destroyed():
+            return  # Qt dropped the connections already
+        for signal, handler in connections:
+            signal.disconnect(handler)
+
+    def _on_object_name_changed(self, wid: int):
+        observed = self._observed.get(wid)
+        widget = observed[0] if observed is not None else None
+        parent = None
+        if widget is not None and not widget._destroyed():
+            parent = widget.parentWidget()
+        if parent is not None:
+            # the renamed widget and the child indices of its siblings may have changed
+            self._invalidate_dependents(id(parent), include_self=False)
+        else:
+            # renaming a top level widget can shift the indices of other top level widgets
+            self._invalidate_all()
+
+    def _on_destroyed(self, wid: int):
+        if self.depends_on_siblings and wid in self._roots:
+            # like renaming, destroying a top level widget can shift the indices of the others
+            self._invalidate_all()
+        else:
+            self._invalidate_dependents(wid, include_self=True)
+        observed = self._observed.pop(wid, None)
+        if observed is not None:
+            self._disconnect(*observed)
+
+    def _invalidate_all(self):
+        self.statistics.invalidations += len(self._entries)
+        self._entries.clear()
+        self._dependents.clear()
+        self._roots.clear()
+
+    def _invalidate_dependents(self, wid: int, include_self: bool):
+        dependents = self._dependents.get(wid)
+        if not dependents:
+            return
+        for dep in list(dependents):
+            if dep == wid and not include_self:
+                continue
+            entry = self._entries.pop(dep, None)
+            if entry is None:
+                continue
+            self.statistics.invalidations += 1
+            for aid in entry.chain:
+                s = self._dependents.get(aid)
+                if s is not None:
+                    s.discard(dep)
+                    if not s:
+                        del self._dependents[aid]
+
+
+class WidgetPathCache(WidgetCache[WidgetPath]):
+    def __init__(self, sibling_index: Optional[SiblingIndex] = None):
+        super().__init__()
+        self.sibling_index = sibling_index or SiblingIndex()
+        # also covers destroyed top level widgets which are not part of any cached chain
+        self.sibling_index.top_level_listeners.append(self._invalidate_all)
+
+    def compute(self, widget: pya.QWidget) -> WidgetPath:
+        return WidgetPath.for_widget(widget, self.sibling_index)
+
+    def clear(self):
+        super().clear()
+        self.sibling_index.clear()
+
+    def handle_structure_event(self, obj: pya.QObject, event: pya.QEvent):
+        self.sibling_index.handle_structure_event(obj, event)
+        super().handle_structure_event(obj, event)
+
+
+@dataclass(frozen=True)
+class WidgetVerdict:
+    in_tool_or_menu_bar: bool  # the widget or one of its ancestors is a toolbar, menu or menubar
+    rooted_in_window: bool     # the top level ancestor is a dialog or main window
+
+    @property
+    def valid(self) -> bool:
+        return self.rooted_in_window and not self.in_tool_or_menu_bar
+
+
+class WidgetVerdictCache(WidgetCache[WidgetVerdict]):
+    # the verdict only changes on reparenting (or destruction)
+    depends_on_siblings = False
+    depends_on_names = False
+    
+    def compute(self, widget: pya.QWidget) -> WidgetVerdict:
+        kind = widget_kind(widget)
+        in_bar = bool(kind & WidgetKind.TOOL_OR_MENU_BAR)
+        
+        parent = widget.parentWidget()
+        if parent is None:
+            return WidgetVerdict(in_tool_or_menu_bar=in_bar,
+                                 rooted_in_window=bool(kind & WidgetKind.TOP_LEVEL_WINDOW))
+        
+        # the parent verdict is cached as well, so this is amortized O(1)
+        pv = self.get(parent)
+        return WidgetVerdict(in_tool_or_menu_bar=in_bar or pv.in_tool_or_menu_bar,
+                             rooted_in_window=pv.rooted_in_window)
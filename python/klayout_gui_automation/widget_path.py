@@ -18,13 +18,19 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
+import threading
 from typing import *
+import weakref
 
 import pya
 
 from klayout_plugin_utils.debugging import debug, Debugging
 from klayout_gui_automation.qwidget_helpers import *
 from klayout_gui_automation.safe_attr_get import safe_attr_get
+from klayout_gui_automation.widget_selector import quote_value
+
+if TYPE_CHECKING:
+    from klayout_gui_automation.sibling_index import SiblingIndex
 
 @dataclass(frozen=True)
 class WidgetPathEntry:
@@ -32,29 +38,109 @@ class WidgetPathEntry:
     class_name: str
     
     child_index: Optional[int] = None
-    property_filter: Optional[Dict[str, str]] = None
+    property_filter: Optional[Tuple[Tuple[str, str], ...]] = None  # ordered (key, value) pairs, hashable
+
+    def __post_init__(self):
+        if isinstance(self.property_filter, dict):
+            object.__setattr__(self, 'property_filter', tuple(self.property_filter.items()))
+
+    @property
+    def properties(self) -> Dict[str, str]:
+        return dict(self.property_filter) if self.property_filter else {}
 
     def xpath(self) -> str:
         s = f"{self.class_name}"
         if self.property_filter:  # we prefer the property filter (more robust against GUI changes)
-            p = [f"@{k}='{v}'" for k, v in self.property_filter.items()]
+            p = [f"@{k}={quote_value(v)}" for k, v in self.property_filter]
+            if 'oid' not in self.properties:
+                p.insert(0, "@oid=''")  # unnamed, a bare step would match named siblings as well
             s += f"[{' and '.join(p)}]"
-        elif self.child_index is not None\
-             and self.child_index > 1:
+        elif self.child_index is not None:
+            # [1] as well, a bare class step would match named siblings too
             s += f"[{self.child_index}]"
         return s
 
-@dataclass(frozen=True)
+
 class WidgetPath:
-    entries: List[WidgetPathEntry]
+    """
+    Interned widget path.
+
+    Paths form a trie of WidgetPathEntry nodes, common prefixes are shared
+    and each distinct path exists exactly once (as long as it is referenced).
+    Therefore equality is an identity check and paths can be used as dict/set keys.
+    """
+    
+    __slots__ = ('parent', 'entry', 'depth', '_children', '_entries', '_xpath_body', '__weakref__')
+    
+    _roots: weakref.WeakValueDictionary[WidgetPathEntry, WidgetPath] = weakref.WeakValueDictionary()
+    _lock = threading.Lock()
+
+    def __init__(self, parent: Optional[WidgetPath], entry: WidgetPathEntry):
+        # NOTE: don't instantiate directly, use WidgetPath.intern() or WidgetPath.from_entries()
+        self.parent = parent
+        self.entry = entry
+        self.depth = 1 if parent is None else parent.depth + 1
+        self._children: Optional[weakref.WeakValueDictionary[WidgetPathEntry, WidgetPath]] = None
+        self._entries: Optional[Tuple[WidgetPathEntry, ...]] = None
+        self._xpath_body: Optional[str] = None
+
+    @classmethod
+    def intern(cls, parent: Optional[WidgetPath], entry: WidgetPathEntry) -> WidgetPath:
+        with cls._lock:
+            if parent is None:
+                children = cls._roots
+            else:
+                children = parent._children
+                if children is None:
+                    children = parent._children = weakref.WeakValueDictionary()
+            node = children.get(entry)
+            if node is None:
+                node = cls(parent, entry)
+                children[entry] = node
+            return node
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[WidgetPathEntry]) -> WidgetPath:
+        node = None
+        for e in entries:
+            node = cls.intern(node, e)
+        if node is None:
+            raise ValueError("WidgetPath requires at least one entry")
+        return node
+
+    def child(self, entry: WidgetPathEntry) -> WidgetPath:
+        return WidgetPath.intern(self, entry)
+
+    @property
+    def entries(self) -> Tuple[WidgetPathEntry, ...]:
+        if self._entries is None:
+            entries: List[WidgetPathEntry] = []
+            node = self
+            while node is not None:
+                entries.append(node.entry)
+                node = node.parent
+            entries.reverse()
+            self._entries = tuple(entries)
+        return self._entries
+
+    def __len__(self) -> int:
+        return self.depth
+
+    def __reduce__(self):
+        # keep paths interned across pickling
+        return (WidgetPath.from_entries, (self.entries,))
+
+    def __copy__(self) -> WidgetPath:
+        return self
+
+    def __deepcopy__(self, memo) -> WidgetPath:
+        return self
 
     @staticmethod
-    def prepend_entries_for_widget(entries: List[WidgetPathEntry], widget: pya.QWidget, visited: Set[int]):
-        def is_valid_widget(widget: pya.QWidget) -> bool:
-            return isinstance(widget, (pya.QDialog, pya.QDialog_Native, 
-                                       pya.QMainWindow, pya.QMainWindow_Native, 
-                                       pya.QWidget, pya.QWidget_Native))
-        
+    def prepend_entries_for_widget(entries: List[WidgetPathEntry], 
+                                   widget: pya.QWidget, 
+                                   visited: Set[int],
+                                   sibling_index: Optional[SiblingIndex] = None):
         widget_id = id(widget)
         # NOTE: hot spot, don't log
         # if Debugging.DEBUG:
@@ -86,15 +172,16 @@ class WidgetPath:
         
         i = 1
         
-        if safe_attr_get(widget, 'title'):  # title could be a useful property
-            property_filter['title'] = widget.title
+        title = safe_attr_get(widget, 'title')
+        if title:  # title could be a useful property
+            property_filter['title'] = title
         
         properties_unique = True
         
         def analyze_siblings_and_self(children: List[pya.QWidget]):
             nonlocal i
             for child in children:
-                if not is_valid_widget(child):
+                if not is_qwidget(child):
                     continue
                     
                 if child is widget:
@@ -103,7 +190,9 @@ class WidgetPath:
                 if child_name == wn and child.__class__.__name__ == wcls:
                     i += 1
         
-        if pw is not None:
+        if sibling_index is not None:
+            i = sibling_index.child_index(widget, pw)
+        elif pw is not None:
             try:
                 analyze_siblings_and_self(pw.children())
             except Exception:
@@ -119,25 +208,36 @@ class WidgetPath:
         entries.insert(0, entry)
         
         if pw is not None:
-            WidgetPath.prepend_entries_for_widget(entries, pw, visited)
+            WidgetPath.prepend_entries_for_widget(entries, pw, visited, sibling_index)
 
     @classmethod
-    def for_widget(cls, widget: pya.QWidget) -> WidgetPath:
+    def for_widget(cls, widget: pya.QWidget, sibling_index: Optional[SiblingIndex] = None) -> WidgetPath:
         # NOTE: hot spot, don't log
         # if Debugging.DEBUG:
         #    debug(f"WidgetPath.for_widget: enter for widget {widget!r}")
                         
         entries: List[WidgetPathEntry] = []
         visited: Set[int] = set()
-        WidgetPath.prepend_entries_for_widget(entries, widget, visited)
-        return WidgetPath(entries)
+        WidgetPath.prepend_entries_for_widget(entries, widget, visited, sibling_index)
+        return WidgetPath.from_entries(entries)
+    
+    def _joined_xpath(self) -> str:
+        # rendered lazily and memoized per trie node
+        if self._xpath_body is None:
+            if self.parent is None:
+                self._xpath_body = self.entry.xpath()
+            else:
+                self._xpath_body = f"{self.parent._joined_xpath()}/{self.entry.xpath()}"
+        return self._xpath_body
     
     def xpath(self) -> str:
-        xps = [e.xpath() for e in self.entries]
-        if len(xps) == 1:
-            return '/' + xps[0]
+        if self.depth == 1:
+            return '/' + self._joined_xpath()
         else:
-            return '/'.join(xps)
+            return self._joined_xpath()
    
     def __str__(self) -> str:
         return self.xpath()
+
+    def __repr__(self) -> str:
+        return f"WidgetPath({self.xpath()!r})"
@@ -0,0 +1,183 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+import traceback
+from typing import *
+
+import pya
+
+from klayout_plugin_utils.debugging import debug, Debugging
+
+from klayout_gui_automation.safe_attr_get import safe_attr_get
+from klayout_gui_automation.sibling_index import SiblingIndex
+from klayout_gui_automation.widget_path import WidgetPath, WidgetPathEntry
+from klayout_gui_automation.widget_selector import compile_selector
+
+
+class WidgetResolver(pya.QObject):
+    """
+    Resolves recorded WidgetPaths to live widgets in O(depth).
+    
+    The live widget tree is indexed per parent by (class_name, objectName),
+    see SiblingIndex. While started, the resolver observes the structure
+    events of the whole application and updates the index incrementally
+    as widgets are created, reparented and destroyed.
+    
+    Widgets can additionally be watched for state changes (see watch_state_changes),
+    which are reported to the structure listeners as well.
+    """
+    
+    STRUCTURE_EVENT_TYPES = (pya.QEvent.ChildAdded, pya.QEvent.ChildRemoved, pya.QEvent.ParentChange)
+    VISIBILITY_EVENT_TYPES = (pya.QEvent.Show, pya.QEvent.Hide)
+    STATE_CHANGE_SIGNALS = ('textChanged', 'toggled', 'valueChanged', 'currentIndexChanged')
+    
+    def __init__(self, sibling_index: Optional[SiblingIndex] = None):
+        super().__init__()
+        self.sibling_index = sibling_index or SiblingIndex()
+        self._structure_event_types = frozenset(self.STRUCTURE_EVENT_TYPES)
+        self._filtered_event_types = frozenset(self.STRUCTURE_EVENT_TYPES + self.VISIBILITY_EVENT_TYPES)
+        self._active = False
+        self._listeners: List[Callable[[pya.QObject, Optional[pya.QEvent]], None]] = []
+        self._state_connections: Dict[int, Tuple[pya.QWidget, List[Tuple[Any, Callable]]]] = {}
+    
+    @property
+    def active(self) -> bool:
+        return self._active
+    
+    def start(self):
+        if self._active:
+            return
+        self._active = True
+        # structure events were not observed in the meantime
+        self.sibling_index.clear()
+        pya.Application.instance().installEventFilter(self)
+    
+    def stop(self):
+        if not self._active:
+            return
+        self._active = False
+        self.unwatch_state_changes()
+        pya.Application.instance().removeEventFilter(self)
+    
+    def add_structure_listener(self, listener: Callable[[pya.QObject, Optional[pya.QEvent]], None]):
+        """
+        Listeners are notified about structure and visibility events of widgets,
+        and about state changes of watched widgets (with event None)
+        """
+        self._listeners.append(listener)
+    
+    def remove_structure_listener(self, listener: Callable[[pya.QObject, Optional[pya.QEvent]], None]):
+        self._listeners.remove(listener)
+    
+    def _notify_state_change(self, widget: pya.QWidget):
+        try:
+            for listener in self._listeners:
+                listener(widget, None)
+        except Exception as e:
+            print("WidgetResolver._notify_state_change caught an exception", e)
+            traceback.print_exc()
+    
+    def watch_state_changes(self, widget: pya.QWidget):
+        """
+        Connects the change signals of widget (see STATE_CHANGE_SIGNALS), 
+        so that probe preconditions are re-evaluated as soon as the value changes
+        """
+        key = id(widget)
+        if key in self._state_connections:
+            return
+        connections = []
+        for name in self.STATE_CHANGE_SIGNALS:
+            signal = getattr(widget, name, None)
+            if signal is None or not hasattr(signal, 'connect'):
+                continue
+            handler = lambda *args, w=widget: self._notify_state_change(w)
+            signal += handler
+            connections.append((signal, handler))
+        self._state_connections[key] = (widget, connections)
+    
+    def unwatch_state_changes(self):
+        for widget, connections in self._state_connections.values():
+            if widget._destroyed():
+                continue
+            for signal, handler in connections:
+                signal -= handler
+        self._state_connections = {}
+    
+    def eventFilter(self, watched_object: pya.QObject, event: pya.QEvent) -> bool:
+        # NOTE: hot spot, fast reject everything but structure (and visibility) events
+        t = event.type()
+        if t not in self._filtered_event_types:
+            return False
+        try:
+            if watched_object.isWidgetType():
+                if t in self._structure_event_types:
+                    self.sibling_index.handle_structure_event(watched_object, event)
+                for listener in self._listeners:
+                    listener(watched_object, event)
+        except Exception as e:
+            print("WidgetResolver.eventFilter caught an exception", e)
+            traceback.print_exc()
+        return False
+    
+    @staticmethod
+    def _matches_properties(widget: pya.QWidget, entry: WidgetPathEntry) -> bool:
+        for k, v in entry.property_filter or ():
+            match k:
+                case 'oid':
+                    if (safe_attr_get(widget, 'objectName') or '') != v:
+                        return False
+                case 'title':
+                    if safe_attr_get(widget, 'title') != v:
+                        return False
+        return True
+    
+    def resolve_entry(self, parent: Optional[pya.QWidget], entry: WidgetPathEntry) -> Optional[pya.QWidget]:
+        candidates = self.sibling_index.bucket(parent, (entry.class_name, entry.widget_name or ''))
+        if not candidates:
+            return None
+        
+        index = (entry.child_index or 1) - 1
+        if index < len(candidates):
+            w = candidates[index]
+            if not w._destroyed() and self._matches_properties(w, entry):
+                return w
+        
+        # the recorded child index is stale (e.g. a sibling was not created yet),
+        # fall back to the first candidate matching all properties
+        if entry.property_filter:
+            for w in candidates:
+                if not w._destroyed() and self._matches_properties(w, entry):
+                    return w
+        return None
+    
+    def resolve(self, path: WidgetPath) -> Optional[pya.QWidget]:
+        widget = None
+        for entry in path.entries:
+            widget = self.resolve_entry(widget, entry)
+            if widget is None:
+                if Debugging.DEBUG:
+                    debug(f"WidgetResolver.resolve: no widget for entry {entry.xpath()} of path {path}")
+                return None
+        return widget
+    
+    def select(self, selector: str, context: Optional[pya.QWidget] = None) -> List[pya.QWidget]:
+        return compile_selector(selector).select(context, self.sibling_index)
+    
+    def select_one(self, selector: str, context: Optional[pya.QWidget] = None) -> Optional[pya.QWidget]:
+        return compile_selector(selector).select_one(context, self.sibling_index)
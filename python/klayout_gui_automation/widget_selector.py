@@ -0,0 +1,293 @@
+# --------------------------------------------------------------------------------
+# SPDX-FileCopyrightText: 2025 Martin Jan Köhler
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+# SPDX-License-Identifier: GPL-3.0-or-later
+#--------------------------------------------------------------------------------
+
+from __future__ import annotations
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from typing import *
+
+import pya
+
+from klayout_gui_automation.qwidget_helpers import is_qwidget
+from klayout_gui_automation.safe_attr_get import safe_attr_get
+from klayout_gui_automation.sibling_index import SiblingIndex
+
+#
+# Selector engine for the XPath-like strings emitted by WidgetPath.xpath(), e.g.
+#
+#     /QMainWindow[@oid='main_window']/QDialog[@oid='x' and @title='y']/QLineEdit[2]
+#
+# Supported: child steps ('/'), descendant steps ('//'), class names or '*',
+# attribute predicates (@oid is the objectName, any other attribute is read
+# from the widget) combined with 'and', and positional predicates ([n], 1-based).
+#
+# A positional predicate without @oid counts the unnamed siblings only,
+# which matches the semantics of WidgetPathEntry.child_index.
+#
+# Quotes within values are doubled (XPath 2.0), e.g. [@title='Don''t save'],
+# see quote_value().
+#
+
+SELECTOR_CACHE_SIZE = 1024
+
+
+class SelectorSyntaxError(ValueError):
+    pass
+
+
+def quote_value(value: str) -> str:
+    """
+    Quotes an attribute value for a selector, the inverse of _Parser.quoted()
+    """
+    return "'" + value.replace("'", "''") + "'"
+
+
+class Axis(Enum):
+    CHILD = 'child'
+    DESCENDANT = 'descendant'
+
+
+@dataclass(frozen=True)
+class StepMatcher:
+    axis: Axis
+    class_name: Optional[str]                       # None for '*'
+    object_name: Optional[str]                      # @oid, None if unconstrained
+    attributes: Tuple[Tuple[str, str], ...] = ()    # other @attr='value' predicates
+    position: Optional[int] = None                  # 1-based
+    
+    def matches(self, widget: pya.QWidget) -> bool:
+        # predicates ordered from cheap/selective (Python class) to expensive (Qt property reads)
+        if self.class_name is not None and widget.__class__.__name__ != self.class_name:
+            return False
+        if self.object_name is not None and (safe_attr_get(widget, 'objectName') or '') != self.object_name:
+            return False
+        for k, v in self.attributes:
+            if safe_attr_get(widget, k) != v:
+                return False
+        return True
+    
+    def candidates(self, parent: Optional[pya.QWidget], sibling_index: Optional[SiblingIndex]) -> Sequence[pya.QWidget]:
+        if self.axis == Axis.DESCENDANT:
+            return list(self._descendants(parent))
+        
+        if sibling_index is not None and self.class_name is not None and self.object_name is not None:
+            # most selective case: a single indexed lookup
+            return sibling_index.bucket(parent, (self.class_name, self.object_name))
+        
+        children = pya.QApplication.topLevelWidgets() if parent is None else parent.children()
+        return [c for c in children if is_qwidget(c)]
+    
+    @staticmethod
+    def _descendants(parent: Optional[pya.QWidget]) -> Iterator[pya.QWidget]:
+        stack = list(pya.QApplication.topLevelWidgets() if parent is None else parent.children())
+        stack.reverse()
+        while stack:
+            w = stack.pop()
+            if not is_qwidget(w):
+                continue
+            yield w
+            children = list(w.children())
+            children.reverse()
+            stack.extend(children)
+    
+    def select(self, parent: Optional[pya.QWidget], sibling_index: Optional[SiblingIndex]) -> List[pya.QWidget]:
+        matches = [w for w in self.candidates(parent, sibling_index) if not w._destroyed() and self.matches(w)]
+        if self.position is None:
+            return matches
+        if self.position <= len(matches):
+            return [matches[self.position - 1]]
+        return []
+
+
+@dataclass(frozen=True)
+class CompiledSelector:
+    source: str
+    absolute: bool
+    steps: Tuple[StepMatcher, ...]
+    
+    def select(self, 
+               context: Optional[pya.QWidget] = None, 
+               sibling_index: Optional[SiblingIndex] = None,
+               limit: Optional[int] = None) -> List[pya.QWidget]:
+        """
+        Evaluates the selector, relative to context unless it is absolute.
+        
+        With a sibling_index which is kept up to date (see WidgetResolver),
+        child steps with class name and @oid are single lookups.
+        """
+        parents: List[Optional[pya.QWidget]] = [None if self.absolute else context]
+        for i, step in enumerate(self.steps):
+            last = i == len(self.steps) - 1
+            result: List[pya.QWidget] = []
+            seen: Set[int] = set()
+            for p in parents:
+                for w in step.select(p, sibling_index):
+                    if id(w) not in seen:
+                        seen.add(id(w))
+                        result.append(w)
+                if last and limit is not None and len(result) >= limit:
+                    return result[:limit]
+            if not result:
+                return []  # short-circuit, no need to evaluate further steps
+            parents = result
+        return parents
+    
+    def select_one(self, 
+                   context: Optional[pya.QWidget] = None, 
+                   sibling_index: Optional[SiblingIndex] = None) -> Optional[pya.QWidget]:
+        result = self.select(context, sibling_index, limit=1)
+        return result[0] if result else None
+
+
+class _Parser:
+    def __init__(self, source: str):
+        self.source = source
+        self.pos = 0
+    
+    def error(self, message: str) -> SelectorSyntaxError:
+        return SelectorSyntaxError(f"{message} at position {self.pos} in selector {self.source!r}")
+    
+    def peek(self, s: str) -> bool:
+        return self.source.startswith(s, self.pos)
+    
+    def expect(self, s: str):
+        if not self.peek(s):
+            raise self.error(f"expected {s!r}")
+        self.pos += len(s)
+    
+    def skip_ws(self):
+        while self.pos < len(self.source) and self.source[self.pos].isspace():
+            self.pos += 1
+    
+    def name(self) -> str:
+        start = self.pos
+        while self.pos < len(self.source) and (self.source[self.pos].isalnum() or self.source[self.pos] in '_-'):
+            self.pos += 1
+        if start == self.pos:
+            raise self.error("expected a name")
+        return self.source[start:self.pos]
+    
+    def quoted(self) -> str:
+        if self.pos >= len(self.source) or self.source[self.pos] not in '\'"':
+            raise self.error("expected a quoted value")
+        quote = self.source[self.pos]
+        parts = []
+        start = self.pos + 1
+        while True:
+            end = self.source.find(quote, start)
+            if end < 0:
+                raise self.error("unterminated string")
+            parts.append(self.source[start:end])
+            if not self.source.startswith(quote, end + 1):
+                break
+            parts.append(quote)  # doubled quote
+            start = end + 2
+        self.pos = end + 1
+        return ''.join(parts)
+    
+    def parse(self) -> CompiledSelector:
+        absolute = self.peek('/')
+        steps: List[StepMatcher] = []
+        axis = Axis.CHILD
+        if self.peek('//'):
+            self.pos += 2
+            axis = Axis.DESCENDANT
+        elif absolute:
+            self.pos += 1
+        
+        while True:
+            steps.append(self.step(axis))
+            if self.pos >= len(self.source):
+                break
+            if self.peek('//'):
+                self.pos += 2
+                axis = Axis.DESCENDANT
+            else:
+                self.expect('/')
+                axis = Axis.CHILD
+        return CompiledSelector(source=self.source, absolute=absolute, steps=tuple(steps))
+    
+    def step(self, axis: Axis) -> StepMatcher:
+        if self.peek('*'):
+            self.pos += 1
+            class_name = None
+        else:
+            class_name = self.name()
+        
+        object_name = None
+        attributes: List[Tuple[str, str]] = []
+        position = None
+        while self.peek('['):
+            self.pos += 1
+            self.skip_ws()
+            if self.pos < len(self.source) and self.source[self.pos].isdigit():
+                start = self.pos
+                while self.pos < len(self.source) and self.source[self.pos].isdigit():
+                    self.pos += 1
+                position = int(self.source[start:self.pos])
+                if position < 1:
+                    raise self.error("positions are 1-based")
+            else:
+                while True:
+                    self.skip_ws()
+                    self.expect('@')
+                    attr = self.name()
+                    self.skip_ws()
+                    self.expect('=')
+                    self.skip_ws()
+                    value = self.quoted()
+                    if attr == 'oid':
+                        object_name = value
+                    else:
+                        attributes.append((attr, value))
+                    self.skip_ws()
+                    if not self.peek('and'):
+                        break
+                    self.pos += 3
+            self.skip_ws()
+            self.expect(']')
+        
+        if position is not None and object_name is None:
+            object_name = ''  # see WidgetPathEntry.child_index
+        
+        return StepMatcher(axis=axis, class_name=class_name, object_name=object_name,
+                           attributes=tuple(attributes), position=position)
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_selector(source: str) -> CompiledSelector:
+    """
+    Parses a selector once, compiled selectors are cached (LRU)
+    """
+    source = source.strip()
+    if not source:
+        raise SelectorSyntaxError("empty selector")
+    return _Parser(source).parse()
+
+
+def select(source: str, 
+           context: Optional[pya.QWidget] = None, 
+           sibling_index: Optional[SiblingIndex] = None) -> List[pya.QWidget]:
+    return compile_selector(source).select(context, sibling_index)
+
+
+def select_one(source: str, 
+               context: Optional[pya.QWidget] = None, 
+               sibling_index: Optional[SiblingIndex] = None) -> Optional[pya.QWidget]:
+    return compile_selector(source).select_one(context, sibling_index)